@@ -1,9 +1,11 @@
-from django.apps import AppConfig
-
-
-class MatriappConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'matriapp'
-
-    def ready(self):
-        import matriapp.signals  # Import signals to ensure they are registered
\ No newline at end of file
+from django.apps import AppConfig
+
+
+class MatriappConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'matriapp'
+
+    def ready(self):
+        import matriapp.signals  # Import signals to ensure they are registered
+        from matriapp.scoring import configure
+        configure()  # Compile the MATCH_SCORING spec once, before any request scores
\ No newline at end of file
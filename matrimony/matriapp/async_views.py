@@ -0,0 +1,156 @@
+# async_views.py
+#
+# Async versions of the hot read views, routed instead of their views.py
+# counterparts when ASYNC_VIEWS is on (see urls.py). Under Daphne they run on
+# the event loop rather than a thread per request, and wait on the database
+# through Django's async ORM. Responses are the same as the sync views'.
+
+import asyncio
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import views
+from .forms import MessageForm
+from .inbox import aunread_count
+from .match_cache import cached_first_page, match_page
+from .models import Event, Message, PartnerPreference, Profile
+from .pagination import akeyset_page, astream_json_page, astream_json_rows, decode_cursor, encode_cursor, page_size
+from .routers import replica_reads
+from .views import HOME_UNREAD_PREVIEW, _match_cursor, _match_json, _profile_json
+
+
+async def _user(request):
+    # The authenticated user, also set as request.user: templates read it through
+    # the auth context processor, and the lazy one would query synchronously
+    request.user = await request.auser()
+    return request.user
+
+
+async def _upcoming_events(user):
+    return [event async for event in (
+        Event.objects.filter(participants=user, event_datetime__gte=timezone.now())
+        .only('title', 'location', 'event_datetime')
+        .order_by('event_datetime')
+    )]
+
+
+async def _unread_preview(user):
+    # The badge reads the denormalized counter; the preview is skipped when there is nothing unread
+    unread_total = await aunread_count(user.id)
+    if not unread_total:
+        return unread_total, []
+    return unread_total, [message async for message in (
+        Message.objects.filter(receiver=user, is_read=False)
+        .select_related('sender')
+        .only('content', 'timestamp', 'sender__username')
+        .order_by('-timestamp')[:HOME_UNREAD_PREVIEW]
+    )]
+
+
+# Home View - the three independent reads are awaited together
+@login_required
+async def home(request):
+    user = await _user(request)
+    upcoming_events, (unread_total, unread_messages), partner_preference = await asyncio.gather(
+        _upcoming_events(user),
+        _unread_preview(user),
+        PartnerPreference.objects.filter(user=user).afirst(),
+    )
+    context = {
+        'upcoming_events': upcoming_events,
+        'unread_messages': unread_messages,
+        'unread_count': unread_total,
+        'partner_preference': partner_preference,
+    }
+    return render(request, 'matriapp/home.html', context)
+
+
+# Matches View - as views.matches; the cache and Match table reads are shared with it
+@login_required
+@replica_reads
+async def matches(request):
+    user = await _user(request)
+    try:
+        after = decode_cursor(request.GET.get('cursor'), (Decimal, int))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    limit = page_size(request)
+    mutual = request.GET.get('mutual') == '1'
+    cached = await sync_to_async(cached_first_page)(user.id, limit) if after is None and not mutual else None
+    if cached is not None:
+        page, has_more = cached
+        next_cursor = encode_cursor(_match_cursor(page[-1])) if has_more else None
+    else:
+        page, next_cursor = await sync_to_async(match_page)(user.id, limit, after, mutual)
+    if request.GET.get('format') == 'json':
+        return astream_json_rows(page, next_cursor, _match_json)
+    return render(request, 'matriapp/matches.html', {'matches': page, 'next_cursor': next_cursor, 'mutual': mutual})
+
+
+def _render_messages(request, user_messages):
+    # The form reads the user's profile and its choices while rendering, which
+    # the ORM only allows off the event loop
+    return render(request, 'matriapp/messages.html', {
+        'messages': user_messages,
+        'message_form': MessageForm(user=request.user),
+    })
+
+
+# Messages View - sending a message is left to the sync view
+@login_required
+async def messages_view(request):
+    if request.method == 'POST':
+        return await sync_to_async(views.messages_view)(request)
+    user = await _user(request)
+    user_messages = [message async for message in (
+        Message.objects.filter(receiver=user)
+        .select_related('sender')
+        .only('content', 'timestamp', 'is_read', 'sender__username')
+        .order_by('-timestamp')
+    )]
+    return await sync_to_async(_render_messages)(request, user_messages)
+
+
+# Events View
+@login_required
+async def events_view(request):
+    user = await _user(request)
+    # created_by and participants are read per row by the template
+    user_events = [event async for event in (
+        Event.objects.filter(participants=user)
+        .select_related('created_by')
+        .prefetch_related('participants')
+    )]
+    return render(request, 'matriapp/events.html', {'events': user_events})
+
+
+# Available Profiles View - keyset paginated, streamed as JSON with ?format=json
+@login_required
+@replica_reads
+async def available_profiles(request):
+    user = await _user(request)
+    try:
+        after = decode_cursor(request.GET.get('cursor'), (int,))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    own = await Profile.objects.only('gender').aget(user=user)
+    opposite_gender_profiles = Profile.objects.filter(gender='Female' if own.gender == 'Male' else 'Male')
+    if after is not None:
+        opposite_gender_profiles = opposite_gender_profiles.filter(id__gt=after[0])
+    opposite_gender_profiles = (opposite_gender_profiles.select_related('user')
+                                .only('location', 'birth_date', 'picture_thumbnail', 'user__username')
+                                .order_by('id'))
+
+    limit = page_size(request)
+    if request.GET.get('format') == 'json':
+        return astream_json_page(opposite_gender_profiles, limit, lambda profile: [profile.id], _profile_json)
+
+    page, next_cursor = await akeyset_page(opposite_gender_profiles, limit, lambda profile: [profile.id])
+    return render(request, 'matriapp/available_profiles.html', {'profiles': page, 'next_cursor': next_cursor})
@@ -0,0 +1,387 @@
+"""Cross-process channel layer backed by a local Unix-socket broker.
+
+Every Daphne worker connects to one broker process (``manage.py
+run_channel_broker``). The broker owns group membership and forwards
+messages to the worker that owns each channel, so ``group_send`` from any
+worker reaches sockets on all of them. Nothing outside the host is needed.
+
+Frames on the socket are a 4-byte big-endian length followed by a JSON
+object with an ``op`` key.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import string
+import struct
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+
+
+async def read_frame(reader):
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return json.loads(await reader.readexactly(size))
+
+
+def write_frame(writer, frame):
+    payload = json.dumps(frame, separators=(',', ':')).encode()
+    writer.write(_HEADER.pack(len(payload)) + payload)
+
+
+def channel_client(channel):
+    # "specific.<client>!<suffix>" belongs to <client>; other names are general channels
+    if '!' not in channel:
+        return None
+    return channel[:channel.index('!')].rsplit('.', 1)[-1]
+
+
+class ChannelBroker:
+    """Routes channel-layer traffic between worker processes.
+
+    ``capacity`` bounds the messages kept for a general channel nobody
+    listens to, and those waiting to be written to a worker not keeping up.
+    """
+
+    def __init__(self, path, capacity=100):
+        self.path = path
+        self.capacity = capacity
+        self.clients = {}  # client id -> frames waiting to be written to it (see _send_loop)
+        self.groups = defaultdict(set)  # group -> channel names
+        self.listeners = defaultdict(deque)  # general channel -> client ids receiving from it
+        self.backlog = defaultdict(deque)  # general channel -> messages nobody is listening for yet
+
+    async def serve(self, ready=None):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_client(self, reader, writer):
+        client_id = outbox = sender = None
+        try:
+            while True:
+                frame = await read_frame(reader)
+                op = frame['op']
+                if op == 'hello':
+                    client_id = frame['client']
+                    outbox = self.clients[client_id] = asyncio.Queue()
+                    sender = asyncio.create_task(self._send_loop(writer, outbox))
+                elif op == 'send':
+                    self._route(frame['channel'], frame['message'])
+                elif op == 'group_add':
+                    self.groups[frame['group']].add(frame['channel'])
+                    outbox.put_nowait({'op': 'ack', 'id': frame['id']})
+                elif op == 'group_discard':
+                    self._discard(frame['group'], frame['channel'])
+                    outbox.put_nowait({'op': 'ack', 'id': frame['id']})
+                elif op == 'group_send':
+                    self._group_send(frame['group'], frame['message'])
+                elif op == 'listen':
+                    self._listen(frame['channel'], client_id)
+                elif op == 'flush':
+                    self.groups.clear()
+                    self.backlog.clear()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Worker went away, or the broker is shutting down
+        finally:
+            if sender is not None:
+                sender.cancel()
+            self._drop_client(client_id, outbox)
+            writer.close()
+
+    async def _send_loop(self, writer, outbox):
+        # Write a client's frames in order, waiting for each to drain, so a slow
+        # worker backs up its own outbox (bounded in _deliver) rather than the
+        # transport's buffer. Acks share the outbox, so one never overtakes a
+        # delivery routed before it.
+        try:
+            while True:
+                write_frame(writer, await outbox.get())
+                await writer.drain()
+        except ConnectionError:
+            pass  # The client went away; _handle_client drops it
+
+    def _deliver(self, client_id, channels, message):
+        outbox = self.clients.get(client_id)
+        if outbox is None:
+            return False
+        if outbox.qsize() >= self.capacity:
+            # As a full channel on the worker's side drops what it cannot queue
+            logger.warning('Dropped message for channels %s of slow worker %s', ', '.join(channels), client_id)
+        else:
+            outbox.put_nowait({'op': 'deliver', 'channels': channels, 'message': message})
+        return True
+
+    def _route(self, channel, message):
+        client_id = channel_client(channel)
+        if client_id is not None:
+            self._deliver(client_id, [channel], message)
+            return
+        # General channels go to one listening worker in turn, or wait for one
+        listeners = self.listeners.get(channel)
+        while listeners:
+            client_id = listeners[0]
+            listeners.rotate(-1)
+            if self._deliver(client_id, [channel], message):
+                return
+            listeners.remove(client_id)
+        backlog = self.backlog[channel]
+        if len(backlog) < self.capacity:
+            backlog.append(message)
+
+    def _group_send(self, group, message):
+        # One frame per worker, however many of its sockets are in the group
+        by_client = defaultdict(list)
+        for channel in self.groups.get(group, ()):
+            by_client[channel_client(channel)].append(channel)
+        for client_id, channels in by_client.items():
+            if client_id is None:
+                for channel in channels:
+                    self._route(channel, message)
+            else:
+                self._deliver(client_id, channels, message)
+
+    def _discard(self, group, channel):
+        channels = self.groups.get(group)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.groups[group]
+
+    def _listen(self, channel, client_id):
+        if client_id not in self.listeners[channel]:
+            self.listeners[channel].append(client_id)
+        backlog = self.backlog.pop(channel, ())
+        for message in backlog:
+            self._route(channel, message)
+
+    def _drop_client(self, client_id, outbox):
+        if client_id is None or self.clients.get(client_id) is not outbox:
+            return  # Never said hello, or has already reconnected on a new connection
+        self.clients.pop(client_id, None)
+        for group, channels in list(self.groups.items()):
+            channels.difference_update([channel for channel in channels if channel_client(channel) == client_id])
+            if not channels:
+                del self.groups[group]
+        for listeners in self.listeners.values():
+            if client_id in listeners:
+                listeners.remove(client_id)
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """Channel layer client for :class:`ChannelBroker`.
+
+    Messages for channels created by this process are queued locally;
+    everything else goes through the broker.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = path
+        self.client_id = uuid.uuid4().hex
+        self.channels = {}
+        self._groups = defaultdict(set)  # channel -> groups it was added to through this layer
+        self._receivers = Counter()  # channel -> receive() calls waiting on it
+        self._listening = set()
+        self._connection = None  # (loop, reader, writer, reader task)
+        self._connect_lock = None  # (loop, lock)
+        self._reconnecting = None  # Task reconnecting after the broker went away
+        self._acks = {}  # request id -> future resolved by the broker's ack
+        self._next_request_id = 0
+
+    # Connection management
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        if self._connection is not None and self._connection[0] is loop and not self._connection[3].done():
+            return self._connection[2]
+        if self._connect_lock is None or self._connect_lock[0] is not loop:
+            self._connect_lock = (loop, asyncio.Lock())
+        async with self._connect_lock[1]:
+            if self._connection is None or self._connection[0] is not loop or self._connection[3].done():
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                write_frame(writer, {'op': 'hello', 'client': self.client_id})
+                # A new connection (or event loop) must re-announce the general channels we
+                # read, and the group memberships the broker dropped with the old connection.
+                # They go ahead of any other frame, so the broker applies them first; their
+                # acks (id 0) are not waited for.
+                for channel in self._listening:
+                    write_frame(writer, {'op': 'listen', 'channel': channel})
+                for channel, groups in self._groups.items():
+                    for group in groups:
+                        write_frame(writer, {'op': 'group_add', 'group': group, 'channel': channel, 'id': 0})
+                task = loop.create_task(self._read_loop(reader))
+                self._connection = (loop, reader, writer, task)
+        return self._connection[2]
+
+    async def _send_frame(self, frame):
+        writer = await self._writer()
+        write_frame(writer, frame)
+        await writer.drain()
+
+    async def _request(self, frame):
+        # Membership changes wait for the broker, so a group_send issued after
+        # group_add returns (from any process) is guaranteed to include the channel
+        self._next_request_id += 1
+        frame['id'] = self._next_request_id
+        future = self._acks[frame['id']] = asyncio.get_running_loop().create_future()
+        try:
+            await self._send_frame(frame)
+            await future
+        finally:
+            self._acks.pop(frame['id'], None)
+
+    async def _read_loop(self, reader):
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame['op'] == 'ack':
+                    future = self._acks.get(frame['id'])
+                    if future is not None and not future.done():
+                        future.set_result(None)
+                elif frame['op'] == 'deliver':
+                    for channel in frame['channels']:
+                        if self._abandoned(channel):
+                            continue  # Sent before its consumer left its groups; nobody will read it
+                        try:
+                            self._enqueue(channel, frame['message'])
+                        except ChannelFull:
+                            logger.warning('Dropped message for full channel %s', channel)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning('Lost connection to channel broker at %s', self.path)
+            for future in self._acks.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Lost connection to channel broker'))
+            # Sockets waiting in receive() send nothing, so reconnect now rather than on the next send
+            self._reconnecting = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self, delay=0.05, max_delay=2.0):
+        # Retry until the broker is back (e.g. restarted), or until close()
+        while self._connection is not None:
+            try:
+                await self._writer()
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            else:
+                logger.info('Reconnected to channel broker at %s', self.path)
+                return
+
+    def _queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _abandoned(self, channel):
+        # One of our specific channels that no consumer reads any more
+        return (channel_client(channel) == self.client_id and channel not in self.channels
+                and not self._receivers[channel] and channel not in self._groups)
+
+    def _release(self, channel, abandoned=False):
+        # Drop the queue of a channel nobody is waiting on, as InMemoryChannelLayer does,
+        # so every closed connection does not leave one behind in the worker
+        queue = self.channels.get(channel)
+        if queue is not None and not self._receivers[channel] and (queue.empty() or abandoned):
+            del self.channels[channel]
+
+    def _enqueue(self, channel, message):
+        try:
+            self._queue(channel).put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            raise ChannelFull(channel)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        if channel_client(channel) == self.client_id:
+            self._enqueue(channel, message)
+        else:
+            await self._send_frame({'op': 'send', 'channel': channel, 'message': message})
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if channel_client(channel) is None and channel not in self._listening:
+            self._listening.add(channel)
+            await self._send_frame({'op': 'listen', 'channel': channel})
+        else:
+            await self._writer()  # Make sure deliveries from the broker are being read
+        queue = self._queue(channel)
+        self._receivers[channel] += 1
+        cancelled = False
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        except asyncio.CancelledError:
+            cancelled = True  # The consumer is stopping
+            raise
+        finally:
+            self._receivers[channel] -= 1
+            if not self._receivers[channel]:
+                del self._receivers[channel]
+            if self.channels.get(channel) is queue:
+                self._release(channel, abandoned=cancelled and channel not in self._groups)
+
+    async def new_channel(self, prefix='specific.'):
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}{self.client_id}!{suffix}'
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self._groups[channel].add(group)
+        await self._request({'op': 'group_add', 'group': group, 'channel': channel})
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._request({'op': 'group_discard', 'group': group, 'channel': channel})
+        groups = self._groups.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self._groups[channel]
+                self._release(channel, abandoned=True)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        await self._send_frame({'op': 'group_send', 'group': group, 'message': message})
+
+    async def flush(self):
+        self.channels = {}
+        self._groups.clear()
+        await self._send_frame({'op': 'flush'})
+
+    async def close(self):
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            self._reconnecting = None
+        if self._connection is not None:
+            _, _, writer, task = self._connection
+            task.cancel()
+            writer.close()
+            self._connection = None
+            # Frames still buffered would be lost if the event loop ended first
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .inbox import mark_read, save_messages
+from .models import Message
+from .pagination import decode_cursor, encode_cursor, parse_timestamp
+from .routers import on_chat_database
+
+logger = logging.getLogger(__name__)
+
+# Private rooms are named after their two participants, e.g. dm_3_7
+DIRECT_ROOM_RE = re.compile(r'^dm_(\d+)_(\d+)$')
+
+
+def direct_room_name(user_id, other_id):
+    low, high = sorted((user_id, other_id))
+    return f'dm_{low}_{high}'
+
+
+def room_receiver_id(room_name, sender_id):
+    """The other participant of a private room, or ``None`` for a shared room."""
+    match = DIRECT_ROOM_RE.match(room_name)
+    if match is None:
+        return None
+    participants = {int(match.group(1)), int(match.group(2))}
+    if sender_id not in participants or len(participants) != 2:
+        return None
+    (receiver_id,) = participants - {sender_id}
+    return receiver_id
+
+
+def can_join_room(room_name, user):
+    # Rooms are for signed-in users, as the chat page is, and private rooms only
+    # for their two participants: joining sends the room's stored history
+    if user is None or not user.is_authenticated:
+        return False
+    return DIRECT_ROOM_RE.match(room_name) is None or room_receiver_id(room_name, user.id) is not None
+
+
+class MessageWriter:
+    """Write-behind buffer that persists a socket's chat messages in batches.
+
+    ``put`` only enqueues, so the consumer never waits on the database.
+    A background task flushes with ``bulk_create`` once ``max_batch``
+    messages are waiting or ``max_delay`` seconds after the first one,
+    whichever comes first. ``close`` flushes whatever is still queued.
+    ``on_saved``, if given, is awaited with each batch once it is stored.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_batch=None, max_delay=None, on_saved=None):
+        self.max_batch = max_batch or getattr(settings, 'CHAT_WRITE_BATCH_SIZE', 50)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, 'CHAT_WRITE_INTERVAL', 0.25)
+        self.on_saved = on_saved
+        self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, message):
+        self.queue.put_nowait(message)
+
+    async def close(self):
+        if self._task is None:
+            return
+        self.queue.put_nowait(self._STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is self._STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            await database_sync_to_async(on_chat_database(save_messages))(batch)
+        except Exception:
+            logger.exception('Could not persist %d chat messages', len(batch))
+            return
+        for room_name in {message.room_name for message in batch}:
+            history_cache.invalidate_latest(room_name)
+        if self.on_saved is not None:
+            await self.on_saved(batch)
+
+
+class Throttle:
+    """Lets an event through at most once every ``interval`` seconds per key."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = {}
+
+    def allow(self, key):
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[key] = now
+        return True
+
+
+def mark_read_up_to(room_name, reader_id, message_id):
+    # One UPDATE for every message the reader has seen, however many receipts were sent
+    return mark_read(reader_id, up_to=message_id, room_name=room_name)
+
+
+class ReadReceipts:
+    """Coalesces a reader's receipts for one room into a single write.
+
+    ``mark`` only remembers the highest message id read. The first receipt
+    schedules a flush ``delay`` seconds later, which marks everything up to
+    that id as read in one ``UPDATE`` and then awaits ``on_applied(up_to)``.
+    ``close`` writes out a pending receipt immediately.
+    """
+
+    def __init__(self, room_name, reader_id, on_applied=None, delay=None):
+        self.room_name = room_name
+        self.reader_id = reader_id
+        self.on_applied = on_applied
+        self.delay = delay if delay is not None else getattr(settings, 'CHAT_RECEIPT_INTERVAL', 1.0)
+        self.up_to = None
+        self._timer = None
+
+    def mark(self, message_id):
+        if self.up_to is None or message_id > self.up_to:
+            self.up_to = message_id
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.delay, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        up_to, self.up_to = self.up_to, None
+        if up_to is None:
+            return
+        try:
+            await database_sync_to_async(on_chat_database(mark_read_up_to))(self.room_name, self.reader_id, up_to)
+        except Exception:
+            logger.exception('Could not apply read receipt for room %s', self.room_name)
+            return
+        if self.on_applied is not None:
+            await self.on_applied(up_to)
+
+    async def close(self):
+        await self.flush()
+
+
+def load_history_page(room_name, before=None, limit=None):
+    """Serialize one page of a room's history, newest page first, as a JSON ``history`` event.
+
+    ``before`` is the ``(timestamp, id)`` key of the oldest message already
+    shown; the returned ``before`` cursor points at the next older page.
+    """
+    limit = limit or getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50)
+    queryset = Message.objects.filter(room_name=room_name)
+    if before is not None:
+        timestamp, message_id = before
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+    rows = list(
+        queryset.order_by('-timestamp', '-id')
+        .values_list('id', 'content', 'timestamp', 'sender__username')[:limit + 1]
+    )
+    # isoformat() keeps the microseconds that DjangoJSONEncoder would round away
+    older = encode_cursor([rows[limit - 1][2].isoformat(), rows[limit - 1][0]]) if len(rows) > limit else None
+    rows = rows[:limit]
+    rows.reverse()  # Oldest first, ready to be displayed in order
+
+    return json.dumps({
+        'type': 'history',
+        'messages': [
+            {'id': message_id, 'message': content, 'timestamp': timestamp, 'sender': sender}
+            for message_id, content, timestamp, sender in rows
+        ],
+        'before': older,
+    }, cls=DjangoJSONEncoder)
+
+
+class HistoryCache:
+    """In-process LRU of serialized history pages for hot rooms.
+
+    Pages older than the newest one never change, so they are kept until
+    evicted. The newest page of a room is dropped when this process writes
+    to the room and otherwise expires after ``latest_ttl`` seconds, which
+    bounds how stale it can be when another worker wrote the message.
+    """
+
+    def __init__(self, max_entries, latest_ttl):
+        self.max_entries = max_entries
+        self.latest_ttl = latest_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, room_name, cursor):
+        key = (room_name, cursor)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            text, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return text
+
+    def set(self, room_name, cursor, text):
+        expires = time.monotonic() + self.latest_ttl if cursor is None else None
+        with self._lock:
+            self._entries[(room_name, cursor)] = (text, expires)
+            self._entries.move_to_end((room_name, cursor))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_latest(self, room_name):
+        with self._lock:
+            self._entries.pop((room_name, None), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+history_cache = HistoryCache(
+    max_entries=getattr(settings, 'CHAT_HISTORY_CACHE_SIZE', 1024),
+    latest_ttl=getattr(settings, 'CHAT_HISTORY_LATEST_TTL', 2.0),
+)
+
+# Loads in progress, so concurrent requests for the same page share one query
+_inflight = {}
+
+
+async def history_page(room_name, cursor=None):
+    """The serialized history page for ``cursor`` (``None`` for the newest page).
+
+    Raises ``ValueError`` for a malformed cursor.
+    """
+    before = decode_cursor(cursor, (parse_timestamp, int))
+    text = history_cache.get(room_name, cursor)
+    if text is not None:
+        return text
+
+    key = (room_name, cursor)
+    task = _inflight.get(key)
+    if task is None:
+        async def load():
+            try:
+                page = await database_sync_to_async(on_chat_database(load_history_page))(room_name, before)
+                history_cache.set(room_name, cursor, page)
+                return page
+            finally:
+                _inflight.pop(key, None)
+
+        task = _inflight[key] = asyncio.ensure_future(load())
+    return await asyncio.shield(task)
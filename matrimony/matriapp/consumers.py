@@ -1,43 +1,159 @@
-import json
-from channels.generic.websocket import AsyncWebsocketConsumer
-
-class ChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.room_name = self.scope['url_route']['kwargs']['room_name']
-        self.room_group_name = f'chat_{self.room_name}'
-
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-
-        await self.accept()
-
-    async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
-
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message
-            }
-        )
-
-    async def chat_message(self, event):
-        message = event['message']
-
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
\ No newline at end of file
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from .chat import MessageWriter, ReadReceipts, Throttle, can_join_room, history_page, room_receiver_id
+from .models import Message
+
+class ChatConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.room_name = self.scope['url_route']['kwargs']['room_name']
+        self.room_group_name = f'chat_{self.room_name}'
+
+        if not can_join_room(self.room_name, self.scope.get('user')):
+            await self.close()
+            return
+
+        # Join room group
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+
+        # Chat messages are persisted in batches off the receive path
+        self.writer = MessageWriter(on_saved=self.messages_saved)
+        self.writer.start()
+
+        # Typing and presence only fan out to the room, rate-limited per socket;
+        # read receipts are coalesced into one write per interval
+        self.throttle = Throttle(getattr(settings, 'CHAT_TYPING_INTERVAL', 2.0))
+        self.presence_throttle = Throttle(getattr(settings, 'CHAT_PRESENCE_INTERVAL', 10.0))
+        user = self.scope.get('user')
+        self.receipts = None
+        if user is not None and user.is_authenticated and room_receiver_id(self.room_name, user.id) is not None:
+            self.receipts = ReadReceipts(self.room_name, user.id, on_applied=self.receipt_applied)
+
+        await self.accept()
+
+        # Backfill the newest page of history before any live messages
+        await self.send(text_data=await history_page(self.room_name))
+        await self.broadcast_presence('online')
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'writer'):
+            await self.broadcast_presence('offline')
+
+        # Leave room group
+        await self.channel_layer.group_discard(
+            self.room_group_name,
+            self.channel_name
+        )
+
+        # Write out anything still buffered before the consumer goes away
+        if hasattr(self, 'writer'):
+            await self.writer.close()
+        if getattr(self, 'receipts', None) is not None:
+            await self.receipts.close()
+
+    async def receive(self, text_data):
+        text_data_json = json.loads(text_data)
+
+        # {"type": "history", "before": <cursor>} asks for the next older page
+        if text_data_json.get('type') == 'history':
+            try:
+                page = await history_page(self.room_name, text_data_json.get('before'))
+            except ValueError:
+                await self.send(text_data=json.dumps({'type': 'error', 'error': 'Invalid cursor'}))
+                return
+            await self.send(text_data=page)
+            return
+
+        # {"type": "read", "up_to": <message id>} marks everything up to that message as read
+        if text_data_json.get('type') == 'read':
+            up_to = text_data_json.get('up_to')
+            if self.receipts is not None and isinstance(up_to, int):
+                self.receipts.mark(up_to)
+            return
+
+        # {"type": "typing"} and {"type": "presence", "status": ...} are never stored
+        if text_data_json.get('type') == 'typing':
+            if self.throttle.allow('typing'):
+                await self.send_to_room('user_typing')
+            return
+        if text_data_json.get('type') == 'presence':
+            status = text_data_json.get('status')
+            if status in ('online', 'away') and self.presence_throttle.allow(status):
+                await self.broadcast_presence(status)
+            return
+
+        message = text_data_json['message']
+
+        user = self.scope.get('user')
+        sender = user.username if user is not None and user.is_authenticated else ''
+        if sender:
+            self.writer.put(Message(
+                sender_id=user.id,
+                receiver_id=room_receiver_id(self.room_name, user.id),
+                room_name=self.room_name,
+                content=message,
+            ))
+
+        # Send message to room group
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_message',
+                'message': message,
+                'sender': sender,
+            }
+        )
+
+    async def chat_message(self, event):
+        message = event['message']
+
+        # Send message to WebSocket
+        await self.send(text_data=json.dumps({
+            'type': 'message',
+            'message': message,
+            'sender': event.get('sender', ''),
+        }))
+
+    def username(self):
+        user = self.scope.get('user')
+        return user.username if user is not None and user.is_authenticated else ''
+
+    async def send_to_room(self, event_type, **fields):
+        # Events about this socket go to everyone else in the room
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': event_type,
+            'sender': self.username(),
+            'origin': self.channel_name,
+            **fields,
+        })
+
+    async def broadcast_presence(self, status):
+        if self.username():
+            await self.send_to_room('user_presence', status=status)
+
+    async def messages_saved(self, batch):
+        # Tell the room the id of the newest stored message, so clients can acknowledge it
+        ids = [message.pk for message in batch if message.pk is not None]
+        if ids:
+            await self.channel_layer.group_send(self.room_group_name, {'type': 'messages_stored', 'last_id': max(ids)})
+
+    async def receipt_applied(self, up_to):
+        await self.send_to_room('messages_read', up_to=up_to)
+
+    async def user_typing(self, event):
+        if event['origin'] != self.channel_name:
+            await self.send(text_data=json.dumps({'type': 'typing', 'sender': event['sender']}))
+
+    async def user_presence(self, event):
+        if event['origin'] != self.channel_name:
+            await self.send(text_data=json.dumps({'type': 'presence', 'sender': event['sender'], 'status': event['status']}))
+
+    async def messages_stored(self, event):
+        await self.send(text_data=json.dumps({'type': 'stored', 'last_id': event['last_id']}))
+
+    async def messages_read(self, event):
+        if event['origin'] != self.channel_name:
+            await self.send(text_data=json.dumps({'type': 'read', 'sender': event['sender'], 'up_to': event['up_to']}))
\ No newline at end of file
@@ -1,69 +1,85 @@
-# forms.py
-
-from django import forms
-from django.contrib.auth.forms import UserCreationForm
-from .models import Profile, PartnerPreference, User, Message, Event
-
-class SignupForm(UserCreationForm):  
-    email = forms.EmailField(required=True)
-
-    class Meta:
-        model = User
-        fields = ['username', 'email', 'password1', 'password2']
-
-class ProfileForm(forms.ModelForm):
-    class Meta:
-        model = Profile
-        fields = ['bio', 'location', 'birth_date', 'gender', 
-                  'religion', 'caste', 'height', 
-                  'education', 'occupation', 
-                  'income', 'profile_picture']
-
-class PartnerPreferenceForm(forms.ModelForm):
-    class Meta:
-        model = PartnerPreference
-        fields = ['min_age', 'max_age', 
-                  'min_height', 'max_height',
-                  'religion', 'caste',
-                  'education', 'occupation',
-                  'location']
-class MessageForm(forms.ModelForm):
-    sender = forms.ModelChoiceField(
-        queryset=User.objects.none(),  # Initially empty; will populate in __init__
-        required=True,
-        label="Sender"
-    )
-    
-    receiver = forms.ModelChoiceField(
-        queryset=User.objects.none(),  # Initially empty; will populate in __init__
-        required=True,
-        label="Receiver"
-    )
-
-    class Meta:
-        model = Message
-        fields = ['sender', 'receiver', 'content']  # Include sender and receiver in the fields
-
-    def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user')  # Get the current user from kwargs
-        super(MessageForm, self).__init__(*args, **kwargs)
-
-        # Populate sender dropdown with current user (optional)
-        self.fields['sender'].queryset = User.objects.filter(id=user.id)
-
-        # Populate receiver dropdown with users of the opposite gender
-        if user.profile.gender == 'Male':
-            self.fields['receiver'].queryset = User.objects.filter(profile__gender='Female')
-        else:
-            self.fields['receiver'].queryset = User.objects.filter(profile__gender='Male')
-
-
-
-class EventForm(forms.ModelForm):
-    class Meta:
-        model = Event
-        fields = ['title', 'description', 'location', 'event_datetime']  # Use event_datetime instead of separate date and time
-        # admin.py
-
-
-
+# forms.py
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth.forms import UserCreationForm
+from django.template.defaultfilters import filesizeformat
+from .models import Profile, PartnerPreference, User, Message, Event
+
+class SignupForm(UserCreationForm):  
+    email = forms.EmailField(required=True)
+
+    class Meta:
+        model = User
+        fields = ['username', 'email', 'password1', 'password2']
+
+class ProfileForm(forms.ModelForm):
+    class Meta:
+        model = Profile
+        fields = ['bio', 'location', 'birth_date', 'gender', 
+                  'religion', 'caste', 'height', 
+                  'education', 'occupation', 
+                  'income', 'profile_picture']
+
+    def clean_profile_picture(self):
+        # Reject oversized uploads before they are stored or decoded by the image pipeline
+        picture = self.cleaned_data.get('profile_picture')
+        if not picture or 'profile_picture' not in self.changed_data:
+            return picture
+        max_bytes = getattr(settings, 'PROFILE_PICTURE_MAX_BYTES', 5 * 1024 * 1024)
+        if picture.size > max_bytes:
+            raise forms.ValidationError(f"Profile pictures can be at most {filesizeformat(max_bytes)}.")
+        max_pixels = getattr(settings, 'PROFILE_PICTURE_MAX_PIXELS', 40_000_000)
+        image = getattr(picture, 'image', None)  # Set by forms.ImageField once the upload is verified
+        if image is not None and image.width * image.height > max_pixels:
+            raise forms.ValidationError("Profile picture dimensions are too large.")
+        return picture
+
+class PartnerPreferenceForm(forms.ModelForm):
+    class Meta:
+        model = PartnerPreference
+        fields = ['min_age', 'max_age', 
+                  'min_height', 'max_height',
+                  'religion', 'caste',
+                  'education', 'occupation',
+                  'location']
+class MessageForm(forms.ModelForm):
+    sender = forms.ModelChoiceField(
+        queryset=User.objects.none(),  # Initially empty; will populate in __init__
+        required=True,
+        label="Sender"
+    )
+    
+    receiver = forms.ModelChoiceField(
+        queryset=User.objects.none(),  # Initially empty; will populate in __init__
+        required=True,
+        label="Receiver"
+    )
+
+    class Meta:
+        model = Message
+        fields = ['sender', 'receiver', 'content']  # Include sender and receiver in the fields
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')  # Get the current user from kwargs
+        super(MessageForm, self).__init__(*args, **kwargs)
+
+        # Populate sender dropdown with current user (optional)
+        self.fields['sender'].queryset = User.objects.filter(id=user.id).only('id', 'username')
+
+        # Populate receiver dropdown with users of the opposite gender (only the columns the choices need)
+        receiver_gender = 'Female' if user.profile.gender == 'Male' else 'Male'
+        self.fields['receiver'].queryset = (User.objects.filter(profile__gender=receiver_gender)
+                                            .only('id', 'username')
+                                            .order_by('username'))
+
+
+
+class EventForm(forms.ModelForm):
+    class Meta:
+        model = Event
+        fields = ['title', 'description', 'location', 'event_datetime']  # Use event_datetime instead of separate date and time
+        # admin.py
+
+
+
@@ -0,0 +1,92 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .media import content_hash
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+# Name -> longest side in pixels. Renditions are stored under the SHA-256 of the
+# original upload, so identical uploads share one set of files.
+RENDITIONS = {'thumbnail': 160, 'medium': 640}
+RENDITION_PATH = 'profile_pictures/renditions/%s/%s.webp'
+
+# Pillow decoding and resizing release the GIL, so a small thread pool keeps
+# the work off request threads without another process to run
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PROFILE_IMAGE_WORKERS', 2), thread_name_prefix='profile-images')
+
+
+def render(image, size):
+    """A WebP rendition of ``image`` fitting in ``size`` x ``size``, with no metadata."""
+    rendition = image.copy()
+    rendition.thumbnail((size, size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    # A fresh save without exif/icc_profile arguments writes pixels only
+    rendition.save(output, 'WEBP', quality=getattr(settings, 'PROFILE_IMAGE_QUALITY', 80), method=4)
+    return output.getvalue()
+
+
+def build_renditions(file):
+    """Store the renditions of an uploaded image and return ``(hash, {name: storage path})``.
+
+    Renditions already stored for the same content are reused as they are.
+    """
+    digest = content_hash(file)
+    paths = {name: RENDITION_PATH % (digest, name) for name in RENDITIONS}
+    missing = {name: path for name, path in paths.items() if not default_storage.exists(path)}
+    if missing:
+        with Image.open(file) as original:
+            # Apply the camera orientation before the EXIF block is dropped
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for name, path in missing.items():
+            default_storage.save(path, ContentFile(render(image, RENDITIONS[name])))
+    return digest, paths
+
+
+def process_profile_picture(profile_id):
+    profile = Profile.objects.only('profile_picture').get(id=profile_id)
+    if not profile.profile_picture:
+        fields = {'picture_hash': '', 'picture_thumbnail': '', 'picture_medium': ''}
+    else:
+        with profile.profile_picture.open('rb') as file:
+            digest, paths = build_renditions(file)
+        fields = {'picture_hash': digest, 'picture_thumbnail': paths['thumbnail'], 'picture_medium': paths['medium']}
+    # update() rather than save(): only the rendition columns change, and no profile signals fire.
+    # The filter skips the write if the picture was replaced while this one was processed.
+    profiles = Profile.objects.filter(id=profile_id)
+    if profile.profile_picture:
+        profiles = profiles.filter(profile_picture=profile.profile_picture.name)
+    profiles.update(**fields)
+
+
+def _run(profile_id):
+    close_old_connections()
+    try:
+        process_profile_picture(profile_id)
+    except Exception:
+        logger.exception('Processing the picture of profile %s failed', profile_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_picture_processing(profile):
+    """Build the profile's renditions on the worker pool once the current transaction commits.
+
+    With ``PROFILE_IMAGE_ASYNC = False`` they are built inline on commit instead.
+    """
+    def enqueue():
+        if getattr(settings, 'PROFILE_IMAGE_ASYNC', True):
+            _executor.submit(_run, profile.id)
+        else:
+            process_profile_picture(profile.id)
+
+    transaction.on_commit(enqueue)
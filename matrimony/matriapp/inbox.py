@@ -0,0 +1,161 @@
+import heapq
+from collections import Counter
+
+from django.db import router, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Conversation, Message, UnreadCount
+from .pagination import encode_cursor
+
+# Every path that creates, reads or deletes messages goes through here (or
+# through the Message signals for single saves), so UnreadCount stays equal
+# to the number of unread messages addressed to each user and every
+# Conversation reflects its newest message and per-participant unread counts.
+
+
+def conversation_pair(user_id, other_id):
+    return (user_id, other_id) if user_id <= other_id else (other_id, user_id)
+
+
+def _unread_field(sender_id, receiver_id):
+    low, _ = conversation_pair(sender_id, receiver_id)
+    return 'unread_low' if receiver_id == low else 'unread_high'
+
+
+def adjust_unread(deltas):
+    """Apply ``{user_id: change}`` to the unread counters, creating missing ones on increments."""
+    for user_id, delta in deltas.items():
+        if not delta:
+            continue
+        counters = UnreadCount.objects.filter(user_id=user_id)
+        if counters.update(count=Greatest(F('count') + delta, 0)) or delta < 0:
+            continue
+        _, created = UnreadCount.objects.get_or_create(user_id=user_id, defaults={'count': max(delta, 0)})
+        if not created:  # Created concurrently since the update above
+            counters.update(count=Greatest(F('count') + delta, 0))
+
+
+def adjust_conversation_unread(sender_id, receiver_id, delta):
+    field = _unread_field(sender_id, receiver_id)
+    low, high = conversation_pair(sender_id, receiver_id)
+    Conversation.objects.filter(user_low_id=low, user_high_id=high).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def unread_deltas(messages, change=1):
+    deltas = Counter()
+    for message in messages:
+        if message.receiver_id is not None and not message.is_read:
+            deltas[message.receiver_id] += change
+    return deltas
+
+
+def record_messages(messages):
+    """Fold newly stored messages into the unread counters and their conversations.
+
+    Missing conversations are created in one INSERT; each conversation
+    touched is then updated once, however many of its messages are in the batch.
+    """
+    adjust_unread(unread_deltas(messages))
+
+    pairs = {}
+    for message in messages:
+        if message.receiver_id is None:
+            continue
+        entry = pairs.setdefault(conversation_pair(message.sender_id, message.receiver_id),
+                                 {'last': message, 'unread_low': 0, 'unread_high': 0})
+        if (message.timestamp, message.pk or 0) > (entry['last'].timestamp, entry['last'].pk or 0):
+            entry['last'] = message
+        if not message.is_read:
+            entry[_unread_field(message.sender_id, message.receiver_id)] += 1
+    if not pairs:
+        return
+
+    Conversation.objects.bulk_create([
+        Conversation(user_low_id=low, user_high_id=high, last_activity=entry['last'].timestamp)
+        for (low, high), entry in pairs.items()
+    ], ignore_conflicts=True)
+    for (low, high), entry in pairs.items():
+        last = entry['last']
+        Conversation.objects.filter(user_low_id=low, user_high_id=high).update(
+            unread_low=F('unread_low') + entry['unread_low'],
+            unread_high=F('unread_high') + entry['unread_high'],
+            # Batches from different workers can land out of order; keep the newest message
+            last_message_id=Case(When(last_activity__lte=last.timestamp, then=Value(last.pk)), default=F('last_message_id'),
+                                 output_field=Conversation._meta.get_field('last_message').target_field),
+            last_activity=Greatest(F('last_activity'), Value(last.timestamp)),
+        )
+
+
+def save_messages(messages):
+    # One INSERT for the whole batch, then one counter and conversation update per receiver.
+    # The transaction is on whichever alias the writes are routed to (see routers.py).
+    with transaction.atomic(using=router.db_for_write(Message)):
+        created = Message.objects.bulk_create(messages)
+        record_messages(created)
+    return created
+
+
+def mark_read(user_id, ids=None, up_to=None, room_name=None):
+    """Mark the user's unread messages as read in a single ``UPDATE``.
+
+    With no arguments every unread message is marked. ``ids`` limits it to
+    those messages, ``up_to`` to messages with an id up to and including it,
+    and ``room_name`` to one chat room. Returns the number of messages marked.
+    """
+    queryset = Message.objects.filter(receiver_id=user_id, is_read=False)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    if up_to is not None:
+        queryset = queryset.filter(id__lte=up_to)
+    if room_name is not None:
+        queryset = queryset.filter(room_name=room_name)
+    with transaction.atomic(using=router.db_for_write(Message)):
+        # Lock the rows and update exactly those, so the counters are decremented
+        # for the messages marked and not for ones arriving in between
+        rows = list(queryset.select_for_update().values_list('id', 'sender_id'))
+        if not rows:
+            return 0
+        marked = Message.objects.filter(id__in=[message_id for message_id, _ in rows]).update(is_read=True)
+        adjust_unread({user_id: -marked})
+        for sender_id, total in Counter(sender_id for _, sender_id in rows).items():
+            adjust_conversation_unread(sender_id, user_id, -total)
+    return marked
+
+
+def unread_count(user_id):
+    count = UnreadCount.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+    return count or 0
+
+
+async def aunread_count(user_id):
+    count = await UnreadCount.objects.filter(user_id=user_id).values_list('count', flat=True).afirst()
+    return count or 0
+
+
+def conversation_page(user_id, limit, after=None):
+    """One page of the user's conversations, most recent first, as ``(rows, next_cursor)``.
+
+    A user can be either participant, so each side is read from its own
+    index and the two ordered pages are merged. ``after`` is the
+    ``(last_activity, id)`` key of the last conversation already shown.
+    """
+    sides = []
+    for field in ('user_low', 'user_high'):
+        queryset = Conversation.objects.filter(**{field: user_id})
+        if after is not None:
+            last_activity, conversation_id = after
+            queryset = queryset.filter(Q(last_activity__lt=last_activity) | Q(last_activity=last_activity, id__lt=conversation_id))
+        sides.append(list(queryset.select_related('user_low', 'user_high', 'last_message')
+                          .order_by('-last_activity', '-id')[:limit + 1]))
+
+    rows, seen = [], set()
+    for conversation in heapq.merge(*sides, key=lambda row: (row.last_activity, row.id), reverse=True):
+        if conversation.id not in seen:  # Messages to oneself appear on both sides
+            seen.add(conversation.id)
+            rows.append(conversation)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([last.last_activity.isoformat(), last.id])
+    return rows[:limit], next_cursor
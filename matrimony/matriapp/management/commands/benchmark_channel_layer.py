@@ -0,0 +1,104 @@
+import asyncio
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from matriapp.channel_layers import BrokerChannelLayer, ChannelBroker
+
+GROUP = 'chat_benchmark'
+
+
+def _run_broker(path, ready):
+    async def serve():
+        event = asyncio.Event()
+        task = asyncio.create_task(ChannelBroker(path, capacity=10000).serve(event))
+        await event.wait()
+        ready.set()
+        await task
+
+    asyncio.run(serve())
+
+
+def _run_receiver(path, sockets, messages, joined, results):
+    # One worker process holding `sockets` consumers subscribed to the room group
+    async def receive():
+        layer = BrokerChannelLayer(path, capacity=messages + 1)
+        channels = [await layer.new_channel() for _ in range(sockets)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        joined.release()
+
+        async def drain(channel):
+            latencies = []
+            for _ in range(messages):
+                message = await layer.receive(channel)
+                latencies.append(time.perf_counter() - message['sent'])
+            return latencies
+
+        per_channel = await asyncio.gather(*(drain(channel) for channel in channels))
+        await layer.close()
+        return [latency for latencies in per_channel for latency in latencies]
+
+    results.put(asyncio.run(receive()))
+
+
+class Command(BaseCommand):
+    help = 'Measure group_send fan-out throughput and latency of the broker channel layer across processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Receiving worker processes.')
+        parser.add_argument('--sockets', type=int, default=25, help='Group members per worker.')
+        parser.add_argument('--messages', type=int, default=1000, help='Messages sent to the group.')
+
+    def handle(self, *args, **options):
+        workers, sockets, messages = options['workers'], options['sockets'], options['messages']
+        context = multiprocessing.get_context('spawn')
+        path = os.path.join(tempfile.mkdtemp(), 'broker.sock')
+
+        ready = context.Event()
+        broker = context.Process(target=_run_broker, args=(path, ready), daemon=True)
+        broker.start()
+        if not ready.wait(10):
+            raise RuntimeError('Channel broker did not start')
+
+        joined = context.Semaphore(0)
+        results = context.Queue()
+        receivers = [
+            context.Process(target=_run_receiver, args=(path, sockets, messages, joined, results))
+            for _ in range(workers)
+        ]
+        for process in receivers:
+            process.start()
+        for _ in receivers:
+            joined.acquire()
+
+        async def send():
+            layer = BrokerChannelLayer(path)
+            started = time.perf_counter()
+            for index in range(messages):
+                await layer.group_send(GROUP, {'type': 'chat_message', 'index': index, 'sent': time.perf_counter()})
+            elapsed = time.perf_counter() - started
+            await layer.close()
+            return elapsed
+
+        started = time.perf_counter()
+        send_time = asyncio.run(send())
+        latencies = sorted(latency for _ in receivers for latency in results.get())
+        total_time = time.perf_counter() - started
+        for process in receivers:
+            process.join()
+        broker.terminate()
+
+        delivered = len(latencies)
+        self.stdout.write(f'{workers} workers x {sockets} sockets, {messages} group messages')
+        self.stdout.write(f'  send rate:      {messages / send_time:,.0f} group_send/s')
+        self.stdout.write(f'  delivery rate:  {delivered / total_time:,.0f} messages/s ({delivered} delivered)')
+        self.stdout.write(
+            f'  latency:        p50 {statistics.median(latencies) * 1000:.2f} ms, '
+            f'p99 {latencies[int(delivered * 0.99) - 1] * 1000:.2f} ms, '
+            f'max {latencies[-1] * 1000:.2f} ms'
+        )
@@ -0,0 +1,87 @@
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from PIL import Image
+
+from matriapp.images import render
+from matriapp.media import serve_media
+
+
+def naive_media(request, path, root):
+    # What serving through a plain view looks like: read the whole file, no validators
+    with open(os.path.join(root, path), 'rb') as file:
+        return HttpResponse(file.read(), content_type='image/webp')
+
+
+def _drain(response):
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+class Command(BaseCommand):
+    help = 'Compare the media view against naive full reads for many concurrent thumbnail fetches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=1000, help='Distinct thumbnails on disk.')
+        parser.add_argument('--requests', type=int, default=5000, help='Fetches per scenario.')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent fetching threads.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+            paths = self.make_thumbnails(root, options['files'])
+            factory = RequestFactory()
+            etags = {path: serve_media(factory.get('/'), path)['ETag'] for path in paths}
+
+            scenarios = [
+                ('naive read', lambda path: naive_media(factory.get('/'), path, root)),
+                ('media view', lambda path: serve_media(factory.get('/'), path)),
+                ('media view, revalidated', lambda path: serve_media(
+                    factory.get('/', HTTP_IF_NONE_MATCH=etags[path]), path)),
+                ('media view, range', lambda path: serve_media(factory.get('/', HTTP_RANGE='bytes=0-1023'), path)),
+            ]
+            self.stdout.write(f"{options['requests']} fetches of {len(paths)} thumbnails, "
+                              f"{options['concurrency']} concurrent")
+            for name, fetch in scenarios:
+                self.run(name, fetch, paths, options['requests'], options['concurrency'])
+
+    def make_thumbnails(self, root, count):
+        paths = []
+        for index in range(count):
+            # Noise compresses about as badly as a photo, so files are thumbnail-sized
+            image = Image.merge('RGB', [Image.effect_noise((160, 160), 40 + index % 20) for _ in range(3)])
+            path = f'profile_pictures/renditions/{index:064x}/thumbnail.webp'
+            os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(root, path), 'wb') as file:
+                file.write(render(image, 160))
+            paths.append(path)
+        return paths
+
+    def run(self, name, fetch, paths, requests, concurrency):
+        def timed(index):
+            started = time.perf_counter()
+            size = _drain(fetch(paths[index % len(paths)]))
+            return time.perf_counter() - started, size
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        sent = sum(size for _, size in results)
+        self.stdout.write(
+            f'  {name:<26} {requests / elapsed:>9,.0f} req/s  '
+            f'p50 {statistics.median(latencies) * 1000:.2f} ms  '
+            f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms  '
+            f'{sent / 1024 / 1024:.1f} MiB body'
+        )
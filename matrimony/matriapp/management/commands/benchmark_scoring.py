@@ -0,0 +1,89 @@
+import datetime
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from matriapp.scoring import DEFAULT_MATCH_SCORING, compile_scoring, configure
+from matriapp.utils import TEXT_CRITERIA, ProfileColumns, _PreferenceValues
+from matriapp.vocab import code_field
+
+# Weighted criteria with both ranges soft, to time the float path
+WEIGHTED_SPEC = {
+    'criteria': {
+        'age': {'weight': 3, 'soft': 2},
+        'height': {'weight': 1.5, 'soft': 5},
+        'religion': {'weight': 2},
+        'caste': {'weight': 0.5},
+        'education': {'weight': 1},
+        'occupation': {'weight': 1},
+        'location': {'weight': 2},
+    },
+}
+
+
+def unit_kernel(preferences, columns):
+    # The fixed seven unit-weight checks the compiled scorer replaced, as the baseline
+    scores = ((preferences.born_after < columns.birth_ordinal)
+              & (columns.birth_ordinal <= preferences.born_until)).astype(np.int64)
+    scores += (preferences.min_height <= columns.height) & (columns.height <= preferences.max_height)
+    for index in range(len(TEXT_CRITERIA)):
+        scores += columns.codes[..., index] == preferences.codes[..., index]
+    eligible = (columns.gender == preferences.target_gender) & (preferences.target_gender != '')
+    return scores * eligible
+
+
+class Command(BaseCommand):
+    help = 'Time the compiled match scorer against the fixed unit-weight kernel, per candidate and in batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=100000, help='Candidates scored in batch.')
+        parser.add_argument('--single', type=int, default=5000, help='Candidates scored one at a time.')
+        parser.add_argument('--rounds', type=int, default=7)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        profiles = [self.make_profile(rng, user_id) for user_id in range(options['candidates'])]
+        batch = ProfileColumns.from_profiles(profiles)
+        singles = [ProfileColumns.from_profiles([profile]) for profile in profiles[:options['single']]]
+        preferences = _PreferenceValues(SimpleNamespace(
+            min_age=25, max_age=32, min_height=155, max_height=170,
+            **{code_field(field): rng.randint(1, 5) for field in TEXT_CRITERIA},
+        ), 'Male', datetime.date(2024, 6, 15))
+
+        kernels = [
+            ('unit-weight kernel', unit_kernel),
+            ('compiled, default spec', compile_scoring(DEFAULT_MATCH_SCORING).kernel),
+            ('compiled, weighted soft', compile_scoring(WEIGHTED_SPEC).kernel),
+        ]
+        self.stdout.write(f'{batch.size} candidates in batch, {len(singles)} one at a time')
+        # Rounds alternate between kernels so machine noise hits them alike; the best round counts
+        best = {name: [float('inf'), float('inf')] for name, _ in kernels}
+        for _ in range(options['rounds']):
+            for name, kernel in kernels:
+                timings = best[name]
+                timings[0] = min(timings[0], self.time(lambda: kernel(preferences, batch)))
+                timings[1] = min(timings[1], self.time(lambda: [kernel(preferences, columns) for columns in singles]))
+        for name, (batch_time, single_time) in best.items():
+            self.stdout.write(
+                f'  {name:<24} batch {batch_time / batch.size * 1e9:>7.1f} ns/candidate  '
+                f'single {single_time / len(singles) * 1e6:>6.2f} us/candidate'
+            )
+        configure()
+
+    def make_profile(self, rng, user_id):
+        return SimpleNamespace(
+            user_id=user_id,
+            gender=rng.choice(('Male', 'Female')),
+            birth_date=datetime.date(rng.randint(1980, 2002), rng.randint(1, 12), rng.randint(1, 28)) if rng.random() > 0.05 else None,
+            height=rng.uniform(145, 190) if rng.random() > 0.1 else None,
+            **{code_field(field): rng.randint(0, 5) for field in TEXT_CRITERIA},
+        )
+
+    def time(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
@@ -0,0 +1,91 @@
+import datetime
+import random
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from matriapp.recommend import FEATURE_COLUMNS, build_arrays, load_arrays, nearest, save_arrays, similarities
+
+# (tables, bits) settings compared; more bits make smaller buckets, more tables win back recall
+CONFIGURATIONS = ((4, 12), (8, 12), (8, 14), (12, 14))
+
+
+class Command(BaseCommand):
+    help = 'Measure recall and latency of the LSH similarity index against exact search on synthetic profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('-k', type=int, default=10, help='Neighbours compared for recall.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [self.make_row(rng, user_id) for user_id in range(1, options['profiles'] + 1)]
+        queries = rng.sample(range(len(rows)), min(options['queries'], len(rows)))
+        k = options['k']
+        self.stdout.write(f'{len(rows)} profiles, {len(queries)} queries, recall@{k} against exact search')
+
+        exact_times, truth = [], []
+        arrays = build_arrays(rows)
+        everything = np.arange(len(rows))
+        for row in queries:
+            started = time.perf_counter()
+            scores = similarities(arrays, everything, self.seed(arrays, row))
+            scores[row] = -np.inf
+            top = np.argpartition(-scores, k)[:k]
+            exact_times.append(time.perf_counter() - started)
+            truth.append(set(top.tolist()))
+        self.report('exact', exact_times, 1.0, len(rows))
+
+        for tables, bits in CONFIGURATIONS:
+            with tempfile.TemporaryDirectory() as path:
+                started = time.perf_counter()
+                version = save_arrays(build_arrays(rows, tables, bits, options['seed']), path)
+                built = time.perf_counter() - started
+                started = time.perf_counter()
+                mapped = load_arrays(path, version)  # As a worker starts: memory-mapped, nothing read yet
+                loaded = time.perf_counter() - started
+                for multiprobe in (False, True):
+                    times, hits, scanned = [], 0, 0
+                    for row, expected in zip(queries, truth):
+                        started = time.perf_counter()
+                        seed = self.seed(mapped, row)
+                        candidates = nearest(mapped, seed, multiprobe)
+                        candidates = candidates[candidates != row]
+                        scores = similarities(mapped, candidates, seed)
+                        top = candidates[np.argpartition(-scores, k)[:k]] if candidates.size > k else candidates
+                        times.append(time.perf_counter() - started)
+                        hits += len(expected & set(top.tolist()))
+                        scanned += candidates.size
+                    name = f'lsh {tables}x{bits}' + (' multiprobe' if multiprobe else '')
+                    self.report(name, times, hits / (k * len(queries)), scanned / len(queries))
+                self.stdout.write(f'    built and saved in {built:.2f}s, mapped in {loaded * 1e3:.2f} ms')
+
+    def seed(self, arrays, row):
+        return arrays['slots'][row], arrays['numbers'][row], arrays['norms'][row]
+
+    def report(self, name, times, recall, scanned):
+        times = np.array(times) * 1e3
+        self.stdout.write(
+            f'  {name:<24} recall {recall:>6.1%}  median {np.median(times):>7.3f} ms  '
+            f'p95 {np.percentile(times, 95):>7.3f} ms  scanned {scanned:>8.0f}'
+        )
+
+    def make_row(self, rng, user_id):
+        # Skewed vocabularies, as real religion/caste/location values are
+        values = {
+            'user_id': user_id,
+            'gender': rng.choice(('Male', 'Female')),
+            'birth_date': datetime.date(rng.randint(1980, 2002), rng.randint(1, 12), rng.randint(1, 28)) if rng.random() > 0.05 else None,
+            'height': rng.uniform(145, 190) if rng.random() > 0.1 else None,
+            'income': rng.lognormvariate(13, 0.8) if rng.random() > 0.3 else None,
+            'religion_code': min(int(rng.expovariate(0.8)), 8),
+            'caste_code': int(rng.expovariate(0.1)),
+            'education_code': int(rng.expovariate(0.3)),
+            'occupation_code': int(rng.expovariate(0.15)),
+            'location_code': int(rng.expovariate(0.05)),
+        }
+        return tuple(values[name] for name in FEATURE_COLUMNS)
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from matriapp.models import User
+
+VIEWS = ('home', 'matches', 'messages_view', 'events_view', 'available_profiles')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _session_cookie(user):
+    # A logged in session, as django.contrib.auth.login would store it
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+async def _get(port, path, cookie):
+    # One GET on a fresh connection; returns the status code once the body is read
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def _load(port, path, cookie, requests, concurrency):
+    latencies, failures, remaining = [], 0, requests
+
+    async def client():
+        nonlocal failures, remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status = await _get(port, path, cookie)
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latencies), failures
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the sync and async read views under Daphne (see ASYNC_VIEWS).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to request the pages as; defaults to the first with preferences.')
+        parser.add_argument('--views', nargs='+', default=list(VIEWS), choices=VIEWS)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per view and mode.')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once.')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(partnerpreference__isnull=False, profile__isnull=False).order_by('id').first()
+        if user is None:
+            raise CommandError('No user to request the pages as.')
+        cookie = _session_cookie(user)
+
+        self.stdout.write(f"{options['requests']} requests per view as {user.username}, "
+                          f"{options['concurrency']} concurrent, one Daphne process")
+        for mode in ('sync', 'async'):
+            port = _free_port()
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port), 'matrimony.asgi:application'],
+                cwd=settings.BASE_DIR, env={**os.environ, 'ASYNC_VIEWS': '1' if mode == 'async' else '0'},
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                self.wait_for(port)
+                for name in options['views']:
+                    path = reverse(name)
+                    asyncio.run(_load(port, path, cookie, options['concurrency'], options['concurrency']))  # Warm up
+                    elapsed, latencies, failures = asyncio.run(
+                        _load(port, path, cookie, options['requests'], options['concurrency']))
+                    self.report(mode, name, elapsed, latencies, failures)
+            finally:
+                server.terminate()
+                server.wait()
+
+    def wait_for(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError('Daphne did not start.')
+
+    def report(self, mode, name, elapsed, latencies, failures):
+        if not latencies:
+            self.stdout.write(f'  {mode:5} {name:18} all {failures} requests failed')
+            return
+        self.stdout.write(
+            f'  {mode:5} {name:18} {len(latencies) / elapsed:8,.0f} req/s   '
+            f'p50 {statistics.median(latencies) * 1000:7.1f} ms   '
+            f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms'
+            + (f'   {failures} failed' if failures else '')
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from matriapp.routers import use_replica
+from matriapp.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write the scored profile and preference columns to a snapshot that match rebuilds memory-map.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.PROFILE_SNAPSHOT_DIR)
+
+    def handle(self, *args, **options):
+        # Read from a replica: rows it has yet to replay are within the overlap readers overlay
+        with use_replica():
+            version, meta = build_snapshot(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {meta["profile"]} profiles and {meta["preference"]} preferences '
+            f'into {options["path"]} as {version}.'))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from matriapp.models import Profile
+from matriapp.recommend import BITS, FEATURE_COLUMNS, TABLES, build_arrays, save_arrays
+from matriapp.routers import use_replica
+
+
+class Command(BaseCommand):
+    help = 'Build the "similar profiles" index from every profile and make it current for all workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.SIMILARITY_INDEX_DIR)
+        parser.add_argument('--tables', type=int, default=TABLES)
+        parser.add_argument('--bits', type=int, default=BITS)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with use_replica():
+            arrays = build_arrays(Profile.objects.values_list(*FEATURE_COLUMNS).iterator(),
+                                  options['tables'], options['bits'], options['seed'])
+        version = save_arrays(arrays, options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(arrays["user_ids"])} profiles into {options["path"]} as {version}.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from matriapp.match_cache import match_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the per-user match cache (shared backends only aggregate across workers).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        stats = match_cache_stats(reset=options['reset'])
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} "
+            f"invalidations={stats['invalidations']} hit_ratio={stats['hit_ratio']:.2%}"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from matriapp.matching import rebuild_all_matches
+
+
+class Command(BaseCommand):
+    help = 'Recompute every stored match score from the current profiles and partner preferences.'
+
+    def handle(self, *args, **options):
+        written = rebuild_all_matches()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt match table with {written} matches.'))
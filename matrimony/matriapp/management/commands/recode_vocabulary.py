@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from matriapp.matching import rebuild_all_matches
+from matriapp.models import PartnerPreference, Profile
+from matriapp.vocab import recode
+
+
+class Command(BaseCommand):
+    help = 'Re-encode the vocabulary codes of every profile and preference, e.g. after merging aliases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = sum(recode(model, options['batch_size']) for model in (Profile, PartnerPreference))
+        self.stdout.write(f'Re-encoded {changed} rows.')
+        if changed:
+            # Codes were written without signals, so stored scores may be stale
+            written = rebuild_all_matches()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt match table with {written} matches.'))
@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from matriapp.recompute import SHARD_SIZE, recompute_all_matches
+
+
+class Command(BaseCommand):
+    help = 'Recompute every stored match across a pool of worker processes, e.g. after a scoring change or bulk import.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes; 1 scores in this process.')
+        parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='Users whose preferences each task scores.')
+        parser.add_argument('--checkpoint-dir', help='Keep finished shards here so an interrupted run can resume.')
+        parser.add_argument('--dry-run', action='store_true', help='Score and time everything without writing matches.')
+
+    def handle(self, *args, **options):
+        stats = recompute_all_matches(
+            workers=options['workers'],
+            shard_size=options['shard_size'],
+            checkpoint_dir=options['checkpoint_dir'],
+            dry_run=options['dry_run'],
+            progress=self.progress,
+        )
+        if stats['resumed']:
+            self.stdout.write(f'Resumed {stats["resumed"]} of {stats["shards"]} shards from checkpoints.')
+        seconds = stats['scoring'] or float('inf')
+        self.stdout.write(
+            f'Scored {stats["users"]} users in {stats["shards"]} shards: {stats["directed"]} directed scores, '
+            f'{stats["pairs"]} pairs ({stats["users"] / seconds:.0f} users/s).'
+        )
+        self.stdout.write(
+            f'Timings: scoring {stats["scoring"]:.2f}s, joining {stats["joining"]:.2f}s, writing {stats["writing"]:.2f}s.'
+        )
+        if options['dry_run']:
+            self.stdout.write('Dry run: the match table was not changed.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt match table with {stats["written"]} matches.'))
+
+    def progress(self, done, total):
+        self.stdout.write(f'  shard {done}/{total}')
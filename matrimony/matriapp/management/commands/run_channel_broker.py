@@ -0,0 +1,21 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from matriapp.channel_layers import ChannelBroker
+
+
+class Command(BaseCommand):
+    help = 'Run the local Unix-socket broker used by the "broker" channel layer backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.CHANNEL_BROKER_SOCKET, help='Path of the Unix socket to listen on.')
+        parser.add_argument('--capacity', type=int, default=100, help='Messages kept per general channel with no listener, and per worker not keeping up.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Channel broker listening on {options['socket']}")
+        try:
+            asyncio.run(ChannelBroker(options['socket'], capacity=options['capacity']).serve())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,138 @@
+import heapq
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from .models import Match, User
+from .pagination import encode_cursor
+from .routers import on_primary
+
+# Each user's ranked list is stored under a key that embeds a per-user version.
+# Invalidating a user bumps the version, so stale lists are never read again
+# and simply age out of the cache.
+VERSION_KEY = 'matches:version:%s'
+GENERATION_KEY = 'matches:generation'  # Bumped when the whole table is rebuilt
+LIST_KEY = 'matches:list:%s:%s:%s'
+STATS_KEY = 'matches:stats:%s'
+
+
+def _cache():
+    return caches[getattr(settings, 'MATCH_CACHE_ALIAS', 'default')]
+
+
+def _new_version():
+    # Never restart at a small number: a recreated version key must not match an old list key
+    return time.time_ns()
+
+
+def _version(cache, key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _count(cache, name):
+    key = STATS_KEY % name
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def _ranked_rows(user_id, limit, after=None, mutual=False):
+    """Up to ``limit`` ``(score, other user id, username)`` rows for ``user_id``, best first.
+
+    A pair is stored once (see Match), so the user is on either side of it.
+    Each side is read from its own index and the two ordered lists merged.
+    ``after`` is the ``(score, user id)`` key of the last row already shown.
+    """
+    sides = []
+    for own, other, score in (('user', 'matched_user', 'match_score'), ('matched_user', 'user', 'reverse_score')):
+        if mutual:
+            score = 'mutual_score'
+        queryset = Match.objects.filter(**{own: user_id, f'{score}__gt': 0})
+        if after is not None:
+            last_score, other_id = after
+            queryset = queryset.filter(Q(**{f'{score}__lt': last_score}) | Q(**{score: last_score, f'{other}__gt': other_id}))
+        sides.append(list(queryset.order_by(f'-{score}', other)
+                          .values_list(score, other, f'{other}__username')[:limit]))
+    return list(heapq.merge(*sides, key=lambda row: (-row[0], row[1])))[:limit]
+
+
+def _as_matches(user_id, rows):
+    # The rows as unsaved Match instances from the user's side: matched_user is the other user
+    return [
+        Match(user_id=user_id, matched_user=User(id=matched_user_id, username=username), match_score=score)
+        for score, matched_user_id, username in rows
+    ]
+
+
+def match_page(user_id, limit, after=None, mutual=False):
+    """One page of the user's matches, best first, as ``(matches, next_cursor)``.
+
+    With ``mutual`` only pairs where both users score each other are
+    listed, ranked by the lower of the two scores.
+    """
+    rows = _ranked_rows(user_id, limit + 1, after, mutual)
+    next_cursor = encode_cursor(list(rows[limit - 1][:2])) if len(rows) > limit else None
+    return _as_matches(user_id, rows[:limit]), next_cursor
+
+
+@on_primary
+def cached_top_matches(user_id):
+    """The user's top ``MATCH_CACHE_TOP_N`` stored matches, best first, as unsaved Match instances."""
+    cache = _cache()
+    key = LIST_KEY % (_version(cache, GENERATION_KEY), user_id, _version(cache, VERSION_KEY % user_id))
+    rows = cache.get(key)
+    if rows is None:
+        _count(cache, 'misses')
+        rows = _ranked_rows(user_id, getattr(settings, 'MATCH_CACHE_TOP_N', 200))
+        cache.set(key, rows, getattr(settings, 'MATCH_CACHE_TIMEOUT', 3600))
+    else:
+        _count(cache, 'hits')
+    return _as_matches(user_id, rows)
+
+
+def cached_first_page(user_id, limit):
+    """First page of ``limit`` matches from the cache as ``(page, has_more)``.
+
+    Returns ``None`` when the cached top list is too short to answer, in
+    which case the caller reads the Match table directly.
+    """
+    top = cached_top_matches(user_id)
+    if limit < len(top) or len(top) < getattr(settings, 'MATCH_CACHE_TOP_N', 200):
+        return top[:limit], len(top) > limit
+    return None
+
+
+def _bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+    _count(cache, 'invalidations')
+
+
+def invalidate_matches(user_ids):
+    cache = _cache()
+    for user_id in set(user_ids):
+        _bump(cache, VERSION_KEY % user_id)
+
+
+def invalidate_all_matches():
+    _bump(_cache(), GENERATION_KEY)
+
+
+def match_cache_stats(reset=False):
+    cache = _cache()
+    names = ('hits', 'misses', 'invalidations')
+    stats = {name: cache.get(STATS_KEY % name, 0) for name in names}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    if reset:
+        cache.delete_many([STATS_KEY % name for name in names])
+    return stats
@@ -0,0 +1,274 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .match_cache import invalidate_all_matches, invalidate_matches
+from .models import Match, PartnerPreference, Profile
+from .scoring import scorer
+from .snapshot import profile_snapshot
+from .utils import (
+    PreferenceColumns, ProfileColumns, align, hard_filter, plausible_candidates, plausible_viewers,
+    score_candidates, score_preferences,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Single background worker so refreshes are applied in the order they were queued
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match-refresh')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _upsert_matches(rows):
+    Match.objects.bulk_create(
+        rows,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['user', 'matched_user'],
+        update_fields=['match_score', 'reverse_score', 'mutual_score', 'updated_at'],
+    )
+    return len(rows)
+
+
+def _score(value):
+    return round(float(value), 2)
+
+
+def _pair(user_id, other_id, own_score, other_score, stamp):
+    # The pair's row, lower user id first, from one user's and the other user's score
+    if user_id > other_id:
+        user_id, other_id, own_score, other_score = other_id, user_id, other_score, own_score
+    return Match(user_id=user_id, matched_user_id=other_id, match_score=own_score, reverse_score=other_score,
+                 mutual_score=min(own_score, other_score), updated_at=stamp)
+
+
+def _pair_scores(user_id):
+    # {other user: (user's score for them, their score for user)} as currently stored
+    scores = {}
+    for low, high, low_score, high_score in (Match.objects.filter(Q(user_id=user_id) | Q(matched_user_id=user_id))
+                                             .values_list('user_id', 'matched_user_id', 'match_score', 'reverse_score')):
+        own, theirs = (low_score, high_score) if low == user_id else (high_score, low_score)
+        scores[high if low == user_id else low] = (_score(own), _score(theirs))
+    return scores
+
+
+def refresh_matches_for_user(user_id):
+    """Rescore every pair involving ``user_id``, in both directions, in one pass.
+
+    The pairs are this user's plausible candidates and the users whose own
+    hard filters admit this user's profile. Each is scored both ways with
+    vectorized kernels over the same loaded columns, and stored once.
+    """
+    previous = _pair_scores(user_id)
+    profile = Profile.objects.filter(user_id=user_id).first()
+    if profile is None:
+        Match.objects.filter(Q(user_id=user_id) | Q(matched_user_id=user_id)).delete()
+        invalidate_matches([user_id, *previous])
+        return 0
+
+    preferences = PartnerPreference.objects.filter(user_id=user_id).first()
+    viewers = PreferenceColumns.from_queryset(plausible_viewers(profile).exclude(user_id=user_id))
+    other_ids = set(viewers.user_id.tolist())
+    if preferences is not None:
+        other_ids.update(plausible_candidates(preferences, profile.gender).exclude(user_id=user_id)
+                         .values_list('user_id', flat=True))
+    others = ProfileColumns.from_queryset(Profile.objects.filter(user_id__in=sorted(other_ids)))
+
+    # This user's score for each of the others, within their hard filters
+    if preferences is not None:
+        forward = score_candidates(preferences, profile.gender, others)
+    else:
+        forward = np.zeros(others.size)
+    # Each other user's score for this user; 0 outside their hard filters, NaN with no preferences
+    backward = np.nan_to_num(align(viewers.user_id, score_preferences(viewers, ProfileColumns.from_profiles([profile])),
+                                   others.user_id))
+    with_preferences = np.isin(others.user_id, list(PartnerPreference.objects.filter(
+        user_id__in=others.user_id.tolist()).values_list('user_id', flat=True)))
+    own_view = scorer().combine(forward, np.where(with_preferences, backward, np.nan))
+    their_view = scorer().combine(backward, forward if preferences is not None else np.full(others.size, np.nan))
+
+    stamp = timezone.now()
+    rows, current = [], {}
+    for other_id, own, theirs in zip(others.user_id.tolist(), own_view, their_view):
+        if own > 0 or theirs > 0:
+            current[other_id] = (_score(own), _score(theirs))
+            rows.append(_pair(user_id, other_id, *current[other_id], stamp))
+    with transaction.atomic():
+        _upsert_matches(rows)
+        # Pairs not touched by this refresh no longer score above zero either way
+        Match.objects.filter(Q(user_id=user_id) | Q(matched_user_id=user_id)).exclude(updated_at=stamp).delete()
+
+    # Other users see a different list only when their score for this user changed
+    invalidate_matches([user_id, *(
+        other_id for other_id in previous.keys() | current.keys()
+        if previous.get(other_id, (0, 0))[1] != current.get(other_id, (0, 0))[1]
+    )])
+    return len(rows)
+
+
+def directed_scores(preferences, candidates):
+    """Each preference owner's positive scores within their hard filters, as
+    ``(scoring user ids, scored user ids, scores)`` arrays.
+
+    ``preferences`` and ``candidates`` are lists of PreferenceColumns and
+    ProfileColumns, such as a profile snapshot and the rows changed since
+    (see ``scoring_columns``); every preference is scored against every part.
+    """
+    scoring, scored, scores = [], [], []
+    kernel = scorer().kernel
+    for part in preferences:
+        rows = range(part.size) if part.live is None else np.flatnonzero(part.live)
+        for index in rows:
+            preference = part.row(index)
+            for columns in candidates:
+                # A user never scores against themselves: they share their own gender
+                values = kernel(preference, columns) * hard_filter(preference, columns)
+                positive = np.flatnonzero(values > 0)
+                scoring.append(np.full(positive.size, preference.user_id, dtype=np.int64))
+                scored.append(columns.user_id[positive])
+                scores.append(values[positive].astype(np.float64))
+    if not scores:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(scoring), np.concatenate(scored), np.concatenate(scores)
+
+
+def join_pairs(scoring, scored, scores, with_preferences):
+    """Join directed scores (see ``directed_scores``) into one row per pair.
+
+    Returns ``(low ids, high ids, low scores, high scores)`` arrays for the
+    pairs scoring above zero either way, lower user id first as Match
+    stores them. ``with_preferences`` holds the ids of every user with
+    preferences; the other users' directions count as unscored in mutual modes.
+    """
+    low, high = np.minimum(scoring, scored), np.maximum(scoring, scored)
+    # Each pair as one integer key, which np.unique sorts far faster than rows
+    width = int(high.max()) + 1 if high.size else 1
+    keys, inverse = np.unique(low * width + high, return_inverse=True)
+    low_ids, high_ids = keys // width, keys % width
+    from_low = scoring == low
+    # One direction of each pair: 0 when unscored, NaN when the scoring user has no preferences
+    low_scores, high_scores = np.zeros(keys.size), np.zeros(keys.size)
+    low_scores[inverse[from_low]] = scores[from_low]
+    high_scores[inverse[~from_low]] = scores[~from_low]
+    with_preferences = np.fromiter(with_preferences, dtype=np.int64)
+    low_scores[~np.isin(low_ids, with_preferences)] = np.nan
+    high_scores[~np.isin(high_ids, with_preferences)] = np.nan
+
+    low_view = np.round(scorer().combine(np.nan_to_num(low_scores), high_scores), 2)
+    high_view = np.round(scorer().combine(np.nan_to_num(high_scores), low_scores), 2)
+    kept = (low_view > 0) | (high_view > 0)
+    return low_ids[kept], high_ids[kept], low_view[kept], high_view[kept]
+
+
+def _copy_matches(pairs, stamp):
+    # PostgreSQL COPY, several times faster than multi-row INSERTs for a whole table
+    columns = ('user_id', 'matched_user_id', 'match_score', 'reverse_score', 'mutual_score', 'created_at', 'updated_at')
+    sql = f'COPY {Match._meta.db_table} ({", ".join(columns)}) FROM STDIN'
+    low_ids, high_ids, low_scores, high_scores = (column.tolist() for column in pairs)
+    values = ((low_id, high_id, '%.2f' % low_score, '%.2f' % high_score, '%.2f' % min(low_score, high_score), stamp, stamp)
+              for low_id, high_id, low_score, high_score in zip(low_ids, high_ids, low_scores, high_scores))
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):  # psycopg 3
+            with raw.copy(sql) as copy:
+                for value in values:
+                    copy.write_row(value)
+        else:  # psycopg2
+            buffer = io.StringIO()
+            for value in values:
+                buffer.write('\t'.join(str(field) for field in value) + '\n')
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+
+
+def replace_all_matches(pairs):
+    """Swap the whole Match table for ``pairs`` (see ``join_pairs``) in one
+    transaction; returns the number of rows written."""
+    stamp = timezone.now()
+    low_ids, high_ids, low_scores, high_scores = pairs
+    with transaction.atomic():
+        Match.objects.all().delete()
+        if connection.vendor == 'postgresql':
+            _copy_matches(pairs, stamp)
+        else:
+            for start in range(0, len(low_ids), BATCH_SIZE):
+                batch = slice(start, start + BATCH_SIZE)
+                Match.objects.bulk_create([
+                    _pair(low_id, high_id, low_score, high_score, stamp)
+                    for low_id, high_id, low_score, high_score in zip(
+                        low_ids[batch].tolist(), high_ids[batch].tolist(),
+                        low_scores[batch].tolist(), high_scores[batch].tolist())
+                ])
+    invalidate_all_matches()
+    return len(low_ids)
+
+
+def scoring_preferences():
+    # Every preference whose owner has a profile: the users who score others
+    return PartnerPreference.objects.filter(user__profile__isnull=False)
+
+
+def scoring_columns(today=None):
+    """``(preferences, candidates)`` for ``directed_scores``: the current profile
+    snapshot with the rows changed since, or else every row read from the database."""
+    columns = profile_snapshot.columns(today)
+    if columns is not None:
+        return columns
+    return ([PreferenceColumns.from_queryset(scoring_preferences(), today)],
+            [ProfileColumns.from_queryset(Profile.objects.all())])
+
+
+def rebuild_all_matches():
+    """Recompute the whole Match table from scratch and return the number of rows written.
+
+    Each user's preferences are scored once against every candidate; the
+    two directions of each pair are then joined into its single row. See
+    the recompute_matches command for the same work across processes.
+    """
+    preferences, candidates = scoring_columns()
+    scoring, scored, scores = directed_scores(preferences, candidates)
+    with_preferences = scoring_preferences().values_list('user_id', flat=True)
+    return replace_all_matches(join_pairs(scoring, scored, scores, with_preferences))
+
+
+def _run_refresh(job):
+    close_old_connections()
+    try:
+        with _pending_lock:
+            _pending.discard(job)
+        refresh, user_id = job
+        refresh(user_id)
+    except Exception:
+        logger.exception('Match refresh %s for user %s failed', job[0].__name__, job[1])
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(refresh, user_id):
+    """Queue ``refresh(user_id)`` to run once the current transaction commits.
+
+    Identical jobs that are still waiting are coalesced. With
+    ``MATCH_REFRESH_ASYNC = False`` the refresh runs inline on commit instead.
+    """
+    job = (refresh, user_id)
+
+    def enqueue():
+        if not getattr(settings, 'MATCH_REFRESH_ASYNC', True):
+            refresh(user_id)
+            return
+        with _pending_lock:
+            if job in _pending:
+                return
+            _pending.add(job)
+        _executor.submit(_run_refresh, job)
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,139 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import stat as stat_mode
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.deconstruct import deconstructible
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+# Uploads and renditions are named after the SHA-256 of their content, so a
+# URL always refers to the same bytes and can be cached forever
+HASHED_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{64}(?:[./]|$)')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def profile_picture_path(instance, filename):
+    # profile_pictures/<sha256>.<ext>: identical uploads map to one file
+    extension = os.path.splitext(filename)[1].lower()
+    return f'profile_pictures/{content_hash(instance.profile_picture.file)}{extension}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage for content-hashed names: an existing file already holds the same bytes."""
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def _etag(name, stat, hashed):
+    if hashed:
+        return '"%s"' % hashlib.blake2b(name.encode(), digest_size=16).hexdigest()
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def _byte_range(header, size):
+    """``(start, end)`` inclusive for a single ``Range: bytes=`` header, ``None`` to send
+    the whole file, or ``False`` if the range cannot be satisfied."""
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None  # Multiple or malformed ranges: the full body is a valid answer
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # bytes=-N is the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve an uploaded file with validators, long-lived caching for hashed names and Range support.
+
+    Full responses are a ``FileResponse``, which WSGI servers send with
+    ``sendfile`` through ``wsgi.file_wrapper``.
+    """
+    # The prefixes are checked on the resolved name, so profile_pictures/../ reaches nothing else
+    name = posixpath.normpath(path)
+    if '..' in path.split('/') or '\\' in path or name.startswith('/'):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        name = os.path.relpath(os.path.realpath(full_path), os.path.realpath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+        if not name.startswith(tuple(getattr(settings, 'MEDIA_SERVED_PREFIXES', ('profile_pictures/',)))):
+            raise Http404
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat_mode.S_ISREG(stat.st_mode):
+        raise Http404
+
+    hashed = HASHED_NAME_RE.search(name) is not None
+    etag = _etag(name, stat, hashed)
+    cache_control = IMMUTABLE_CACHE_CONTROL if hashed else 'public, max-age=%d' % getattr(settings, 'MEDIA_MAX_AGE', 3600)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+        byte_range = _byte_range(request.headers['Range'], stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % stat.st_size
+    elif byte_range is not None:
+        start, end = byte_range
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response = StreamingHttpResponse(_read_range(full_path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, stat.st_size)
+        response['Content-Length'] = end - start + 1
+    else:
+        response = FileResponse(open(full_path, 'rb'))
+        response.block_size = CHUNK_SIZE
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -1,114 +1,114 @@
-# Generated by Django 5.1.1 on 2024-09-16 12:25
-
-import django.contrib.auth.models
-import django.contrib.auth.validators
-import django.db.models.deletion
-import django.utils.timezone
-from django.db import migrations, models
-
-
-class Migration(migrations.Migration):
-
-    initial = True
-
-    dependencies = [
-        ('auth', '0012_alter_user_first_name_max_length'),
-    ]
-
-    operations = [
-        migrations.CreateModel(
-            name='User',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('password', models.CharField(max_length=128, verbose_name='password')),
-                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
-                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
-                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
-                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
-                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
-                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
-                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
-                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
-                ('email', models.EmailField(max_length=254, unique=True)),
-                ('is_verified', models.BooleanField(default=False)),
-                ('groups', models.ManyToManyField(blank=True, related_name='matriapp_user_groups', to='auth.group')),
-                ('user_permissions', models.ManyToManyField(blank=True, related_name='matriapp_user_permissions', to='auth.permission')),
-            ],
-            options={
-                'verbose_name': 'user',
-                'verbose_name_plural': 'users',
-                'abstract': False,
-            },
-            managers=[
-                ('objects', django.contrib.auth.models.UserManager()),
-            ],
-        ),
-        migrations.CreateModel(
-            name='Profile',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('bio', models.TextField(blank=True, max_length=500)),
-                ('location', models.CharField(blank=True, max_length=100)),
-                ('birth_date', models.DateField(blank=True, null=True)),
-                ('gender', models.CharField(choices=[('Male', 'Male'), ('Female', 'Female')], max_length=10)),
-                ('religion', models.CharField(blank=True, max_length=50)),
-                ('caste', models.CharField(blank=True, max_length=50)),
-                ('height', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
-                ('education', models.CharField(blank=True, max_length=100)),
-                ('occupation', models.CharField(blank=True, max_length=100)),
-                ('income', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
-                ('profile_picture', models.ImageField(blank=True, null=True, upload_to='profile_pictures/')),
-                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='matriapp.user')),
-            ],
-        ),
-        migrations.CreateModel(
-            name='PartnerPreference',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('min_age', models.IntegerField(blank=True, null=True)),
-                ('max_age', models.IntegerField(blank=True, null=True)),
-                ('min_height', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
-                ('max_height', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
-                ('religion', models.CharField(blank=True, max_length=50)),
-                ('caste', models.CharField(blank=True, max_length=50)),
-                ('education', models.CharField(blank=True, max_length=100)),
-                ('occupation', models.CharField(blank=True, max_length=100)),
-                ('location', models.CharField(blank=True, max_length=100)),
-                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='matriapp.user')),
-            ],
-        ),
-        migrations.CreateModel(
-            name='Message',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('content', models.TextField()),
-                ('timestamp', models.DateTimeField(auto_now_add=True)),
-                ('is_read', models.BooleanField(default=False)),
-                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to='matriapp.user')),
-                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to='matriapp.user')),
-            ],
-        ),
-        migrations.CreateModel(
-            name='Match',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('match_score', models.DecimalField(decimal_places=2, max_digits=5)),
-                ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('matched_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matched_with', to='matriapp.user')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='matriapp.user')),
-            ],
-        ),
-        migrations.CreateModel(
-            name='Event',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('title', models.CharField(max_length=200)),
-                ('description', models.TextField()),
-                ('location', models.CharField(max_length=200)),
-                ('date', models.DateField()),
-                ('time', models.TimeField()),
-                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='matriapp.user')),
-                ('participants', models.ManyToManyField(related_name='events', to='matriapp.user')),
-            ],
-        ),
-    ]
+# Generated by Django 5.1.1 on 2024-09-16 12:25
+
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, related_name='matriapp_user_groups', to='auth.group')),
+                ('user_permissions', models.ManyToManyField(blank=True, related_name='matriapp_user_permissions', to='auth.permission')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bio', models.TextField(blank=True, max_length=500)),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('birth_date', models.DateField(blank=True, null=True)),
+                ('gender', models.CharField(choices=[('Male', 'Male'), ('Female', 'Female')], max_length=10)),
+                ('religion', models.CharField(blank=True, max_length=50)),
+                ('caste', models.CharField(blank=True, max_length=50)),
+                ('height', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('education', models.CharField(blank=True, max_length=100)),
+                ('occupation', models.CharField(blank=True, max_length=100)),
+                ('income', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('profile_picture', models.ImageField(blank=True, null=True, upload_to='profile_pictures/')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='matriapp.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PartnerPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_age', models.IntegerField(blank=True, null=True)),
+                ('max_age', models.IntegerField(blank=True, null=True)),
+                ('min_height', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('max_height', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('religion', models.CharField(blank=True, max_length=50)),
+                ('caste', models.CharField(blank=True, max_length=50)),
+                ('education', models.CharField(blank=True, max_length=100)),
+                ('occupation', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='matriapp.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('is_read', models.BooleanField(default=False)),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to='matriapp.user')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to='matriapp.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('matched_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matched_with', to='matriapp.user')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='matriapp.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('location', models.CharField(max_length=200)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='matriapp.user')),
+                ('participants', models.ManyToManyField(related_name='events', to='matriapp.user')),
+            ],
+        ),
+    ]
@@ -1,19 +1,19 @@
-# Generated by Django 4.1.13 on 2024-10-28 14:21
-
-from django.conf import settings
-from django.db import migrations, models
-
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        ('matriapp', '0001_initial'),
-    ]
-
-    operations = [
-        migrations.AlterField(
-            model_name='event',
-            name='participants',
-            field=models.ManyToManyField(blank=True, related_name='events', to=settings.AUTH_USER_MODEL),
-        ),
-    ]
+# Generated by Django 4.1.13 on 2024-10-28 14:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='participants',
+            field=models.ManyToManyField(blank=True, related_name='events', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,40 +1,40 @@
-# Generated by Django 4.1.13 on 2024-10-30 07:48
-
-from django.conf import settings
-from django.db import migrations, models
-import django.db.models.deletion
-
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        ('matriapp', '0002_alter_event_participants'),
-    ]
-
-    operations = [
-        migrations.RemoveField(
-            model_name='event',
-            name='date',
-        ),
-        migrations.RemoveField(
-            model_name='event',
-            name='time',
-        ),
-        migrations.AddField(
-            model_name='event',
-            name='event_datetime',
-            field=models.DateTimeField(null=True),
-        ),
-        migrations.CreateModel(
-            name='EventResponse',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('response', models.BooleanField()),
-                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='matriapp.event')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
-            ],
-            options={
-                'unique_together': {('event', 'user')},
-            },
-        ),
-    ]
+# Generated by Django 4.1.13 on 2024-10-30 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0002_alter_event_participants'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='event',
+            name='date',
+        ),
+        migrations.RemoveField(
+            model_name='event',
+            name='time',
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='event_datetime',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name='EventResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('response', models.BooleanField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='matriapp.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('event', 'user')},
+            },
+        ),
+    ]
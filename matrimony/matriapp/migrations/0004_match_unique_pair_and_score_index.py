@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0003_remove_event_date_remove_event_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['user', '-match_score', 'matched_user'], name='match_user_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.UniqueConstraint(fields=('user', 'matched_user'), name='unique_match_per_pair'),
+        ),
+    ]
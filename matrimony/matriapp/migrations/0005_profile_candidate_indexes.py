@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0004_match_unique_pair_and_score_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'birth_date'], name='profile_gender_birth_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'height'], name='profile_gender_height_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'religion', 'caste'], name='profile_gender_religion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'location'], name='profile_gender_location_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0006_message_room_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room_name', 'timestamp', 'id'], name='message_room_time_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_unread(apps, schema_editor):
+    # One grouped scan of the inbox, written back in a single INSERT
+    Message = apps.get_model('matriapp', 'Message')
+    UnreadCount = apps.get_model('matriapp', 'UnreadCount')
+    totals = (Message.objects.filter(is_read=False, receiver__isnull=False)
+              .values_list('receiver_id').annotate(total=models.Count('id')).order_by())
+    UnreadCount.objects.bulk_create([UnreadCount(user_id=user_id, count=total) for user_id, total in totals], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0007_message_room_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def backfill_conversations(apps, schema_editor):
+    # Walk the messages in id order a batch at a time, folding each into its pair
+    Message = apps.get_model('matriapp', 'Message')
+    Conversation = apps.get_model('matriapp', 'Conversation')
+    pairs = {}
+    last_id = 0
+    while True:
+        batch = list(Message.objects.filter(id__gt=last_id, receiver__isnull=False).order_by('id')
+                     .values_list('id', 'sender_id', 'receiver_id', 'timestamp', 'is_read')[:BATCH_SIZE])
+        if not batch:
+            break
+        for message_id, sender_id, receiver_id, timestamp, is_read in batch:
+            low, high = sorted((sender_id, receiver_id))
+            entry = pairs.setdefault((low, high), [timestamp, message_id, 0, 0])
+            if (timestamp, message_id) > (entry[0], entry[1]):
+                entry[0], entry[1] = timestamp, message_id
+            if not is_read:
+                entry[2 if receiver_id == low else 3] += 1
+        last_id = batch[-1][0]
+
+    Conversation.objects.bulk_create([
+        Conversation(user_low_id=low, user_high_id=high, last_activity=timestamp, last_message_id=message_id,
+                     unread_low=unread_low, unread_high=unread_high)
+        for (low, high), (timestamp, message_id, unread_low, unread_high) in pairs.items()
+    ], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0008_unreadcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_activity', models.DateTimeField()),
+                ('unread_low', models.PositiveIntegerField(default=0)),
+                ('unread_high', models.PositiveIntegerField(default=0)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='matriapp.message')),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations_as_high', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations_as_low', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_low', '-last_activity', '-id'], name='conversation_low_recent_idx'), models.Index(fields=['user_high', '-last_activity', '-id'], name='conversation_high_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user_low', 'user_high'), name='unique_conversation_per_pair')],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
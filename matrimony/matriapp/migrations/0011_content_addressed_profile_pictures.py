@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:28
+
+import matriapp.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0010_profile_picture_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=matriapp.media.ContentAddressedStorage(), upload_to=matriapp.media.profile_picture_path),
+        ),
+    ]
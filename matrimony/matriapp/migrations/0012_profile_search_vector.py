@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# PostgreSQL only: a tsvector over the searchable profile text, maintained by a
+# trigger and served by a GIN index. Other databases use matriapp.search's
+# local inverted index, so this migration does nothing there.
+FORWARD_SQL = [
+    "ALTER TABLE matriapp_profile ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION matriapp_profile_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.religion, '') || ' ' || coalesce(NEW.caste, '')
+                                            || ' ' || coalesce(NEW.location, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.education, '') || ' ' || coalesce(NEW.occupation, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.bio, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER matriapp_profile_search_vector_update
+    BEFORE INSERT OR UPDATE OF bio, location, education, occupation, religion, caste ON matriapp_profile
+    FOR EACH ROW EXECUTE FUNCTION matriapp_profile_search_vector()
+    """,
+    # Fire the trigger once for existing rows
+    "UPDATE matriapp_profile SET bio = bio",
+    "CREATE INDEX profile_search_vector_idx ON matriapp_profile USING GIN (search_vector)",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS matriapp_profile_search_vector_update ON matriapp_profile",
+    "DROP FUNCTION IF EXISTS matriapp_profile_search_vector()",
+    "ALTER TABLE matriapp_profile DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0011_content_addressed_profile_pictures'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(REVERSE_SQL)),
+    ]
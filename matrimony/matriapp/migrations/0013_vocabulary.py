@@ -0,0 +1,122 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+FIELDS = ('religion', 'caste', 'education', 'occupation', 'location')
+
+
+def encode_existing_rows(apps, schema_editor):
+    # One term per distinct normalized spelling, labelled with the first spelling seen;
+    # profiles and preferences are then given their codes a batch at a time
+    VocabularyTerm = apps.get_model('matriapp', 'VocabularyTerm')
+    VocabularyAlias = apps.get_model('matriapp', 'VocabularyAlias')
+    codes = {}
+
+    def code(kind, text):
+        name = ' '.join((text or '').split()).casefold()
+        if not name:
+            return 0
+        if (kind, name) not in codes:
+            term, _ = VocabularyTerm.objects.get_or_create(kind=kind, label=' '.join(text.split()))
+            VocabularyAlias.objects.create(term=term, kind=kind, name=name)
+            codes[kind, name] = term.id
+        return codes[kind, name]
+
+    for model_name in ('Profile', 'PartnerPreference'):
+        model = apps.get_model('matriapp', model_name)
+        last_id = 0
+        while True:
+            batch = list(model.objects.filter(id__gt=last_id).order_by('id').only(*FIELDS)[:BATCH_SIZE])
+            if not batch:
+                break
+            for row in batch:
+                for field in FIELDS:
+                    setattr(row, f'{field}_code', code(field, getattr(row, field)))
+            model.objects.bulk_update(batch, [f'{field}_code' for field in FIELDS])
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0012_profile_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partnerpreference',
+            name='caste_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partnerpreference',
+            name='education_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partnerpreference',
+            name='location_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partnerpreference',
+            name='occupation_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='partnerpreference',
+            name='religion_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='caste_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='education_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='location_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='occupation_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='religion_code',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='VocabularyTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('religion', 'Religion'), ('caste', 'Caste'), ('education', 'Education'), ('occupation', 'Occupation'), ('location', 'Location')], max_length=20)),
+                ('label', models.CharField(max_length=100)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'label'), name='unique_vocabulary_term')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VocabularyAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('religion', 'Religion'), ('caste', 'Caste'), ('education', 'Education'), ('occupation', 'Occupation'), ('location', 'Location')], max_length=20)),
+                ('name', models.CharField(max_length=100)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='matriapp.vocabularyterm')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'name'), name='unique_vocabulary_alias')],
+            },
+        ),
+        migrations.RunPython(encode_existing_rows, migrations.RunPython.noop),
+    ]
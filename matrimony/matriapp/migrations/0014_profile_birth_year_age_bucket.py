@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:36
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import ExtractYear
+
+AGE_BUCKET_YEARS = 5
+
+
+def fill_birth_columns(apps, schema_editor):
+    Profile = apps.get_model('matriapp', 'Profile')
+    profiles = Profile.objects.filter(birth_date__isnull=False)
+    profiles.update(birth_year=ExtractYear('birth_date'))
+    profiles.update(age_bucket=F('birth_year') / AGE_BUCKET_YEARS)  # Integer division
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0013_vocabulary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='age_bucket',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='birth_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_birth_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'age_bucket', 'height'], name='profile_gender_age_height_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0014_profile_birth_year_age_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='mutual_score',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='reverse_score',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:44
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Least
+
+BATCH_SIZE = 1000
+
+
+def merge_directed_rows(apps, schema_editor):
+    # Rows were stored per direction. Each row with the higher user id first
+    # becomes the reverse score of its pair: merged into the opposite row when
+    # there is one, otherwise turned around in place.
+    Match = apps.get_model('matriapp', 'Match')
+    Match.objects.filter(user_id=F('matched_user_id')).delete()
+    last_id = 0
+    while True:
+        batch = list(Match.objects.filter(id__gt=last_id, user_id__gt=F('matched_user_id')).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            break
+        opposite = {
+            (row.user_id, row.matched_user_id): row
+            for row in Match.objects.filter(user_id__in={row.matched_user_id for row in batch},
+                                            matched_user_id__in={row.user_id for row in batch})
+        }
+        merged, turned = [], []
+        for row in batch:
+            pair = opposite.get((row.matched_user_id, row.user_id))
+            if pair is not None:
+                pair.reverse_score = row.match_score
+                merged.append((pair, row.id))
+            else:
+                row.user_id, row.matched_user_id = row.matched_user_id, row.user_id
+                row.match_score, row.reverse_score = 0, row.match_score
+                turned.append(row)
+        Match.objects.bulk_update([pair for pair, _ in merged], ['reverse_score'])
+        Match.objects.filter(id__in=[row_id for _, row_id in merged]).delete()
+        Match.objects.bulk_update(turned, ['user_id', 'matched_user_id', 'match_score', 'reverse_score'])
+        last_id = batch[-1].id
+    Match.objects.filter(match_score__gt=0, reverse_score__gt=0).update(mutual_score=Least('match_score', 'reverse_score'))
+
+
+# The rows are rewritten in a migration of their own: on PostgreSQL, updating the
+# foreign key columns queues deferred constraint checks, and the indexes and the
+# check constraint of 0015b could not be added in the same transaction.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0015_match_symmetric_pairs'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_directed_rows, migrations.RunPython.noop),
+    ]
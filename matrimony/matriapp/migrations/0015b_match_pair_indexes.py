@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0015a_merge_directed_match_rows'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['matched_user', '-reverse_score', 'user'], name='match_reverse_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('mutual_score__gt', 0)), fields=['user', '-mutual_score', 'matched_user'], name='match_user_mutual_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('mutual_score__gt', 0)), fields=['matched_user', '-mutual_score', 'user'], name='match_reverse_mutual_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.CheckConstraint(condition=models.Q(('user__lt', models.F('matched_user'))), name='match_pair_ordered'),
+        ),
+    ]
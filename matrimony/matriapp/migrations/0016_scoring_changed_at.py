@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0015b_match_pair_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partnerpreference',
+            name='scoring_changed_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='scoring_changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
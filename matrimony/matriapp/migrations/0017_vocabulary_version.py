@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    apps.get_model('matriapp', 'VocabularyVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matriapp', '0016_scoring_changed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VocabularyVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -1,110 +1,282 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
-from django.core.exceptions import ValidationError
-from django.utils import timezone
-
-class User(AbstractUser):
-    email = models.EmailField(unique=True)
-    is_verified = models.BooleanField(default=False)
-
-    groups = models.ManyToManyField(
-        'auth.Group',
-        related_name='matriapp_user_groups',
-        blank=True,
-    )
-    user_permissions = models.ManyToManyField(
-        'auth.Permission',
-        related_name='matriapp_user_permissions',
-        blank=True,
-    )
-
-    def __str__(self):
-        return self.username  # or return self.email if you prefer
-
-
-class Profile(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    bio = models.TextField(max_length=500, blank=True)
-    location = models.CharField(max_length=100, blank=True)
-    birth_date = models.DateField(null=True, blank=True)
-    gender = models.CharField(max_length=10, choices=[('Male', 'Male'), ('Female', 'Female')])
-    religion = models.CharField(max_length=50, blank=True)
-    caste = models.CharField(max_length=50, blank=True)
-    height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
-    education = models.CharField(max_length=100, blank=True)
-    occupation = models.CharField(max_length=100, blank=True)
-    income = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
-
-    def __str__(self):
-        return f"{self.user.username}'s Profile"
-
-
-class PartnerPreference(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    min_age = models.IntegerField(null=True, blank=True)
-    max_age = models.IntegerField(null=True, blank=True)
-    min_height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
-    max_height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
-    religion = models.CharField(max_length=50, blank=True)
-    caste = models.CharField(max_length=50, blank=True)
-    education = models.CharField(max_length=100, blank=True)
-    occupation = models.CharField(max_length=100, blank=True)
-    location = models.CharField(max_length=100, blank=True)
-
-    def __str__(self):
-        return f"{self.user.username}'s Preferences"
-
-
-class Match(models.Model):
-    user = models.ForeignKey(User, related_name='matches', on_delete=models.CASCADE)
-    matched_user = models.ForeignKey(User, related_name='matched_with', on_delete=models.CASCADE)
-    match_score = models.DecimalField(max_digits=5, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    def __str__(self):
-        return f"Match between {self.user.username} and {self.matched_user.username}"
-
-
-class Message(models.Model):
-    sender = models.ForeignKey(User, related_name='sent_messages', on_delete=models.CASCADE)
-    receiver = models.ForeignKey(User, related_name='received_messages', on_delete=models.CASCADE)
-    content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
-
-    def __str__(self):
-        return f"Message from {self.sender.username} to {self.receiver.username}"
-
-class Event(models.Model):
-    title = models.CharField(max_length=200)
-    description = models.TextField()
-    location = models.CharField(max_length=200)
-    
-    # Temporarily allow null values
-    event_datetime = models.DateTimeField(null=True)  # Change this line
-
-    created_by = models.ForeignKey(User, on_delete=models.CASCADE)  # Link to the creator of the event
-    participants = models.ManyToManyField(User, related_name='events', blank=True)  # Allow multiple participants
-
-    def clean(self):
-        # Ensure the event date is in the future
-        if self.event_datetime and self.event_datetime < timezone.now():
-            raise ValidationError('The event date must be in the future.')
-
-    def __str__(self):
-        return self.title
-
-
-class EventResponse(models.Model):
-    event = models.ForeignKey(Event, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-
-   # True for accept; False for reject
-    response = models.BooleanField()
-
-    class Meta:
-       unique_together = ('event', 'user')  # Ensure a user can respond only once to an event
-
-    def __str__(self):
+from django.db import models
+from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .media import ContentAddressedStorage, profile_picture_path
+
+class User(AbstractUser):
+    email = models.EmailField(unique=True)
+    is_verified = models.BooleanField(default=False)
+
+    groups = models.ManyToManyField(
+        'auth.Group',
+        related_name='matriapp_user_groups',
+        blank=True,
+    )
+    user_permissions = models.ManyToManyField(
+        'auth.Permission',
+        related_name='matriapp_user_permissions',
+        blank=True,
+    )
+
+    def __str__(self):
+        return self.username  # or return self.email if you prefer
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    bio = models.TextField(max_length=500, blank=True)
+    location = models.CharField(max_length=100, blank=True)
+    birth_date = models.DateField(null=True, blank=True)
+    gender = models.CharField(max_length=10, choices=[('Male', 'Male'), ('Female', 'Female')])
+    religion = models.CharField(max_length=50, blank=True)
+    caste = models.CharField(max_length=50, blank=True)
+    height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    education = models.CharField(max_length=100, blank=True)
+    occupation = models.CharField(max_length=100, blank=True)
+    income = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    profile_picture = models.ImageField(upload_to=profile_picture_path, storage=ContentAddressedStorage(), null=True, blank=True)
+    # Set by matriapp.images after each upload: SHA-256 of the original and its small WebP renditions
+    picture_hash = models.CharField(max_length=64, blank=True, editable=False)
+    picture_thumbnail = models.ImageField(blank=True, editable=False)
+    picture_medium = models.ImageField(blank=True, editable=False)
+    # Derived from birth_date on save (see signals.py): its year, and its cohort of AGE_BUCKET_YEARS years
+    birth_year = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    age_bucket = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    # Vocabulary codes of the text fields above, set on save by matriapp.vocab (0 when blank)
+    religion_code = models.PositiveIntegerField(default=0, editable=False)
+    caste_code = models.PositiveIntegerField(default=0, editable=False)
+    education_code = models.PositiveIntegerField(default=0, editable=False)
+    occupation_code = models.PositiveIntegerField(default=0, editable=False)
+    location_code = models.PositiveIntegerField(default=0, editable=False)
+    # When a column read by the scorer last changed, set in signals.py; the profile
+    # snapshot (see matriapp.snapshot) overlays rows changed after it was written
+    scoring_changed_at = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+
+    class Meta:
+        # Candidate generation filters on gender first, then ranges or equality on these columns
+        indexes = [
+            models.Index(fields=['gender', 'birth_date'], name='profile_gender_birth_idx'),
+            models.Index(fields=['gender', 'height'], name='profile_gender_height_idx'),
+            models.Index(fields=['gender', 'religion', 'caste'], name='profile_gender_religion_idx'),
+            models.Index(fields=['gender', 'location'], name='profile_gender_location_idx'),
+            models.Index(fields=['gender', 'age_bucket', 'height'], name='profile_gender_age_height_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}'s Profile"
+
+    @property
+    def age(self):
+        if self.birth_date is None:
+            return None
+        today = timezone.localdate()
+        return today.year - self.birth_date.year - ((today.month, today.day) < (self.birth_date.month, self.birth_date.day))
+
+
+class PartnerPreference(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    min_age = models.IntegerField(null=True, blank=True)
+    max_age = models.IntegerField(null=True, blank=True)
+    min_height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    max_height = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    religion = models.CharField(max_length=50, blank=True)
+    caste = models.CharField(max_length=50, blank=True)
+    education = models.CharField(max_length=100, blank=True)
+    occupation = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=100, blank=True)
+    religion_code = models.PositiveIntegerField(default=0, editable=False)
+    caste_code = models.PositiveIntegerField(default=0, editable=False)
+    education_code = models.PositiveIntegerField(default=0, editable=False)
+    occupation_code = models.PositiveIntegerField(default=0, editable=False)
+    location_code = models.PositiveIntegerField(default=0, editable=False)
+    scoring_changed_at = models.DateTimeField(auto_now=True, db_index=True)  # Every field is scored
+
+    def __str__(self):
+        return f"{self.user.username}'s Preferences"
+
+
+# Reference vocabularies for the free-text profile fields matched by equality.
+# Each term's id is the code stored on profiles and preferences; every spelling
+# that should match the term (its own label included) is one of its aliases.
+VOCABULARY_KINDS = [
+    ('religion', 'Religion'),
+    ('caste', 'Caste'),
+    ('education', 'Education'),
+    ('occupation', 'Occupation'),
+    ('location', 'Location'),
+]
+
+
+def normalize_vocabulary(text):
+    # Case and spacing never distinguish two terms
+    return ' '.join((text or '').split()).casefold()
+
+
+class VocabularyTerm(models.Model):
+    kind = models.CharField(max_length=20, choices=VOCABULARY_KINDS)
+    label = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'label'], name='unique_vocabulary_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.label}"
+
+
+class VocabularyAlias(models.Model):
+    term = models.ForeignKey(VocabularyTerm, related_name='aliases', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=VOCABULARY_KINDS)  # Copied from the term so names are unique per kind
+    name = models.CharField(max_length=100)  # Stored normalized
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'name'], name='unique_vocabulary_alias'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.kind = self.term.kind
+        self.name = normalize_vocabulary(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+# A single row (created by its migration) whose version moves whenever aliases are
+# edited or terms deleted; every process compares it with the version its
+# vocabulary was loaded at, whatever cache it is configured with (see matriapp.vocab)
+class VocabularyVersion(models.Model):
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Vocabulary version {self.version}"
+
+
+# One row per unordered pair of users with a positive score either way, stored
+# with the lower user id first. match_score is user's score for matched_user and
+# reverse_score matched_user's score for user; mutual_score is the lower of the
+# two, so it is positive only when both are interested. Kept by matriapp.matching.
+class Match(models.Model):
+    user = models.ForeignKey(User, related_name='matches', on_delete=models.CASCADE)
+    matched_user = models.ForeignKey(User, related_name='matched_with', on_delete=models.CASCADE)
+    match_score = models.DecimalField(max_digits=5, decimal_places=2)
+    reverse_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    mutual_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)  # Set on every rescore
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'matched_user'], name='unique_match_per_pair'),
+            models.CheckConstraint(condition=models.Q(user__lt=models.F('matched_user')), name='match_pair_ordered'),
+        ]
+        indexes = [
+            # A user's ranked list reads both sides of their pairs, each from its own index
+            models.Index(fields=['user', '-match_score', 'matched_user'], name='match_user_score_idx'),
+            models.Index(fields=['matched_user', '-reverse_score', 'user'], name='match_reverse_score_idx'),
+            # Mutual matches, likewise from either side
+            models.Index(fields=['user', '-mutual_score', 'matched_user'], name='match_user_mutual_idx',
+                         condition=models.Q(mutual_score__gt=0)),
+            models.Index(fields=['matched_user', '-mutual_score', 'user'], name='match_reverse_mutual_idx',
+                         condition=models.Q(mutual_score__gt=0)),
+        ]
+
+    def __str__(self):
+        return f"Match between {self.user.username} and {self.matched_user.username}"
+
+
+class Message(models.Model):
+    sender = models.ForeignKey(User, related_name='sent_messages', on_delete=models.CASCADE)
+    # Empty for chat room messages that are not addressed to a single user
+    receiver = models.ForeignKey(User, related_name='received_messages', on_delete=models.CASCADE, null=True, blank=True)
+    room_name = models.CharField(max_length=100, blank=True)  # Set for messages sent through a chat room
+    content = models.TextField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Serves chat history pages: newest first within a room, keyset on (timestamp, id)
+            models.Index(fields=['room_name', 'timestamp', 'id'], name='message_room_time_idx'),
+        ]
+
+    def __str__(self):
+        if self.receiver_id is None:
+            return f"Message from {self.sender.username} in {self.room_name}"
+        return f"Message from {self.sender.username} to {self.receiver.username}"
+
+# One row per pair of users who have exchanged messages, stored once with the
+# lower user id first. Kept up to date by matriapp.inbox on every message insert
+# so the inbox lists conversations without grouping the Message table.
+class Conversation(models.Model):
+    user_low = models.ForeignKey(User, related_name='conversations_as_low', on_delete=models.CASCADE)
+    user_high = models.ForeignKey(User, related_name='conversations_as_high', on_delete=models.CASCADE)
+    last_message = models.ForeignKey(Message, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    last_activity = models.DateTimeField()
+    unread_low = models.PositiveIntegerField(default=0)  # Unread messages addressed to user_low
+    unread_high = models.PositiveIntegerField(default=0)  # Unread messages addressed to user_high
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='unique_conversation_per_pair'),
+        ]
+        indexes = [
+            # Each participant's inbox, most recent first, keyset on (last_activity, id)
+            models.Index(fields=['user_low', '-last_activity', '-id'], name='conversation_low_recent_idx'),
+            models.Index(fields=['user_high', '-last_activity', '-id'], name='conversation_high_recent_idx'),
+        ]
+
+    def other_user_id(self, user_id):
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+
+    def unread_for(self, user_id):
+        return self.unread_low if user_id == self.user_low_id else self.unread_high
+
+    def __str__(self):
+        return f"Conversation between {self.user_low_id} and {self.user_high_id}"
+
+# Unread messages per receiver, kept in step with Message by matriapp.inbox so
+# the unread badge is a primary-key lookup instead of a scan of the inbox
+class UnreadCount(models.Model):
+    user = models.OneToOneField(User, primary_key=True, related_name='unread_count', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count} unread"
+
+class Event(models.Model):
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    location = models.CharField(max_length=200)
+    
+    # Temporarily allow null values
+    event_datetime = models.DateTimeField(null=True)  # Change this line
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)  # Link to the creator of the event
+    participants = models.ManyToManyField(User, related_name='events', blank=True)  # Allow multiple participants
+
+    def clean(self):
+        # Ensure the event date is in the future
+        if self.event_datetime and self.event_datetime < timezone.now():
+            raise ValidationError('The event date must be in the future.')
+
+    def __str__(self):
+        return self.title
+
+
+class EventResponse(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+   # True for accept; False for reject
+    response = models.BooleanField()
+
+    class Meta:
+       unique_together = ('event', 'user')  # Ensure a user can respond only once to an event
+
+    def __str__(self):
        return f"{self.user.username} responded {'accepted' if self.response else 'rejected'} to {self.event.title}"
\ No newline at end of file
@@ -0,0 +1,127 @@
+import base64
+import binascii
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 100
+
+
+def encode_cursor(values):
+    # Opaque, URL-safe token holding the sort key of the last row on a page
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor, types):
+    """Return the sort key stored in ``cursor``, or ``None`` for the first page.
+
+    ``types`` converts each value of the key (e.g. ``(Decimal, int)``).
+    Raises ``ValueError`` for a malformed or tampered cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError('Invalid cursor')
+        return [convert(value) for convert, value in zip(types, values)]
+    except (binascii.Error, UnicodeError, TypeError, ValueError, ArithmeticError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_timestamp(value):
+    # Cursor converter for datetimes stored with isoformat(), which keeps microseconds
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('Invalid timestamp')
+    return parsed
+
+
+def page_size(request, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(request.GET.get('limit', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, limit, cursor_values):
+    """Evaluate one page of an ordered, keyset-filtered queryset.
+
+    ``cursor_values(row)`` returns the sort key of a row. One extra row is
+    fetched to know whether a next page exists.
+    """
+    rows = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(cursor_values(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def stream_json_page(queryset, limit, cursor_values, serialize):
+    """Stream one page as ``{"results": [...], "next": cursor}``.
+
+    Rows are read from the database in chunks and written out as they
+    arrive, so the response starts before the page is fully built.
+    """
+    def generate():
+        yield '{"results": ['
+        last = None
+        for index, row in enumerate(queryset[:limit + 1].iterator(chunk_size=STREAM_CHUNK_SIZE)):
+            if index == limit:
+                yield '], "next": %s}' % json.dumps(encode_cursor(cursor_values(last)))
+                return
+            yield (',' if index else '') + json.dumps(serialize(row), cls=DjangoJSONEncoder)
+            last = row
+        yield '], "next": null}'
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
+
+def stream_json_rows(rows, next_cursor, serialize):
+    """Stream rows already read, such as a page merged from several queries,
+    as ``{"results": [...], "next": cursor}``; ``rows`` may be any iterable."""
+    def generate():
+        yield '{"results": ['
+        for index, row in enumerate(rows):
+            yield (',' if index else '') + json.dumps(serialize(row), cls=DjangoJSONEncoder)
+        yield '], "next": %s}' % json.dumps(next_cursor)
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
+
+async def akeyset_page(queryset, limit, cursor_values):
+    # keyset_page for async views
+    rows = [row async for row in queryset[:limit + 1]]
+    next_cursor = encode_cursor(cursor_values(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def astream_json_page(queryset, limit, cursor_values, serialize):
+    # stream_json_page for async views: rows are read with the async iterator,
+    # so the response is streamed without a thread held for its whole length
+    async def generate():
+        yield '{"results": ['
+        last, index = None, 0
+        async for row in queryset[:limit + 1].aiterator(chunk_size=STREAM_CHUNK_SIZE):
+            if index == limit:
+                yield '], "next": %s}' % json.dumps(encode_cursor(cursor_values(last)))
+                return
+            yield (',' if index else '') + json.dumps(serialize(row), cls=DjangoJSONEncoder)
+            last, index = row, index + 1
+        yield '], "next": null}'
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
+
+def astream_json_rows(rows, next_cursor, serialize):
+    # stream_json_rows for async views: under ASGI Django would first read a sync iterator whole
+    async def generate():
+        yield '{"results": ['
+        for index, row in enumerate(rows):
+            yield (',' if index else '') + json.dumps(serialize(row), cls=DjangoJSONEncoder)
+        yield '], "next": %s}' % json.dumps(next_cursor)
+
+    return StreamingHttpResponse(generate(), content_type='application/json')
@@ -0,0 +1,309 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .inbox import conversation_page
+from .models import Profile
+from .routers import on_primary
+from .utils import OPPOSITE_GENDER
+from .vocab import BLANK_CODE, VOCABULARY_FIELDS, code_field
+
+# Profile columns encoded into feature vectors, fetched in a single query
+FEATURE_COLUMNS = ('user_id', 'gender', 'birth_date', 'height', 'income') + tuple(
+    code_field(field) for field in VOCABULARY_FIELDS)
+# A profile's feature vector one-hot encodes each vocabulary field into its own
+# block of slots, followed by the numeric features standardized with the mean and
+# deviation at build time. A build gives each code of a field seen in it a slot
+# of its own (``vocabulary`` and ``blocks``, see _vocabulary); codes first used
+# after the build share the block's last slot until the next one. Vectors are
+# stored compactly as each field's slot, the numbers and the vector's length,
+# and compared as cosine similarities.
+NUMERIC_FEATURES = ('birth', 'height', 'income')
+GENDERS = ('', 'Male', 'Female')
+
+# Random-projection LSH: each table hashes a vector to the signs of BITS projections
+TABLES = 12
+BITS = 14  # With multiprobe, about 88% recall@10 scanning 5% of 100,000 profiles (benchmark_similarity)
+SEEDS = 10  # Most recent conversation partners used as seeds for recommendations
+ARRAYS = ('user_ids', 'genders', 'slots', 'numbers', 'norms', 'mean', 'std', 'vocabulary', 'blocks', 'planes', 'keys',
+          'order')
+CURRENT = 'CURRENT'  # Names the directory of the current build
+
+
+def _raw_features(rows):
+    # Columns of FEATURE_COLUMNS rows: user ids, gender indexes, code matrix and raw numeric features
+    rows = list(rows)
+    columns = dict(zip(FEATURE_COLUMNS, zip(*rows))) if rows else {name: () for name in FEATURE_COLUMNS}
+    user_ids = np.array(columns['user_id'], dtype=np.int64)
+    genders = np.array([GENDERS.index(value) if value in GENDERS else 0 for value in columns['gender']], dtype=np.int8)
+    codes = np.array([columns[code_field(field)] for field in VOCABULARY_FIELDS], dtype=np.int64)
+    codes = codes.T.reshape(-1, len(VOCABULARY_FIELDS))
+    numeric = np.array([
+        [value.toordinal() / 365.25 if value is not None else np.nan for value in columns['birth_date']],
+        [float(value) if value is not None else np.nan for value in columns['height']],
+        [np.log1p(float(value)) if value is not None and value >= 0 else np.nan for value in columns['income']],
+    ], dtype=np.float64).T.reshape(-1, len(NUMERIC_FEATURES))
+    return user_ids, genders, codes, numeric
+
+
+def _vocabulary(codes):
+    """``(vocabulary, blocks)`` for a code matrix: the known codes of each field in
+    order, one after the other, and the first slot of each field's block. Field
+    ``i`` has a slot per known code, then one for codes unknown to the build."""
+    known = [np.unique(codes[:, index][codes[:, index] != BLANK_CODE]) for index in range(len(VOCABULARY_FIELDS))]
+    blocks = np.concatenate([[0], np.cumsum([len(field_codes) + 1 for field_codes in known])]).astype(np.int64)
+    return np.concatenate(known).astype(np.int64), blocks
+
+
+def _encode(codes, numeric, mean, std, vocabulary, blocks):
+    """``(slots, numbers, norms)``: each field's slot (-1 when blank), the
+    standardized numbers (0 when missing) and the length of each vector."""
+    slots = np.full(codes.shape, -1, dtype=np.int32)
+    for index in range(len(VOCABULARY_FIELDS)):
+        start, end = blocks[index], blocks[index + 1]
+        field_codes = vocabulary[start - index:end - index - 1]
+        column = codes[:, index]
+        slot = np.where(np.isin(column, field_codes), start + np.searchsorted(field_codes, column), end - 1)
+        slots[:, index] = np.where(column != BLANK_CODE, slot, -1)
+    numbers = np.nan_to_num(np.clip((numeric - mean) / std, -3.0, 3.0)).astype(np.float32)
+    norms = np.sqrt((slots >= 0).sum(axis=1) + (numbers ** 2).sum(axis=1)).astype(np.float32)
+    return slots, numbers, norms
+
+
+def _hash_keys(planes, slots, numbers):
+    # (tables, rows) bucket keys: bit b of a key is the sign of projection b.
+    # A one-hot slot projects to its column of the planes, so no dense vector is built.
+    projections = np.einsum('tbd,nd->tnb', planes[..., -len(NUMERIC_FEATURES):], numbers)
+    for index in range(len(VOCABULARY_FIELDS)):
+        known = slots[:, index] >= 0
+        columns = planes[..., slots[known, index]]  # (tables, bits, known rows)
+        projections[:, known] += columns.transpose(0, 2, 1)
+    return (projections > 0).astype(np.int64) @ (np.int64(1) << np.arange(planes.shape[1], dtype=np.int64))
+
+
+def similarities(arrays, rows, seed):
+    """Cosine similarity of ``rows`` of ``arrays`` to ``seed``, an ``(slots, numbers, norm)`` row."""
+    slots, numbers, norm = seed
+    slots = np.where(slots >= 0, slots, -2)  # A blank field matches nothing, not other blanks
+    dots = (arrays['slots'][rows] == slots).sum(axis=1) + arrays['numbers'][rows] @ numbers
+    lengths = arrays['norms'][rows] * norm
+    return np.divide(dots, lengths, out=np.zeros(len(lengths)), where=lengths > 0)
+
+
+def build_arrays(rows, tables=TABLES, bits=BITS, seed=0):
+    """The index over FEATURE_COLUMNS ``rows`` as a dict of ARRAYS.
+
+    Rows are kept in user id order. For each table ``keys`` holds the
+    sorted bucket keys and ``order`` the row of each, so a bucket is one
+    binary search.
+    """
+    user_ids, genders, codes, numeric = _raw_features(rows)
+    by_user = np.argsort(user_ids, kind='stable')
+    user_ids, genders, codes, numeric = user_ids[by_user], genders[by_user], codes[by_user], numeric[by_user]
+    # Mean and deviation of the known values; a column with none stays at 0 and 1
+    counts = np.maximum((~np.isnan(numeric)).sum(axis=0), 1)
+    mean = np.nansum(numeric, axis=0) / counts
+    std = np.sqrt(np.nansum((numeric - mean) ** 2, axis=0) / counts)
+    std[std == 0] = 1.0
+    vocabulary, blocks = _vocabulary(codes)
+    slots, numbers, norms = _encode(codes, numeric, mean, std, vocabulary, blocks)
+    dimensions = blocks[-1] + len(NUMERIC_FEATURES)
+    planes = np.random.default_rng(seed).standard_normal((tables, bits, dimensions)).astype(np.float32)
+    keys = _hash_keys(planes, slots, numbers)
+    order = np.argsort(keys, axis=1, kind='stable').astype(np.int32)
+    return {
+        'user_ids': user_ids, 'genders': genders, 'slots': slots, 'numbers': numbers, 'norms': norms,
+        'mean': mean, 'std': std, 'vocabulary': vocabulary, 'blocks': blocks,
+        'planes': planes, 'keys': np.take_along_axis(keys, order, axis=1), 'order': order,
+    }
+
+
+def save_arrays(arrays, path):
+    """Write a build under ``path`` as .npy files and make it current; returns its version.
+
+    Workers pick the new build up on their next lookup. The previous build
+    is kept, as a worker may still have it mapped.
+    """
+    version = f'v{time.time_ns()}'
+    directory = os.path.join(path, version)
+    os.makedirs(directory)
+    for name in ARRAYS:
+        np.save(os.path.join(directory, f'{name}.npy'), arrays[name])
+    with open(os.path.join(directory, 'meta.json'), 'w') as file:
+        tables, bits, dimensions = arrays['planes'].shape
+        json.dump({'rows': len(arrays['user_ids']), 'dimensions': dimensions, 'tables': tables, 'bits': bits}, file)
+    temporary = os.path.join(path, CURRENT + '.tmp')
+    with open(temporary, 'w') as file:
+        file.write(version)
+    os.replace(temporary, os.path.join(path, CURRENT))
+    builds = sorted(name for name in os.listdir(path) if name.startswith('v') and name != version)
+    for name in builds[:-1]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return version
+
+
+def load_arrays(path, version):
+    # Memory-mapped: pages are read on demand and shared between the workers on a host
+    directory = os.path.join(path, version)
+    return {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+
+
+def current_version(path):
+    try:
+        with open(os.path.join(path, CURRENT)) as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def nearest(arrays, seed, multiprobe=True):
+    """Rows in the LSH buckets of ``seed`` (see ``similarities``), in any table, in row order.
+
+    With ``multiprobe`` the buckets one bit away are searched as well,
+    which raises recall without building more tables.
+    """
+    tables, size = arrays['keys'].shape
+    keys = _hash_keys(arrays['planes'], seed[0][None, :], seed[1][None, :])
+    if multiprobe:
+        keys = np.hstack([keys, keys ^ (np.int64(1) << np.arange(arrays['planes'].shape[1], dtype=np.int64))])
+    starts = np.empty(keys.shape, dtype=np.int64)
+    ends = np.empty(keys.shape, dtype=np.int64)
+    for table in range(tables):
+        starts[table] = np.searchsorted(arrays['keys'][table], keys[table], 'left')
+        ends[table] = np.searchsorted(arrays['keys'][table], keys[table], 'right')
+    # Every bucket is a slice of its table's row of ``order``; gather them all at once
+    offsets = (np.arange(tables, dtype=np.int64) * size)[:, None]
+    starts, lengths = (starts + offsets).ravel(), (ends - starts).ravel()
+    positions = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+    found = np.zeros(size, dtype=bool)
+    found[arrays['order'].reshape(-1)[positions]] = True
+    return np.flatnonzero(found)
+
+
+class SimilarityIndex:
+    """Approximate nearest neighbours over profile feature vectors.
+
+    Built offline by the build_similarity_index command and memory-mapped
+    from ``SIMILARITY_INDEX_DIR``; without a build it is built in memory
+    with one query on first use. Saved or deleted profiles are marked stale
+    by signals.py and re-encoded into an overlay before the next lookup,
+    which takes precedence over their rows in the build. Like the search
+    index, the overlay is per process until the next build.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._arrays = None
+        self._version = None
+        self._overlay = {}  # user id -> (gender index, slots, numbers, norm), or None once deleted
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def _directory(self):
+        return self._path or getattr(settings, 'SIMILARITY_INDEX_DIR', None)
+
+    @on_primary
+    def _current(self):
+        path = self._directory()
+        version = current_version(path) if path else None
+        if self._arrays is None or (version is not None and version != self._version):
+            if version is not None:
+                self._arrays = load_arrays(path, version)
+            else:
+                self._arrays = build_arrays(Profile.objects.values_list(*FEATURE_COLUMNS).iterator())
+            # Changes seen since the last build may or may not be in this one
+            self._stale.update(self._overlay)
+            self._overlay = {}
+            self._version = version
+        if self._stale:
+            stale, self._stale = self._stale, set()
+            user_ids, genders, codes, numeric = _raw_features(
+                Profile.objects.filter(user_id__in=stale).values_list(*FEATURE_COLUMNS))
+            slots, numbers, norms = _encode(codes, numeric, self._arrays['mean'], self._arrays['std'],
+                                            self._arrays['vocabulary'], self._arrays['blocks'])
+            self._overlay.update(dict.fromkeys(stale))
+            for row, user_id in enumerate(user_ids.tolist()):
+                self._overlay[user_id] = (genders[row], slots[row], numbers[row], norms[row])
+        return self._arrays, dict(self._overlay)
+
+    def mark_stale(self, user_id):
+        with self._lock:
+            if self._arrays is not None:
+                self._stale.add(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._arrays = None
+            self._version = None
+            self._overlay = {}
+            self._stale = set()
+
+    def _seed(self, arrays, overlay, user_id):
+        if user_id in overlay:
+            return overlay[user_id] and overlay[user_id][1:]
+        row = np.searchsorted(arrays['user_ids'], user_id)
+        if row < len(arrays['user_ids']) and arrays['user_ids'][row] == user_id:
+            return arrays['slots'][row], arrays['numbers'][row], arrays['norms'][row]
+        return None
+
+    def similar(self, user_ids, limit, gender=None, exclude=(), exact=False):
+        """Up to ``limit`` ``(user id, similarity)`` pairs most like any of ``user_ids``, best first.
+
+        Each candidate counts with its best cosine similarity to one of the
+        seeds. ``gender`` restricts results to that gender. ``exact``
+        compares against every profile instead of the LSH buckets.
+        """
+        with self._lock:
+            arrays, overlay = self._current()
+        seeds = [seed for seed in (self._seed(arrays, overlay, user_id) for user_id in user_ids) if seed is not None]
+        if not seeds:
+            return []
+        wanted = GENDERS.index(gender) if gender in GENDERS else None
+        skipped = np.fromiter([*exclude, *overlay], dtype=np.int64)
+        # Changed profiles are few, so they are always compared exactly
+        changed = [(user_id, entry) for user_id, entry in overlay.items() if entry is not None
+                   and user_id not in exclude and (wanted is None or entry[0] == wanted)]
+        changed_arrays = {
+            'user_ids': np.array([user_id for user_id, _ in changed], dtype=np.int64),
+            'slots': np.array([entry[1] for _, entry in changed], dtype=np.int32).reshape(-1, len(VOCABULARY_FIELDS)),
+            'numbers': np.array([entry[2] for _, entry in changed], dtype=np.float32).reshape(-1, len(NUMERIC_FEATURES)),
+            'norms': np.array([entry[3] for _, entry in changed], dtype=np.float32),
+        }
+
+        found_ids, found_similarities = [], []
+        for seed in seeds:
+            rows = np.arange(len(arrays['user_ids'])) if exact else nearest(arrays, seed)
+            if wanted is not None:
+                rows = rows[arrays['genders'][rows] == wanted]
+            rows = rows[~np.isin(arrays['user_ids'][rows], skipped)]
+            found_ids.extend([arrays['user_ids'][rows], changed_arrays['user_ids']])
+            found_similarities.extend([similarities(arrays, rows, seed),
+                                       similarities(changed_arrays, slice(None), seed)])
+        ids, scores = np.concatenate(found_ids), np.concatenate(found_similarities)
+
+        # Each candidate's best similarity, then the best candidates
+        order = np.lexsort((-scores, ids))
+        ids, scores = ids[order], scores[order]
+        first = np.ones(ids.size, dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        ids, scores = ids[first], scores[first]
+        order = np.lexsort((ids, -scores))[:limit]
+        return [(int(ids[index]), float(scores[index])) for index in order]
+
+
+similarity_index = SimilarityIndex()
+
+
+def recommend_for_user(user_id, limit):
+    """Profiles similar to the user's most recent conversation partners, as ``(user id, similarity)``."""
+    gender = Profile.objects.filter(user_id=user_id).values_list('gender', flat=True).first()
+    conversations, _ = conversation_page(user_id, SEEDS)
+    seeds = [conversation.other_user_id(user_id) for conversation in conversations]
+    if not seeds or OPPOSITE_GENDER.get(gender) is None:
+        return []
+    return similarity_index.similar(seeds, limit, gender=OPPOSITE_GENDER[gender], exclude={user_id, *seeds})
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .matching import directed_scores, join_pairs, replace_all_matches, scoring_columns, scoring_preferences
+from .models import Profile
+from .scoring import DEFAULT_MATCH_SCORING
+
+SHARD_SIZE = 500  # Preferences scored per task
+MANIFEST = 'manifest.json'
+
+# Loaded once per worker process by _start_worker
+_columns = None
+
+
+def plan_shards(shard_size=SHARD_SIZE):
+    """Split the users with preferences into ``(after, until)`` user id ranges of
+    about ``shard_size`` each. The last range is open so later users still fall in one."""
+    user_ids = list(scoring_preferences().order_by('user_id').values_list('user_id', flat=True))
+    bounds = user_ids[shard_size - 1::shard_size]
+    if bounds and bounds[-1] == user_ids[-1]:
+        bounds.pop()
+    return list(zip([0] + bounds, bounds + [None]))
+
+
+def data_watermark():
+    """The newest scoring change and the row count of the profiles and of the
+    preferences: it moves whenever the scores may have (the counts catch deletions)."""
+    return [
+        queryset.aggregate(rows=Count('id'), changed=Max('scoring_changed_at'))
+        for queryset in (Profile.objects.all(), scoring_preferences())
+    ]
+
+
+def _start_worker(today):
+    global _columns
+    django.setup()
+    # Connections inherited from the parent process must not be shared
+    for conn in connections.all(initialized_only=True):
+        conn.close()
+    _columns = scoring_columns(today)
+
+
+def score_shard(shard, today, columns=None):
+    """Directed scores of the preferences in one shard against every profile.
+
+    ``columns`` is what ``scoring_columns`` returns; worker processes load
+    it once, from the profile snapshot when there is one.
+    """
+    preferences, candidates = columns or _columns or scoring_columns(today)
+    after, until = shard
+    selected = []
+    for part in preferences:
+        rows = part.user_id > after
+        if until is not None:
+            rows &= part.user_id <= until
+        if part.live is not None:
+            rows &= part.live
+        selected.append(part.take(np.flatnonzero(rows)))
+    return directed_scores(selected, candidates)
+
+
+class Checkpoints:
+    """Finished shards saved as .npz files, so an interrupted run resumes where it stopped.
+
+    The directory is only reused by a run with the same shards, scoring spec,
+    day (ages depend on it) and ``data_watermark``; otherwise it is emptied
+    first. A run resumed after profiles or preferences changed thus starts
+    over, rather than mixing stale shards into the table it replaces.
+    """
+
+    def __init__(self, path, shards, today, watermark):
+        self.path = path
+        self.shards = shards
+        spec = getattr(settings, 'MATCH_SCORING', DEFAULT_MATCH_SCORING)
+        fingerprint = json.dumps([shards, str(today), spec, watermark], sort_keys=True, default=str)
+        self.key = hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def _file(self, index):
+        return os.path.join(self.path, f'shard-{index:05d}.npz')
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        manifest = os.path.join(self.path, MANIFEST)
+        try:
+            with open(manifest) as file:
+                current = json.load(file).get('key') == self.key
+        except (OSError, ValueError):
+            current = False
+        if not current:
+            for name in os.listdir(self.path):
+                if name.startswith('shard-') and name.endswith('.npz'):
+                    os.remove(os.path.join(self.path, name))
+            with open(manifest, 'w') as file:
+                json.dump({'key': self.key, 'shards': self.shards}, file)
+
+    def load(self, index):
+        try:
+            with np.load(self._file(index)) as data:
+                return data['scoring'], data['scored'], data['scores']
+        except OSError:
+            return None
+
+    def save(self, index, result):
+        scoring, scored, scores = result
+        temporary = self._file(index) + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.savez(file, scoring=scoring, scored=scored, scores=scores)
+        os.replace(temporary, self._file(index))  # Never leaves a partly written shard behind
+
+
+def recompute_all_matches(workers=None, shard_size=SHARD_SIZE, checkpoint_dir=None, dry_run=False, progress=None):
+    """Rebuild the Match table with shards of preferences scored in parallel processes.
+
+    Each worker loads the profile columns once, memory-mapping the profile
+    snapshot when there is one, and scores whole shards against them; the parent joins both directions of every pair and
+    replaces the table in one transaction, as ``rebuild_all_matches`` does.
+    With ``workers=1`` shards are scored in this process. ``progress`` is
+    called as ``progress(done, total)`` after each shard. Returns
+    a dict of counts and timings; with ``dry_run`` nothing is written.
+    """
+    started = time.perf_counter()
+    today = timezone.localdate()
+    shards = plan_shards(shard_size)
+    checkpoints = Checkpoints(checkpoint_dir, shards, today, data_watermark()) if checkpoint_dir else None
+    results = [None] * len(shards)
+    if checkpoints is not None:
+        checkpoints.open()
+        results = [checkpoints.load(index) for index in range(len(shards))]
+    pending = [index for index, result in enumerate(results) if result is None]
+    resumed = len(shards) - len(pending)
+    done = resumed
+
+    def finish(index, result):
+        nonlocal done
+        results[index] = result
+        done += 1
+        if checkpoints is not None:
+            checkpoints.save(index, result)
+        if progress is not None:
+            progress(done, len(shards))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        columns = scoring_columns(today) if pending else None
+        for index in pending:
+            finish(index, score_shard(shards[index], today, columns))
+    elif pending:
+        connections.close_all()  # Forked workers must not inherit open connections
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_start_worker,
+                                 initargs=(today,)) as executor:
+            futures = {executor.submit(score_shard, shards[index], today): index for index in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+    scored_at = time.perf_counter()
+
+    # plan_shards always returns at least one shard
+    scoring, scored, scores = (np.concatenate(column) for column in zip(*results))
+    with_preferences = list(scoring_preferences().values_list('user_id', flat=True))
+    pairs = join_pairs(scoring, scored, scores, with_preferences)
+    joined_at = time.perf_counter()
+    written = 0 if dry_run else replace_all_matches(pairs)
+    return {
+        'shards': len(shards), 'resumed': resumed, 'users': len(with_preferences),
+        'directed': len(scores), 'pairs': len(pairs[0]), 'written': written,
+        'scoring': scored_at - started, 'joining': joined_at - scored_at,
+        'writing': time.perf_counter() - joined_at,
+    }
@@ -0,0 +1,204 @@
+import contextlib
+import contextvars
+import functools
+import math
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from matrimony.database import replica_aliases
+
+CHAT_DATABASE = 'chat'  # Configured in ASGI processes only (see matrimony/database.py)
+PRIMARY_UNTIL_KEY = '_primary_until'  # Session key: this user's reads stay on the primary until then
+
+# Seconds a replica is behind: 0 once it has replayed all it received
+LAG_SQL = {
+    'postgresql': """
+        SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+    """,
+}
+
+_alias = contextvars.ContextVar('database_alias', default=None)
+_replica_reads = contextvars.ContextVar('replica_reads', default=None)
+
+
+def _same_database(alias, other):
+    settings, other_settings = connections.settings[alias], connections.settings[other]
+    return all(settings.get(key) == other_settings.get(key) for key in ('ENGINE', 'NAME', 'HOST', 'PORT'))
+
+
+def _holds_default(alias):
+    # The default database's rows, through another connection or a replica of it
+    return alias in replica_aliases(connections.settings) or _same_database(alias, DEFAULT_DB_ALIAS)
+
+
+class AliasRouter:
+    """Sends the queries made inside ``use_database(alias)`` to that alias,
+    and the reads made inside ``use_replica()`` to a replica.
+
+    The aliases are extra connections to the default database with pools
+    of their own, or replicas of it, so objects read through one may be
+    related to objects read through another, and only the default alias
+    is migrated. Reads in a transaction on the default database stay on
+    it, as do reads for update.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _alias.get()
+        reads = _replica_reads.get()
+        if alias is None and reads is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            alias = reads.alias()
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return _alias.get()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        db1, db2 = obj1._state.db, obj2._state.db
+        if db1 and db2 and (_same_database(db1, db2) or (_holds_default(db1) and _holds_default(db2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db != DEFAULT_DB_ALIAS and _holds_default(db):
+            return False
+        return None
+
+
+@contextlib.contextmanager
+def use_database(alias):
+    """Route the queries made in this context (and the threads it hands work to) to ``alias``."""
+    token = _alias.set(alias)
+    try:
+        yield
+    finally:
+        _alias.reset(token)
+
+
+def chat_database():
+    # The chat consumers' own alias where it is configured, else the default
+    return CHAT_DATABASE if CHAT_DATABASE in connections.settings else None
+
+
+def on_chat_database(function):
+    """``function`` with its queries sent to the chat alias; wrap what chat
+    code hands to ``database_sync_to_async``."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with use_database(chat_database()):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def on_primary(function):
+    """``function`` with its queries sent to the default database, even inside
+    ``use_replica()``: for reads kept past the request, which a lagging replica
+    would leave stale after the change that invalidated them."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with use_database(DEFAULT_DB_ALIAS):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def replica_lag(alias):
+    """Seconds ``alias`` is behind the primary; ``inf`` when it cannot be reached."""
+    connection = connections[alias]
+    sql = LAG_SQL.get(connection.vendor)
+    if sql is None:
+        return 0.0  # No replication to measure, e.g. a copied SQLite file standing in for a replica
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return math.inf
+    return float(lag or 0)
+
+
+class ReplicaLag:
+    """The lag of each replica, measured at most every
+    ``DATABASE_REPLICA_LAG_CHECK_INTERVAL`` seconds in a process."""
+
+    def __init__(self):
+        self._checked = {}  # alias: (time.monotonic() of the check, lag)
+
+    def lag(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+        if checked is None or now - checked[0] >= settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL:
+            checked = self._checked[alias] = (now, replica_lag(alias))
+        return checked[1]
+
+    def choose(self):
+        """A replica within ``DATABASE_REPLICA_MAX_LAG``, or ``None`` for the primary."""
+        current = [alias for alias in replica_aliases(connections.settings)
+                   if self.lag(alias) <= settings.DATABASE_REPLICA_MAX_LAG]
+        return random.choice(current) if current else None
+
+    def clear(self):
+        self._checked = {}
+
+
+replica_lags = ReplicaLag()
+
+
+class _ReplicaReads:
+    # The replica of one use_replica() context, chosen on its first read: a
+    # context that reads nothing checks no lag, and all its reads see one replica
+    def __init__(self):
+        self._alias = None
+        self._chosen = False
+
+    def alias(self):
+        if not self._chosen:
+            self._alias, self._chosen = replica_lags.choose(), True
+        return self._alias
+
+
+@contextlib.contextmanager
+def use_replica():
+    """Send the reads made in this context (and the threads it hands work to)
+    to a replica that is keeping up, or to the primary when none is."""
+    token = _replica_reads.set(_ReplicaReads())
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_your_writes(request):
+    """Keep the user's reads on the primary for as long as a replica may lag,
+    so their next pages show what they just saved."""
+    request.session[PRIMARY_UNTIL_KEY] = (
+        time.time() + settings.DATABASE_REPLICA_MAX_LAG + settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL)
+
+
+def _stuck_to_primary(until):
+    return until is not None and until > time.time()
+
+
+def replica_reads(view):
+    """``view`` with its reads served by a replica (see ``use_replica``),
+    unless the user saved something lately (see ``read_your_writes``).
+    Apply it below ``login_required``, so the session user is read from the primary.
+    A streamed body is read after the view returns, so from the primary."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if _stuck_to_primary(await request.session.aget(PRIMARY_UNTIL_KEY)):
+                return await view(request, *args, **kwargs)
+            with use_replica():
+                return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _stuck_to_primary(request.session.get(PRIMARY_UNTIL_KEY)):
+                return view(request, *args, **kwargs)
+            with use_replica():
+                return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,167 @@
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.core.signals import setting_changed
+
+from .vocab import VOCABULARY_FIELDS
+
+DAYS_PER_YEAR = 365.25
+
+# Range criteria as (lower bound, upper bound, profile value) column names, an
+# offset making the lower bound inclusive, and the unit of ``soft`` in column units.
+# The age window is a range of birth date ordinals whose lower bound is exclusive.
+RANGE_CRITERIA = {
+    'age': ('born_after', 'born_until', 'birth_ordinal', 1.0, DAYS_PER_YEAR),  # soft: years
+    'height': ('min_height', 'max_height', 'height', 0.0, 1.0),  # soft: centimetres
+}
+CRITERIA = tuple(RANGE_CRITERIA) + VOCABULARY_FIELDS
+
+# How a pair's two directions are combined in mutual mode
+MUTUAL_MODES = (None, 'mean', 'min')
+
+# Every criterion worth one point with hard ranges, scored one way only
+DEFAULT_MATCH_SCORING = {
+    'criteria': {name: {'weight': 1} for name in CRITERIA},
+    'mutual': None,
+}
+
+
+def _range_term(low, high, value, offset, soft):
+    if not soft and offset:
+        def term(preferences, columns):
+            values = getattr(columns, value)
+            return (getattr(preferences, low) < values) & (values <= getattr(preferences, high))
+        return term
+    if not soft:
+        def term(preferences, columns):
+            values = getattr(columns, value)
+            return (getattr(preferences, low) <= values) & (values <= getattr(preferences, high))
+        return term
+
+    def term(preferences, columns):
+        # Full credit inside the range, falling linearly to none ``soft`` outside it
+        values = getattr(columns, value)
+        distance = np.maximum(getattr(preferences, low) + offset - values, values - getattr(preferences, high))
+        return np.nan_to_num(np.clip(1.0 - distance / soft, 0.0, 1.0))
+    return term
+
+
+def _codes_term(indexes, weights):
+    # All equality criteria at once over the code matrices (see utils.ProfileColumns.codes)
+    if indexes == list(range(len(VOCABULARY_FIELDS))) and all(weight == 1 for weight in weights):
+        def term(preferences, columns):
+            return (columns.codes == preferences.codes).sum(axis=-1)
+        return term
+    indexes, weights = np.array(indexes), np.array(weights)
+
+    def term(preferences, columns):
+        return (columns.codes[..., indexes] == preferences.codes[..., indexes]) @ weights
+    return term
+
+
+class Scorer:
+    """A scoring spec compiled into one kernel over preference and profile columns.
+
+    ``kernel(preferences, columns)`` takes objects whose attributes are
+    scalars or arrays that broadcast against each other (see utils.py) and
+    returns one score per row. Weights and soft ranges are resolved when the
+    spec is compiled, so scoring runs a fixed list of vectorized terms.
+    """
+
+    def __init__(self, terms, mutual, integral, soft=None):
+        self.mutual = mutual
+        self.soft = soft or {}  # Soft margin per range criterion, in years or centimetres
+        self.integral = integral
+        dtype = np.int64 if integral else np.float64
+        weighted = [
+            term if weight == 1 else (lambda preferences, columns, term=term, weight=weight: weight * term(preferences, columns))
+            for weight, term in terms
+        ]
+        first, rest = (weighted[0], weighted[1:]) if weighted else (None, ())
+
+        def kernel(preferences, columns):
+            eligible = (columns.gender == preferences.target_gender) & (preferences.target_gender != '')
+            if first is None:
+                return np.zeros(eligible.shape, dtype=dtype)
+            scores = first(preferences, columns).astype(dtype)
+            for term in rest:
+                scores += term(preferences, columns)
+            scores *= eligible
+            # Match.match_score keeps two decimal places
+            return scores if integral else np.round(scores, 2)
+
+        self.kernel = kernel
+
+    def combine(self, forward, backward):
+        """The mutual score of pairs scored ``forward`` one way and ``backward`` the other.
+
+        ``backward`` is NaN where the other user has no preferences; the pair
+        then keeps its one-way score. Pairs with no one-way score stay at zero.
+        """
+        if self.mutual is None or backward is None:
+            return forward
+        if self.mutual == 'min':
+            combined = np.fmin(forward, backward)
+        else:
+            combined = np.where(np.isnan(backward), forward, (forward + backward) / 2)
+        return np.where(forward > 0, np.round(combined, 2), 0)
+
+
+def compile_scoring(spec):
+    """Compile a ``MATCH_SCORING`` spec (see DEFAULT_MATCH_SCORING) into a Scorer.
+
+    Each criterion takes a ``weight`` (criteria left out are not scored),
+    and range criteria a ``soft`` margin in years or centimetres.
+    """
+    terms, integral, margins = [], True, {}
+    code_indexes, code_weights = [], []
+    for name, options in spec.get('criteria', {}).items():
+        weight = options.get('weight', 1)
+        soft = options.get('soft', 0)
+        if name not in CRITERIA:
+            raise ImproperlyConfigured(f'Unknown match criterion {name!r}; expected one of {", ".join(CRITERIA)}.')
+        if weight < 0 or soft < 0:
+            raise ImproperlyConfigured(f'Match criterion {name!r} needs a non-negative weight and soft margin.')
+        if soft and name not in RANGE_CRITERIA:
+            raise ImproperlyConfigured(f'Match criterion {name!r} is not a range and cannot be soft.')
+        if not weight:
+            continue
+        integral = integral and not soft and float(weight).is_integer()
+        weight = int(weight) if float(weight).is_integer() else float(weight)
+        if name in RANGE_CRITERIA:
+            low, high, value, offset, unit = RANGE_CRITERIA[name]
+            terms.append((weight, _range_term(low, high, value, offset, soft * unit)))
+            margins[name] = soft
+        else:
+            code_indexes.append(VOCABULARY_FIELDS.index(name))
+            code_weights.append(weight)
+    if code_indexes:
+        order = np.argsort(code_indexes)
+        terms.append((1, _codes_term([code_indexes[i] for i in order], [code_weights[i] for i in order])))
+
+    mutual = spec.get('mutual')
+    if mutual not in MUTUAL_MODES:
+        raise ImproperlyConfigured(f'MATCH_SCORING mutual must be one of {MUTUAL_MODES}, not {mutual!r}.')
+    return Scorer(terms, mutual, integral, margins)
+
+
+_scorer = None
+
+
+def configure(spec=None):
+    """Compile ``spec`` (by default the MATCH_SCORING setting) and use it for all scoring."""
+    global _scorer
+    _scorer = compile_scoring(spec or getattr(settings, 'MATCH_SCORING', DEFAULT_MATCH_SCORING))
+    return _scorer
+
+
+def scorer():
+    # Compiled by MatriappConfig.ready; compiled here only if scoring runs before that
+    return _scorer or configure()
+
+
+@receiver(setting_changed)
+def recompile_on_setting_change(setting, **kwargs):
+    if setting == 'MATCH_SCORING':
+        configure()
@@ -0,0 +1,145 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Count, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Profile
+from .routers import on_primary
+
+# Text columns covered by search, and the columns facet counts are reported for
+SEARCH_FIELDS = ('bio', 'location', 'education', 'occupation', 'religion', 'caste')
+FACET_FIELDS = ('religion', 'caste', 'location', 'education')
+
+TOKEN_RE = re.compile(r'[^\W_]+')  # Words split the way the PostgreSQL parser splits them
+SEARCH_CONFIG = 'simple'  # Text search configuration used by the trigger in migration 0012
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def search_backend():
+    # PostgreSQL has the search_vector column (see migration 0012); anything else uses the local index
+    backend = getattr(settings, 'PROFILE_SEARCH_BACKEND', None)
+    if backend:
+        return backend
+    return 'postgres' if connection.vendor == 'postgresql' else 'local'
+
+
+class LocalSearchIndex:
+    """In-process inverted index over ``SEARCH_FIELDS``, for databases without full-text search.
+
+    Built on first use with one query. Saved or deleted profiles are only
+    marked stale (by the signals in signals.py) and re-read together before
+    the next lookup, so profile writes stay cheap. The index is per process,
+    which suits tests and local development.
+    """
+
+    def __init__(self):
+        self._postings = None  # token -> set of profile ids
+        self._tokens = {}  # profile id -> its tokens, to undo on change
+        self._vocabulary = None  # Sorted tokens for prefix lookups, rebuilt after the token set changes
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def _index(self, profile_id, texts):
+        tokens = {token for text in texts for token in tokenize(text)}
+        self._tokens[profile_id] = tokens
+        for token in tokens:
+            if token not in self._postings:
+                self._vocabulary = None
+            self._postings[token].add(profile_id)
+
+    def _unindex(self, profile_id):
+        for token in self._tokens.pop(profile_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(profile_id)
+                if not postings:
+                    del self._postings[token]
+                    self._vocabulary = None
+
+    @on_primary
+    def _refresh(self):
+        if self._postings is None:
+            self._postings = defaultdict(set)
+            self._stale.clear()
+            for profile_id, *texts in Profile.objects.values_list('id', *SEARCH_FIELDS).iterator():
+                self._index(profile_id, texts)
+        elif self._stale:
+            stale, self._stale = self._stale, set()
+            for profile_id in stale:
+                self._unindex(profile_id)
+            for profile_id, *texts in Profile.objects.filter(id__in=stale).values_list('id', *SEARCH_FIELDS):
+                self._index(profile_id, texts)
+
+    def mark_stale(self, profile_id):
+        with self._lock:
+            if self._postings is not None:
+                self._stale.add(profile_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings = None
+            self._tokens = {}
+            self._vocabulary = None
+            self._stale = set()
+
+    def lookup(self, query):
+        """Ids of profiles containing every word of ``query`` (a word also matches as a prefix)."""
+        words = tokenize(query)
+        with self._lock:
+            self._refresh()
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self._postings)
+            vocabulary = self._vocabulary
+            result = None
+            for word in words:
+                ids = set()
+                for index in range(bisect.bisect_left(vocabulary, word), len(vocabulary)):
+                    if not vocabulary[index].startswith(word):
+                        break
+                    ids |= self._postings[vocabulary[index]]
+                result = ids if result is None else result & ids
+                if not result:
+                    return set()
+            return result or set()
+
+
+search_index = LocalSearchIndex()
+
+
+def matching_profiles(queryset, query):
+    """Narrow a Profile queryset to full-text matches of ``query``."""
+    if not tokenize(query):
+        return queryset
+    if search_backend() == 'postgres':
+        # Served by the GIN index on search_vector, which a trigger keeps current.
+        # Every word must match, as a prefix, like the local index.
+        matched = RawSQL(
+            "matriapp_profile.search_vector @@ to_tsquery(%s::regconfig, %s)",
+            (SEARCH_CONFIG, ' & '.join(f'{word}:*' for word in tokenize(query))),
+            output_field=BooleanField(),
+        )
+        return queryset.alias(search_match=matched).filter(search_match=True)
+    return queryset.filter(id__in=search_index.lookup(query))
+
+
+def facet_counts(queryset):
+    """``{field: [(value, count), ...]}`` for ``FACET_FIELDS``, computed in one UNION ALL query."""
+    parts = [
+        queryset.order_by().values_list(Value(field), field).annotate(total=Count('id'))
+        for field in FACET_FIELDS
+    ]
+    facets = {field: [] for field in FACET_FIELDS}
+    for field, value, total in parts[0].union(*parts[1:], all=True):
+        if value:
+            facets[field].append((value, total))
+    for values in facets.values():
+        values.sort(key=lambda item: (-item[1], item[0]))
+    return facets
@@ -1,12 +1,150 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import User, Profile  # Ensure you import the User and Profile models
-
-@receiver(post_save, sender=User) 
-def create_user_profile(sender, instance, created, **kwargs): 
-    if created: 
-        Profile.objects.create(user=instance)
-
-@receiver(post_save, sender=User) 
-def save_user_profile(sender, instance, **kwargs): 
-    instance.profile.save()
\ No newline at end of file
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import User, Profile, PartnerPreference, Match, Message, VocabularyAlias, VocabularyTerm  # Ensure you import the User and Profile models
+from .inbox import adjust_conversation_unread, adjust_unread, record_messages
+from .match_cache import invalidate_matches
+from .matching import refresh_matches_for_user, schedule_refresh
+from .recommend import similarity_index
+from .routers import read_your_writes
+from .search import search_index
+from .utils import SCORING_COLUMNS, age_bucket
+from .vocab import bump_version, encode_instance
+
+@receiver(post_save, sender=User) 
+def create_user_profile(sender, instance, created, **kwargs): 
+    if created: 
+        Profile.objects.create(user=instance)
+
+@receiver(post_save, sender=User) 
+def save_user_profile(sender, instance, **kwargs): 
+    instance.profile.save()
+
+# A new account may not have reached the replicas yet when its first pages are read
+@receiver(user_logged_in)
+def read_new_session_from_primary(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        read_your_writes(request)
+
+
+# Keep the vocabulary codes in step with the text fields they encode
+@receiver(pre_save, sender=Profile)
+@receiver(pre_save, sender=PartnerPreference)
+def encode_vocabulary_fields(sender, instance, raw=False, **kwargs):
+    if not raw:
+        encode_instance(instance)
+
+@receiver(pre_save, sender=Profile)
+def derive_birth_columns(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.birth_year = instance.birth_date.year if instance.birth_date else None
+        instance.age_bucket = age_bucket(instance.birth_year)
+
+@receiver(post_save, sender=VocabularyAlias)
+@receiver(post_delete, sender=VocabularyAlias)
+@receiver(post_delete, sender=VocabularyTerm)
+def invalidate_vocabulary(sender, **kwargs):
+    bump_version()
+
+
+def _scoring_state(profile):
+    # Read from __dict__ so deferred fields are not loaded one query at a time
+    return tuple(profile.__dict__.get(name) for name in SCORING_COLUMNS)
+
+@receiver(post_init, sender=Profile)
+def remember_profile_scoring_state(sender, instance, **kwargs):
+    instance._scoring_state = _scoring_state(instance)
+
+# Stamped only when a scored column changed, not on every save, so the profile
+# snapshot's overlay stays small (see matriapp.snapshot)
+@receiver(pre_save, sender=Profile)
+def stamp_scoring_change(sender, instance, raw=False, **kwargs):
+    if not raw and (instance._state.adding or _scoring_state(instance) != instance._scoring_state):
+        instance.scoring_changed_at = timezone.now()
+
+# Rescore only the pairs a profile change can affect, and only when a scored field changed
+# (save_user_profile re-saves the profile on every User save, e.g. each login)
+@receiver(post_save, sender=Profile)
+def refresh_profile_matches(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    state = _scoring_state(instance)
+    if not created and state == instance._scoring_state:
+        return
+    instance._scoring_state = state
+    _invalidate_on_commit([instance.user_id])
+    schedule_refresh(refresh_matches_for_user, instance.user_id)  # Rescores both directions of their pairs
+
+@receiver(post_save, sender=PartnerPreference)
+@receiver(post_delete, sender=PartnerPreference)
+def refresh_preference_matches(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_on_commit([instance.user_id])
+        schedule_refresh(refresh_matches_for_user, instance.user_id)
+
+
+# Cached match lists are invalidated here for the user whose own data changed;
+# the viewers of a changed profile are invalidated by the refresh in matching.py
+# once their stored scores actually change.
+def _invalidate_on_commit(user_ids):
+    transaction.on_commit(lambda: invalidate_matches(user_ids))
+
+@receiver(pre_delete, sender=Profile)
+def remember_profile_viewers(sender, instance, **kwargs):
+    # Match rows may be cascade-deleted before post_delete runs, so collect the other users now
+    pairs = Match.objects.filter(Q(user_id=instance.user_id) | Q(matched_user_id=instance.user_id))
+    instance._viewer_ids = [low if high == instance.user_id else high
+                            for low, high in pairs.values_list('user_id', 'matched_user_id')]
+
+@receiver(post_delete, sender=Profile)
+def invalidate_deleted_profile_matches(sender, instance, **kwargs):
+    _invalidate_on_commit([instance.user_id, *getattr(instance, '_viewer_ids', ())])
+
+
+# Single Message saves and deletes keep the receiver's unread counter and the
+# conversation in step; bulk paths (inbox.save_messages, inbox.mark_read) do it themselves
+def _unread_receiver(message):
+    if message.__dict__.get('is_read') is False:
+        return message.__dict__.get('receiver_id')
+    return None
+
+def _count_unread(message, receiver_id, delta):
+    adjust_unread({receiver_id: delta})
+    adjust_conversation_unread(message.sender_id, receiver_id, delta)
+
+@receiver(post_init, sender=Message)
+def remember_message_unread_state(sender, instance, **kwargs):
+    instance._unread_receiver = _unread_receiver(instance)
+
+@receiver(post_save, sender=Message)
+def count_saved_message(sender, instance, created, raw=False, **kwargs):
+    current = _unread_receiver(instance)
+    previous, instance._unread_receiver = instance._unread_receiver, current
+    if created:
+        record_messages([instance])
+    elif previous != current:
+        if previous is not None:
+            _count_unread(instance, previous, -1)
+        if current is not None:
+            _count_unread(instance, current, 1)
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    if instance._unread_receiver is not None:
+        _count_unread(instance, instance._unread_receiver, -1)
+
+
+# The local search index (used without PostgreSQL) re-reads changed profiles on its next lookup
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def mark_profile_search_stale(sender, instance, raw=False, **kwargs):
+    search_index.mark_stale(instance.id)
+
+# The similarity index re-encodes changed profiles into its overlay on its next lookup
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def mark_profile_similarity_stale(sender, instance, raw=False, **kwargs):
+    similarity_index.mark_stale(instance.user_id)
@@ -0,0 +1,159 @@
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PartnerPreference, Profile
+from .utils import PreferenceColumns, ProfileColumns
+
+CURRENT = 'CURRENT'  # Names the directory of the current snapshot
+FORMAT = 1  # Bumped when the stored columns change; older snapshots are ignored
+TABLES = {'profile': ProfileColumns, 'preference': PreferenceColumns}
+
+
+def _profiles():
+    return Profile.objects.all()
+
+
+def _preferences():
+    # As matching.scoring_preferences: only users with a profile score others
+    return PartnerPreference.objects.filter(user__profile__isnull=False)
+
+
+def build_snapshot(path):
+    """Write the scoring columns of every profile and preference under ``path``
+    and make them current; returns ``(version, meta)``.
+
+    Each column is its own .npy file, so workers map only what they read.
+    Rows changed while this runs are stamped after ``as_of`` and so are
+    overlaid by every reader. The previous snapshot is kept, as a worker
+    may still have it mapped.
+    """
+    as_of = timezone.now()
+    tables = {
+        'profile': ProfileColumns.from_queryset(_profiles()),
+        'preference': PreferenceColumns.from_queryset(_preferences()),
+    }
+    version = f'v{time.time_ns()}'
+    directory = os.path.join(path, version)
+    os.makedirs(directory)
+    meta = {'format': FORMAT, 'as_of': as_of.isoformat()}
+    for table, columns in tables.items():
+        for name in columns.COLUMNS:
+            np.save(os.path.join(directory, f'{table}.{name}.npy'), getattr(columns, name))
+        meta[table] = columns.size
+    with open(os.path.join(directory, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+    temporary = os.path.join(path, CURRENT + '.tmp')
+    with open(temporary, 'w') as file:
+        file.write(version)
+    os.replace(temporary, os.path.join(path, CURRENT))
+    builds = sorted(name for name in os.listdir(path) if name.startswith('v') and name != version)
+    for name in builds[:-1]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return version, meta
+
+
+def load_snapshot(path, version):
+    """``(meta, {table: {column: array}})`` of a snapshot, memory-mapped:
+    pages are read on demand and shared between the workers on a host."""
+    directory = os.path.join(path, version)
+    with open(os.path.join(directory, 'meta.json')) as file:
+        meta = json.load(file)
+    arrays = {
+        table: {name: np.load(os.path.join(directory, f'{table}.{name}.npy'), mmap_mode='r') for name in columns.COLUMNS}
+        for table, columns in TABLES.items()
+    }
+    return meta, arrays
+
+
+def current_version(path):
+    try:
+        with open(os.path.join(path, CURRENT)) as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def _overlay(base_ids, changed_ids, queryset):
+    # Rows of the snapshot still current: not changed since, and not deleted. A deletion
+    # leaves the table smaller than the snapshot plus its changes, so the live ids are
+    # only read when the counts differ.
+    live = ~np.isin(base_ids, changed_ids)
+    if queryset.count() != int(live.sum()) + len(changed_ids):
+        live &= np.isin(base_ids, np.fromiter(queryset.values_list('user_id', flat=True), dtype=np.int64))
+    return live
+
+
+class ProfileSnapshot:
+    """Scoring columns of every profile and preference, from a snapshot written
+    by the build_profile_snapshot command to ``PROFILE_SNAPSHOT_DIR``.
+
+    Workers memory-map the current snapshot instead of reading every row
+    through the ORM, and reopen it once a newer one is written. Each call to
+    ``columns`` overlays the rows stamped (``scoring_changed_at``) since the
+    snapshot was taken, less ``PROFILE_SNAPSHOT_OVERLAP`` seconds for
+    transactions that committed late; rows updated with ``QuerySet.update``
+    are not stamped, so rebuild the snapshot after such writes.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._version = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _directory(self):
+        return self._path or getattr(settings, 'PROFILE_SNAPSHOT_DIR', None)
+
+    def _current(self):
+        path = self._directory()
+        version = current_version(path) if path else None
+        with self._lock:
+            if version != self._version:
+                self._snapshot = load_snapshot(path, version) if version is not None else None
+                if self._snapshot is not None and self._snapshot[0].get('format') != FORMAT:
+                    self._snapshot = None
+                self._version = version
+            return self._snapshot
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._snapshot = None
+
+    def columns(self, today=None):
+        """``(preferences, candidates)`` lists of PreferenceColumns and ProfileColumns
+        covering every current row, or ``None`` without a snapshot.
+
+        The first part of each is the mapped snapshot with a ``live`` mask
+        hiding the rows changed or deleted since; the second holds the
+        changed rows, read from the database.
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        meta, arrays = snapshot
+        since = (datetime.datetime.fromisoformat(meta['as_of'])
+                 - datetime.timedelta(seconds=getattr(settings, 'PROFILE_SNAPSHOT_OVERLAP', 300)))
+
+        changed_profiles = ProfileColumns.from_queryset(_profiles().filter(scoring_changed_at__gt=since))
+        profiles = ProfileColumns.from_arrays(
+            arrays['profile'], _overlay(arrays['profile']['user_id'], changed_profiles.user_id, _profiles()))
+        # A preference also changes with its owner's gender, or when the owner's profile is new
+        changed_preferences = PreferenceColumns.from_queryset(_preferences().filter(
+            Q(scoring_changed_at__gt=since) | Q(user__profile__scoring_changed_at__gt=since)), today)
+        preferences = PreferenceColumns.from_arrays(
+            arrays['preference'], today,
+            _overlay(arrays['preference']['user_id'], changed_preferences.user_id, _preferences()))
+        return [preferences, changed_preferences], [profiles, changed_profiles]
+
+
+profile_snapshot = ProfileSnapshot()
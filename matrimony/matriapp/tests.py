@@ -1,3 +1,1267 @@
-from django.test import TestCase
-
-# Create your tests here.
+import asyncio
+import datetime
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from importlib import import_module
+from unittest import mock
+from decimal import Decimal
+
+import numpy as np
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.db import connection, router
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import chat, images, recommend
+from .channel_layers import BrokerChannelLayer, ChannelBroker, write_frame
+from .inbox import mark_read, save_messages
+from .chat import direct_room_name
+from .match_cache import match_cache_stats
+from .matching import rebuild_all_matches
+from .recommend import build_arrays, recommend_for_user, similarities, similarity_index
+from .routers import PRIMARY_UNTIL_KEY, on_chat_database, replica_lags, replica_reads, use_database, use_replica
+from .routing import websocket_urlpatterns
+from .scoring import DEFAULT_MATCH_SCORING, compile_scoring
+from .search import facet_counts, matching_profiles, search_index
+from .snapshot import profile_snapshot
+from .models import (
+    Conversation, Event, Match, Message, Profile, PartnerPreference, UnreadCount, User, VocabularyAlias, VocabularyTerm,
+)
+from .utils import (
+    PreferenceColumns, ProfileColumns, calculate_match_score, candidate_mask, plausible_candidates,
+    plausible_viewers, rank_candidates, reverse_scores, score_candidates,
+)
+from .vocab import Vocabulary, vocabulary
+from matrimony.database import database_settings, pool_stats
+
+
+def make_user(username, **profile_fields):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='secret-pass-123')
+    profile = user.profile
+    for field, value in profile_fields.items():
+        setattr(profile, field, value)
+    profile.save()  # Through save() so the vocabulary codes are set
+    return user
+
+
+def years_ago(years):
+    today = timezone.localdate()
+    return today.replace(year=today.year - years, day=min(today.day, 28))
+
+
+class MatchScoringTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('arjun', gender='Male')
+        self.preferences = PartnerPreference.objects.create(
+            user=self.viewer, min_age=26, max_age=34,
+            min_height=Decimal('150.00'), max_height=Decimal('170.00'),
+            religion='Hindu', caste='Brahmin', education='MBA', occupation='Engineer', location='Pune',
+        )
+        self.perfect = make_user(
+            'meera', gender='Female', birth_date=years_ago(30), height=Decimal('160.00'),
+            religion='Hindu', caste='Brahmin', education='MBA', occupation='Engineer', location='Pune',
+        )
+        self.partial = make_user(
+            'riya', gender='Female', birth_date=years_ago(41), height=Decimal('170.00'),
+            religion='Hindu', location='Mumbai',
+        )
+        self.same_gender = make_user('rahul', gender='Male', religion='Hindu', location='Pune')
+        self.incomplete = make_user('sana', gender='Female', religion='Hindu')
+
+    def test_single_candidate_scores(self):
+        self.assertEqual(calculate_match_score(self.viewer, self.perfect), 7)
+        # Outside the age range, or with no birth date to compare, the hard filters leave them out
+        self.assertEqual(calculate_match_score(self.viewer, self.partial), 0)
+        self.assertEqual(calculate_match_score(self.viewer, self.same_gender), 0)
+        self.assertEqual(calculate_match_score(self.viewer, self.incomplete), 0)
+
+    def test_single_candidate_scores_agree_with_stored_matches(self):
+        call_command('rebuild_matches', stdout=open(os.devnull, 'w'))
+        stored = dict(Match.objects.filter(user=self.viewer).values_list('matched_user', 'match_score'))
+        for candidate in (self.perfect, self.partial, self.same_gender, self.incomplete):
+            self.assertEqual(calculate_match_score(self.viewer, candidate), stored.get(candidate.id, 0))
+        self.assertNotIn(self.partial.id, stored)
+
+    def test_batch_scores_match_single_candidate_scores(self):
+        candidates = ProfileColumns.from_queryset(Profile.objects.exclude(user=self.viewer).order_by('user_id'))
+        batch = score_candidates(self.preferences, 'Male', candidates)
+        expected = [
+            calculate_match_score(self.viewer, User.objects.get(id=user_id))
+            for user_id in candidates.user_id
+        ]
+        self.assertEqual(batch.tolist(), expected)
+
+    def test_rank_candidates_orders_by_score_and_limits(self):
+        candidates = ProfileColumns.from_queryset(Profile.objects.exclude(user=self.viewer))
+        ranked = rank_candidates(self.preferences, 'Male', candidates)
+        self.assertEqual(ranked, [(self.perfect.id, 7)])
+        self.assertEqual(rank_candidates(self.preferences, 'Male', candidates, limit=1), [(self.perfect.id, 7)])
+
+
+@override_settings(MATCH_REFRESH_ASYNC=False)
+class MatchMaterializationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vocabulary.clear()  # Its codes may name terms rolled back with an earlier test
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewer = make_user('arjun', gender='Male')
+            self.candidate = make_user('meera', gender='Female', religion='Hindu', location='Pune')
+            PartnerPreference.objects.create(user=self.viewer, religion='Hindu', location='Pune')
+
+    def stored_score(self):
+        match = Match.objects.filter(user=self.viewer, matched_user=self.candidate).first()
+        return match and int(match.match_score)
+
+    def test_preference_save_stores_scores(self):
+        # Blank caste, education and occupation on both sides count as equal
+        self.assertEqual(self.stored_score(), 5)
+
+    def test_profile_change_rescores_affected_pairs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.candidate.profile
+            profile.location = 'Delhi'
+            profile.save()
+        self.assertEqual(self.stored_score(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.gender = 'Male'
+            profile.save()
+        self.assertIsNone(self.stored_score())
+
+    def test_unchanged_profile_save_does_not_schedule_refresh(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            User.objects.get(pk=self.candidate.pk).save()  # Re-saves the profile through save_user_profile
+        self.assertEqual(callbacks, [])
+
+    def test_rebuild_command_and_matches_view(self):
+        Match.objects.all().delete()
+        call_command('rebuild_matches', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.stored_score(), 5)
+
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse('matches'))
+        self.assertContains(response, 'meera - Score: 5')
+
+    def test_recompute_command_resumes_from_checkpoints(self):
+        Match.objects.all().delete()
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as checkpoints:
+            call_command('recompute_matches', workers=1, checkpoint_dir=checkpoints, dry_run=True, stdout=output)
+            self.assertIsNone(self.stored_score())
+            call_command('recompute_matches', workers=1, checkpoint_dir=checkpoints, stdout=output)
+        self.assertIn('Resumed 1 of 1 shards from checkpoints.', output.getvalue())
+        self.assertEqual(self.stored_score(), 5)
+
+    def test_recompute_does_not_resume_after_profiles_changed(self):
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as checkpoints:
+            call_command('recompute_matches', workers=1, checkpoint_dir=checkpoints, dry_run=True, stdout=output)
+            profile = self.candidate.profile
+            profile.location = 'Delhi'
+            profile.save()
+            call_command('recompute_matches', workers=1, checkpoint_dir=checkpoints, stdout=output)
+        self.assertNotIn('Resumed', output.getvalue())
+        self.assertEqual(self.stored_score(), 4)
+
+    def test_pair_is_stored_once_with_both_scores(self):
+        self.client.force_login(self.candidate)
+        self.assertNotContains(self.client.get(reverse('matches')), 'arjun')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PartnerPreference.objects.create(user=self.candidate, religion='Hindu')
+        # The viewer has no religion, which costs one point the other way
+        pairs = Match.objects.values_list('user', 'matched_user', 'match_score', 'reverse_score', 'mutual_score')
+        self.assertEqual(list(pairs), [(self.viewer.id, self.candidate.id, 5, 4, 4)])
+        self.assertContains(self.client.get(reverse('matches')), 'arjun - Score: 4')
+        self.assertContains(self.client.get(reverse('matches'), {'mutual': 1}), 'arjun - Score: 4')
+
+
+class ScoringSpecTests(TestCase):
+    def setUp(self):
+        vocabulary.clear()
+        self.viewer = make_user('arjun', gender='Male', birth_date=years_ago(30), religion='Hindu')
+        self.preferences = PartnerPreference.objects.create(
+            user=self.viewer, min_age=25, max_age=30, min_height=Decimal('150.00'), max_height=Decimal('165.00'),
+            religion='Hindu',
+        )
+        self.candidate = make_user('meera', gender='Female', birth_date=years_ago(27), height=Decimal('167.00'),
+                                   religion='Hindu')
+
+    def test_weights_and_soft_ranges(self):
+        spec = {'criteria': {'religion': {'weight': 3}, 'height': {'weight': 2, 'soft': 4}}}
+        with override_settings(MATCH_SCORING=spec):
+            # 2 cm outside a 4 cm soft margin earns half the height weight
+            self.assertEqual(calculate_match_score(self.viewer, self.candidate), 4.0)
+            # Soft ranges widen the hard filters so the candidate is still considered
+            self.assertTrue(plausible_candidates(self.preferences, 'Male').filter(id=self.candidate.profile.id).exists())
+        # 2 cm outside a hard height range
+        self.assertEqual(calculate_match_score(self.viewer, self.candidate), 0)
+        self.assertFalse(plausible_candidates(self.preferences, 'Male').exists())
+
+    def test_mutual_mode_uses_both_preferences(self):
+        PartnerPreference.objects.create(user=self.candidate, min_age=28, max_age=35, religion='Jain')
+        candidates = ProfileColumns.from_profiles([self.candidate.profile])
+        theirs = PreferenceColumns.from_queryset(PartnerPreference.objects.filter(user=self.candidate))
+        reverse = reverse_scores(theirs, ProfileColumns.from_profiles([self.viewer.profile]), candidates.user_id)
+        self.assertEqual(reverse.tolist(), [5.0])  # The age and the four blank fields
+
+        # The height is inside a 4 cm soft margin, for 6.5 one way
+        criteria = {**DEFAULT_MATCH_SCORING['criteria'], 'height': {'weight': 1, 'soft': 4}}
+        with override_settings(MATCH_SCORING={'criteria': criteria, 'mutual': None}):
+            ranked = rank_candidates(self.preferences, 'Male', candidates, reverse=reverse)
+        self.assertEqual(ranked, [(self.candidate.id, 6.5)])  # One-way score, as mutual is off
+        for mode, expected in (('mean', 5.75), ('min', 5.0)):
+            with override_settings(MATCH_SCORING={'criteria': criteria, 'mutual': mode}):
+                self.assertEqual(rank_candidates(self.preferences, 'Male', candidates, reverse=reverse),
+                                 [(self.candidate.id, expected)])
+        # Without the margin the height is outside the viewer's hard filter
+        with override_settings(MATCH_SCORING={**DEFAULT_MATCH_SCORING, 'mutual': 'mean'}):
+            self.assertEqual(rank_candidates(self.preferences, 'Male', candidates, reverse=reverse), [])
+
+        # Stored scores: 6.5 one way and 5 the other, each combined into the mean
+        with override_settings(MATCH_SCORING={'criteria': criteria, 'mutual': 'mean'}):
+            call_command('rebuild_matches', stdout=open(os.devnull, 'w'))
+        self.assertEqual(list(Match.objects.values_list('user', 'matched_user', 'match_score', 'reverse_score')),
+                         [(self.viewer.id, self.candidate.id, Decimal('5.75'), Decimal('5.75'))])
+
+    def test_invalid_specs_are_rejected(self):
+        for spec in ({'criteria': {'salary': {}}}, {'criteria': {'religion': {'soft': 1}}},
+                     {'criteria': {'age': {'weight': -1}}}, {'mutual': 'max'}):
+            with self.assertRaises(ImproperlyConfigured):
+                compile_scoring(spec)
+
+
+class CandidateFilterTests(TestCase):
+    today = datetime.date(2024, 6, 15)
+
+    def setUp(self):
+        self.viewer = make_user('arjun', gender='Male', birth_date=datetime.date(1992, 1, 1), height=Decimal('175.00'))
+        self.preferences = PartnerPreference.objects.create(
+            user=self.viewer, min_age=25, max_age=30, min_height=Decimal('150.00'), max_height=Decimal('165.00'),
+        )
+        self.in_window = make_user('meera', gender='Female', birth_date=datetime.date(1994, 6, 16), height=Decimal('160.00'))
+        self.turns_31 = make_user('riya', gender='Female', birth_date=datetime.date(1993, 6, 15), height=Decimal('160.00'))
+        self.too_tall = make_user('sana', gender='Female', birth_date=datetime.date(1996, 1, 1), height=Decimal('170.00'))
+        self.no_height = make_user('tara', gender='Female', birth_date=datetime.date(1996, 1, 1))
+        self.same_gender = make_user('rahul', gender='Male', birth_date=datetime.date(1996, 1, 1), height=Decimal('160.00'))
+
+    def test_sql_filters_and_column_mask_agree(self):
+        queryset = plausible_candidates(self.preferences, 'Male', today=self.today)
+        self.assertEqual(set(queryset.values_list('user_id', flat=True)), {self.in_window.id})
+
+        columns = ProfileColumns.from_queryset(Profile.objects.order_by('user_id'))
+        mask = candidate_mask(self.preferences, 'Male', columns, today=self.today)
+        self.assertEqual(columns.user_id[mask].tolist(), [self.in_window.id])
+
+    def test_age_score_uses_the_same_window_as_the_filters(self):
+        self.assertEqual((self.in_window.profile.birth_year, self.in_window.profile.age_bucket), (1994, 1994 // 5))
+        columns = ProfileColumns.from_profiles([self.in_window.profile, self.turns_31.profile])
+        preferences = PartnerPreference(min_age=25, max_age=30)
+        self.assertEqual(score_candidates(preferences, 'Male', columns, today=self.today).tolist(), [6, 0])
+        # The day before the birthday it is still in range
+        self.assertEqual(score_candidates(preferences, 'Male', columns, today=self.today - datetime.timedelta(days=1)).tolist(), [6, 6])
+
+    def test_reverse_filter_finds_viewers_admitting_a_profile(self):
+        viewers = plausible_viewers(self.in_window.profile, today=self.today)
+        self.assertEqual(list(viewers), [self.preferences])
+        self.assertFalse(plausible_viewers(self.turns_31.profile, today=self.today).exists())
+        self.assertFalse(plausible_viewers(self.no_height.profile, today=self.today).exists())
+
+
+class VocabularyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vocabulary.clear()
+        self.viewer = make_user('arjun', gender='Male')
+
+    def test_spellings_share_a_code(self):
+        first = make_user('meera', gender='Female', religion='Hindu', location='New  Delhi')
+        second = make_user('riya', gender='Female', religion=' hindu', location='new delhi')
+        self.assertEqual(first.profile.religion_code, second.profile.religion_code)
+        self.assertEqual(first.profile.location_code, second.profile.location_code)
+        self.assertEqual(list(VocabularyTerm.objects.filter(kind='location').values_list('label', flat=True)), ['New Delhi'])
+        self.assertEqual(self.viewer.profile.religion_code, 0)
+        # The vocabulary loads with its version stamp, then known spellings resolve in process
+        vocabulary.clear()
+        with self.assertNumQueries(2):
+            vocabulary.code('caste', '')
+        with self.assertNumQueries(0):
+            self.assertEqual(vocabulary.code('religion', 'HINDU'), first.profile.religion_code)
+
+    def test_alias_edits_reach_other_processes(self):
+        # Another worker's vocabulary, which shares no cache with this one
+        worker = Vocabulary()
+        jain = worker.code('religion', 'Jain')
+        self.assertNotEqual(worker.code('religion', 'Jaina'), jain)
+        VocabularyAlias.objects.filter(name='jaina').update(term=VocabularyTerm.objects.get(label='Jain'))
+        VocabularyAlias.objects.get(name='jaina').save()
+        with override_settings(VOCABULARY_CHECK_INTERVAL=0):
+            self.assertEqual(worker.code('religion', 'jaina'), jain)
+
+    def test_new_spelling_outside_a_transaction(self):
+        # In autocommit mode on_commit callbacks run immediately
+        with mock.patch('matriapp.vocab.transaction.on_commit', lambda callback: callback()):
+            code = vocabulary.code('religion', 'Jain')
+        with self.assertNumQueries(0):
+            self.assertEqual(vocabulary.code('religion', 'jain'), code)
+
+    def test_aliases_match_when_scoring(self):
+        candidate = make_user('meera', gender='Female', education='B.Tech')
+        PartnerPreference.objects.create(user=self.viewer, education='Bachelor of Technology')
+        self.assertEqual(calculate_match_score(self.viewer, candidate), 4)
+
+        # Merge the two spellings: the alias changes the code and the version stamp reloads it
+        term = VocabularyTerm.objects.get(kind='education', label='Bachelor of Technology')
+        with self.captureOnCommitCallbacks(execute=True):
+            VocabularyAlias.objects.filter(name='b.tech').update(term=term)
+            VocabularyAlias.objects.filter(term=term).first().save()
+        call_command('recode_vocabulary', stdout=open(os.devnull, 'w'))
+        candidate.profile.refresh_from_db()
+        self.assertEqual(candidate.profile.education_code, term.id)
+        self.assertEqual(calculate_match_score(self.viewer, candidate), 5)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vocabulary.clear()
+        self.viewer = make_user('arjun', gender='Male')
+        self.others = [make_user(f'bride{index}', gender='Female') for index in range(5)]
+        for index, other in enumerate(self.others):
+            Match.objects.create(user=self.viewer, matched_user=other, match_score=index % 2 + 1)
+        self.client.force_login(self.viewer)
+
+    def fetch_json(self, url, **params):
+        response = self.client.get(url, {'format': 'json', **params})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(b''.join(response.streaming_content))
+
+    def collect(self, url):
+        names, cursor = [], None
+        while True:
+            page = self.fetch_json(url, limit=2, **({'cursor': cursor} if cursor else {}))
+            names += [row['username'] for row in page['results']]
+            cursor = page['next']
+            if cursor is None:
+                return names
+
+    def test_matches_pages_follow_score_then_id(self):
+        self.assertEqual(self.collect(reverse('matches')), ['bride1', 'bride3', 'bride0', 'bride2', 'bride4'])
+
+    def test_available_profiles_pages_are_stable_under_inserts(self):
+        first = self.fetch_json(reverse('available_profiles'), limit=2)
+        make_user('bride_new', gender='Female')
+        second = self.fetch_json(reverse('available_profiles'), limit=10, cursor=first['next'])
+        names = [row['username'] for row in first['results'] + second['results']]
+        self.assertEqual(names, [user.username for user in self.others] + ['bride_new'])
+
+    def test_html_page_links_to_next_cursor(self):
+        response = self.client.get(reverse('matches'), {'limit': 2})
+        self.assertEqual(len(response.context['matches']), 2)
+        self.assertContains(response, '?cursor=')
+        self.assertEqual(self.client.get(reverse('matches'), {'cursor': 'not-a-cursor'}).status_code, 400)
+
+
+@override_settings(MATCH_REFRESH_ASYNC=False)
+class MatchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vocabulary.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewer = make_user('arjun', gender='Male')
+            self.candidate = make_user('meera', gender='Female', religion='Hindu')
+            self.bystander = make_user('vikram', gender='Male')
+            PartnerPreference.objects.create(user=self.viewer, religion='Hindu')
+        self.client.force_login(self.viewer)
+        match_cache_stats(reset=True)
+
+    def scores(self):
+        return [match.match_score for match in self.client.get(reverse('matches')).context['matches']]
+
+    def test_repeat_requests_hit_the_cache(self):
+        first = self.scores()
+        with self.assertNumQueries(2):  # Session and user lookups only
+            self.assertEqual(self.scores(), first)
+        stats = match_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_candidate_profile_change_invalidates_only_affected_viewers(self):
+        self.assertEqual(self.scores(), [5])
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.candidate.profile
+            profile.religion = 'Sikh'
+            profile.save()
+        self.assertEqual(self.scores(), [4])
+
+        self.client.force_login(self.bystander)
+        self.client.get(reverse('matches'))
+        misses = match_cache_stats()['misses']
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.occupation = 'Doctor'
+            profile.save()
+        self.client.get(reverse('matches'))
+        # The bystander has no preferences, so nothing about their list changed
+        self.assertEqual(match_cache_stats()['misses'], misses)
+
+
+class ViewQueryCountTests(TestCase):
+    """Each page issues a fixed number of queries however many rows it shows."""
+
+    def setUp(self):
+        cache.clear()
+        vocabulary.clear()
+        self.user = make_user('arjun', gender='Male')
+        PartnerPreference.objects.create(user=self.user, religion='Hindu')
+        self.client.force_login(self.user)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.rows += 1
+            other = make_user(f'bride{self.rows}', gender='Female')
+            Message.objects.create(sender=other, receiver=self.user, content='Hello')
+            event = Event.objects.create(
+                title=f'Meetup {self.rows}', description='Coffee', location='Pune', created_by=other,
+                event_datetime=timezone.now() + datetime.timedelta(days=self.rows),
+            )
+            event.participants.add(self.user, other)
+            Match.objects.create(user=self.user, matched_user=other, match_score=1)
+
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url_name, expected):
+        url = reverse(url_name)
+        self.add_rows(1)
+        self.assertEqual(self.query_count(url), expected)
+        self.add_rows(5)
+        cache.clear()
+        vocabulary.clear()
+        self.assertEqual(self.query_count(url), expected)
+
+    def test_home(self):
+        self.assertConstantQueries('home', 6)
+
+    def test_messages(self):
+        self.assertConstantQueries('messages_view', 6)
+
+    def test_events(self):
+        self.assertConstantQueries('events_view', 4)
+
+    def test_available_profiles(self):
+        self.assertConstantQueries('available_profiles', 4)
+
+    def test_matches(self):
+        self.assertConstantQueries('matches', 4)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vocabulary.clear()
+        self.addCleanup(self.route_views)  # Back to the sync views once the setting is restored
+        self.settings_override = override_settings(ASYNC_VIEWS=True, MATCH_REFRESH_ASYNC=False)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.route_views()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = make_user('arjun', gender='Male')
+            self.bride = make_user('meera', gender='Female', religion='Hindu', birth_date=years_ago(28))
+            PartnerPreference.objects.create(user=self.user, religion='Hindu', min_age=25, max_age=32)
+        Message.objects.create(sender=self.bride, receiver=self.user, content='Hello there')
+        event = Event.objects.create(title='Coffee meetup', description='Coffee', location='Pune', created_by=self.bride,
+                                     event_datetime=timezone.now() + datetime.timedelta(days=1))
+        event.participants.add(self.user, self.bride)
+        self.async_client.force_login(self.user)
+
+    def route_views(self):
+        # urls.py picks the views to route when it is imported; the project urls hold its resolver
+        for module in ('matriapp.urls', settings.ROOT_URLCONF):
+            importlib.reload(import_module(module))
+        clear_url_caches()
+
+    async def test_views_are_async(self):
+        match = resolve(reverse('home'))
+        self.assertTrue(asyncio.iscoroutinefunction(match.func))
+
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'Coffee meetup')
+        self.assertContains(response, 'Message Notifications (1)')
+        self.assertContains(response, 'From: meera - Hello there')
+        self.assertContains(response, 'Preferred Age Range: 25 - 32')
+
+        response = await self.async_client.get(reverse('matches'), {'format': 'json'})
+        body = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(body, {'results': [{'user_id': self.bride.id, 'username': 'meera', 'score': 6.0}], 'next': None})
+        self.assertContains(await self.async_client.get(reverse('messages_view')), 'From: meera - Hello there')
+        self.assertContains(await self.async_client.get(reverse('events_view')), 'Created By: meera')
+        self.assertContains(await self.async_client.get(reverse('available_profiles')), 'meera - ')
+
+        response = await self.async_client.get(reverse('available_profiles'), {'format': 'json', 'limit': 1})
+        body = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([row['username'] for row in body['results']], ['meera'])
+        self.assertIsNone(body['next'])
+
+    async def test_message_is_sent_through_the_sync_view(self):
+        response = await self.async_client.post(reverse('messages_view'), {
+            'sender': self.user.id, 'receiver': self.bride.id, 'content': 'Hi meera'})
+        self.assertRedirects(response, reverse('messages_view'), fetch_redirect_response=False)
+        self.assertTrue(await Message.objects.filter(sender=self.user, content='Hi meera').aexists())
+
+
+class ChatPersistenceTests(TestCase):
+    def setUp(self):
+        chat.history_cache.clear()
+        self.sender = make_user('arjun', gender='Male')
+        self.receiver = make_user('meera', gender='Female')
+
+    async def connect(self, room_name, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{room_name}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'history')
+        return communicator
+
+    @override_settings(CHAT_WRITE_INTERVAL=60)
+    async def test_burst_is_written_in_one_batch_and_drained_on_disconnect(self):
+        room_name = direct_room_name(self.sender.id, self.receiver.id)
+        communicator = await self.connect(room_name, self.sender)
+        for index in range(5):
+            await communicator.send_json_to({'message': f'hello {index}'})
+            await communicator.receive_json_from()
+
+        with mock.patch('matriapp.chat.save_messages', wraps=chat.save_messages) as save_messages:
+            await communicator.disconnect()
+        save_messages.assert_called_once()
+
+        stored = [message async for message in Message.objects.filter(room_name=room_name).order_by('id')]
+        self.assertEqual([message.content for message in stored], [f'hello {index}' for index in range(5)])
+        self.assertTrue(all(message.receiver_id == self.receiver.id for message in stored))
+
+    async def test_shared_room_messages_have_no_receiver(self):
+        communicator = await self.connect('default_chat_room', self.sender)
+        await communicator.send_json_to({'message': 'hi all'})
+        await communicator.receive_json_from()
+        await communicator.disconnect()
+        message = await Message.objects.aget(room_name='default_chat_room')
+        self.assertIsNone(message.receiver_id)
+
+
+@override_settings(CHAT_HISTORY_PAGE_SIZE=2)
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        chat.history_cache.clear()
+        self.sender = make_user('arjun', gender='Male')
+        self.receiver = make_user('meera', gender='Female')
+        self.room_name = direct_room_name(self.sender.id, self.receiver.id)
+        for index in range(5):
+            Message.objects.create(sender=self.sender, receiver=self.receiver,
+                                   room_name=self.room_name, content=f'hello {index}')
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room_name}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_connect_backfills_and_pages_backwards(self):
+        communicator, _ = await self.connect(self.receiver)
+        contents = []
+        page = await communicator.receive_json_from()
+        while True:
+            contents = [message['message'] for message in page['messages']] + contents
+            if page['before'] is None:
+                break
+            await communicator.send_json_to({'type': 'history', 'before': page['before']})
+            page = await communicator.receive_json_from()
+        await communicator.disconnect()
+        self.assertEqual(contents, [f'hello {index}' for index in range(5)])
+
+    async def test_reconnects_reuse_the_cached_page(self):
+        with mock.patch('matriapp.chat.load_history_page', wraps=chat.load_history_page) as load:
+            for _ in range(3):
+                communicator, _ = await self.connect(self.receiver)
+                await communicator.receive_json_from()
+                await communicator.disconnect()
+        load.assert_called_once()
+
+    async def test_private_room_rejects_other_users(self):
+        outsider = await User.objects.aget(pk=(await database_sync_to_async(make_user)('vikram', gender='Male')).pk)
+        communicator, connected = await self.connect(outsider)
+        self.assertFalse(connected)
+
+    async def test_anonymous_sockets_get_no_history(self):
+        await Message.objects.acreate(sender=self.sender, room_name='lobby', content='hello lobby')
+        for room_name in ('lobby', self.room_name):
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{room_name}/')
+            communicator.scope['user'] = AnonymousUser()
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+            self.assertTrue(await communicator.receive_nothing())
+
+
+class ChatRealtimeEventTests(TestCase):
+    def setUp(self):
+        chat.history_cache.clear()
+        self.sender = make_user('arjun', gender='Male')
+        self.receiver = make_user('meera', gender='Female')
+        self.room_name = direct_room_name(self.sender.id, self.receiver.id)
+        self.message_ids = [
+            Message.objects.create(sender=self.sender, receiver=self.receiver,
+                                   room_name=self.room_name, content=f'hello {index}').id
+            for index in range(5)
+        ]
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room_name}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'history')
+        return communicator
+
+    @override_settings(CHAT_RECEIPT_INTERVAL=60)
+    async def test_receipts_are_coalesced_into_one_update(self):
+        communicator = await self.connect(self.receiver)
+        for message_id in (self.message_ids[1], self.message_ids[3], self.message_ids[2]):
+            await communicator.send_json_to({'type': 'read', 'up_to': message_id})
+
+        with mock.patch('matriapp.chat.mark_read_up_to', wraps=chat.mark_read_up_to) as mark_read:
+            await communicator.disconnect()
+        mark_read.assert_called_once_with(self.room_name, self.receiver.id, self.message_ids[3])
+
+        read = [message.is_read async for message in Message.objects.filter(room_name=self.room_name).order_by('id')]
+        self.assertEqual(read, [True, True, True, True, False])
+
+    async def test_typing_and_presence_are_rate_limited_and_not_echoed(self):
+        sender = await self.connect(self.sender)
+        receiver = await self.connect(self.receiver)
+        self.assertEqual(await sender.receive_json_from(), {'type': 'presence', 'sender': 'meera', 'status': 'online'})
+
+        for _ in range(3):
+            await receiver.send_json_to({'type': 'typing'})
+        self.assertEqual(await sender.receive_json_from(), {'type': 'typing', 'sender': 'meera'})
+        self.assertTrue(await sender.receive_nothing())
+        self.assertTrue(await receiver.receive_nothing())
+
+        await receiver.disconnect()
+        self.assertEqual(await sender.receive_json_from(), {'type': 'presence', 'sender': 'meera', 'status': 'offline'})
+        await sender.disconnect()
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.sender = make_user('arjun', gender='Male')
+        self.receiver = make_user('meera', gender='Female')
+        self.message_ids = [
+            Message.objects.create(sender=self.sender, receiver=self.receiver, content=f'hello {index}').id
+            for index in range(4)
+        ]
+        self.client.force_login(self.receiver)
+
+    def counter(self):
+        return UnreadCount.objects.get(user=self.receiver).count
+
+    def test_counter_follows_single_saves_deletes_and_batches(self):
+        self.assertEqual(self.counter(), 4)
+        message = Message.objects.get(id=self.message_ids[0])
+        message.is_read = True
+        message.save()
+        Message.objects.get(id=self.message_ids[1]).delete()
+        self.assertEqual(self.counter(), 2)
+
+        chat.save_messages([Message(sender=self.sender, receiver=self.receiver, content='batched') for _ in range(3)])
+        self.assertEqual(self.counter(), 5)
+        self.assertEqual(self.counter(), Message.objects.filter(receiver=self.receiver, is_read=False).count())
+
+    def test_bulk_mark_read_is_one_update(self):
+        url = reverse('mark_messages_read') + '?format=json'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'up_to': self.message_ids[1]})
+        self.assertEqual(response.json(), {'marked': 2, 'unread': 2})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "matriapp_message"') for query in queries), 1)
+
+        response = self.client.post(url, {'ids': [self.message_ids[0], self.message_ids[3]]})
+        self.assertEqual(response.json(), {'marked': 1, 'unread': 1})
+        response = self.client.post(url, {'all': '1'})
+        self.assertEqual(response.json(), {'marked': 1, 'unread': 0})
+        self.assertFalse(Message.objects.filter(receiver=self.receiver, is_read=False).exists())
+
+    def test_messages_arriving_during_mark_read_stay_counted(self):
+        # A message stored by another connection after mark_read read the unread rows
+        arrived = []
+
+        def deliver_before_update(execute, sql, params, many, context):
+            if not arrived and sql.startswith('UPDATE "matriapp_message"'):
+                arrived.append(Message.objects.create(sender=self.sender, receiver=self.receiver, content='late'))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(deliver_before_update):
+            self.assertEqual(mark_read(self.receiver.id), 4)
+        self.assertEqual(list(Message.objects.filter(receiver=self.receiver, is_read=False)), arrived)
+        self.assertEqual(self.counter(), 1)
+        low, high = sorted((self.sender.id, self.receiver.id))
+        self.assertEqual(Conversation.objects.get(user_low_id=low, user_high_id=high).unread_for(self.receiver.id), 1)
+
+    def test_bulk_mark_read_requires_a_selection(self):
+        self.assertEqual(self.client.post(reverse('mark_messages_read')).status_code, 400)
+        self.assertEqual(self.client.post(reverse('mark_messages_read'), {'ids': 'x'}).status_code, 400)
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('meera', gender='Female')
+        self.others = [make_user(f'suitor{index}', gender='Male') for index in range(3)]
+        self.client.force_login(self.others[0])
+
+    def conversation(self, other):
+        low, high = sorted((self.user.id, other.id))
+        return Conversation.objects.get(user_low_id=low, user_high_id=high)
+
+    def test_messages_view_and_chat_batches_share_one_conversation(self):
+        self.client.post(reverse('messages_view'), {'sender': self.others[0].id, 'receiver': self.user.id, 'content': 'hello'})
+        room_name = direct_room_name(self.user.id, self.others[0].id)
+        chat.save_messages([Message(sender=self.others[0], receiver=self.user, room_name=room_name, content=content)
+                            for content in ('how are you', 'still there?')])
+
+        conversation = self.conversation(self.others[0])
+        self.assertEqual(conversation.last_message.content, 'still there?')
+        self.assertEqual(conversation.unread_for(self.user.id), 3)
+        self.assertEqual(conversation.unread_for(self.others[0].id), 0)
+
+        mark_read(self.user.id, room_name=room_name)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.unread_for(self.user.id), 0)
+
+    def test_inbox_pages_through_both_sides_most_recent_first(self):
+        for other in (self.others[1], self.others[0], self.others[2]):
+            Message.objects.create(sender=other, receiver=self.user, content=f'from {other.username}')
+        Message.objects.create(sender=self.user, receiver=self.others[1], content='reply')
+
+        self.client.force_login(self.user)
+        names, cursor = [], None
+        while True:
+            params = {'format': 'json', 'limit': 2, **({'cursor': cursor} if cursor else {})}
+            page = self.client.get(reverse('inbox'), params).json()
+            names += [row['other_user'] for row in page['results']]
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(names, ['suitor1', 'suitor2', 'suitor0'])
+
+
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name, PROFILE_IMAGE_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, user, size=(1200, 800)):
+        image = Image.new('RGB', size, 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        data = io.BytesIO()
+        image.save(data, 'JPEG', exif=exif)
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('profile'), {
+                'gender': 'Female',
+                'profile_picture': SimpleUploadedFile('me.jpg', data.getvalue(), content_type='image/jpeg'),
+            })
+        return response
+
+    def test_upload_builds_small_renditions_without_metadata(self):
+        user = make_user('meera', gender='Female')
+        self.upload(user)
+        profile = Profile.objects.get(user=user)
+        self.assertEqual(len(profile.picture_hash), 64)
+        for field, size in (('picture_thumbnail', 160), ('picture_medium', 640)):
+            with Image.open(getattr(profile, field).path) as rendition:
+                self.assertEqual(rendition.format, 'WEBP')
+                self.assertEqual(max(rendition.size), size)
+                self.assertNotIn('exif', rendition.info)
+
+    def test_identical_uploads_share_renditions(self):
+        first, second = make_user('meera', gender='Female'), make_user('asha', gender='Female')
+        self.upload(first)
+        with mock.patch('matriapp.images.render', wraps=images.render) as render:
+            self.upload(second)
+        render.assert_not_called()
+        self.assertEqual(Profile.objects.get(user=first).profile_picture.name,
+                         Profile.objects.get(user=second).profile_picture.name)
+        self.assertEqual(Profile.objects.get(user=first).picture_thumbnail.name,
+                         Profile.objects.get(user=second).picture_thumbnail.name)
+
+    @override_settings(PROFILE_PICTURE_MAX_BYTES=1024)
+    def test_oversized_upload_is_rejected(self):
+        user = make_user('meera', gender='Female')
+        response = self.upload(user)
+        self.assertContains(response, 'Profile pictures can be at most')
+        self.assertFalse(Profile.objects.get(user=user).profile_picture)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.name = f'profile_pictures/renditions/{"ab" * 32}/thumbnail.webp'
+        self.content = bytes(range(256)) * 4
+        os.makedirs(os.path.dirname(os.path.join(media_root.name, self.name)))
+        with open(os.path.join(media_root.name, self.name), 'wb') as file:
+            file.write(self.content)
+        self.url = '/media/' + self.name
+
+    def test_hashed_file_is_immutable_and_revalidates_with_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=5000-').status_code, 416)
+        # A stale If-Range validator gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_media_prefixes_are_served(self):
+        with open(os.path.join(settings.MEDIA_ROOT, 'settings.py'), 'w') as file:
+            file.write("SECRET_KEY = 'secret'")
+        for path in ('profile_pictures/../settings.py', 'profile_pictures/renditions/../../settings.py',
+                     'profile_pictures/./../settings.py', 'profile_pictures/../../etc/passwd', 'settings.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get('/media/' + path).status_code, 404)
+        self.assertEqual(self.client.get('/media/db.sqlite3').status_code, 404)
+
+
+class ProfileSearchTests(TestCase):
+    def setUp(self):
+        search_index.clear()
+        self.viewer = make_user('arjun', gender='Male')
+        rows = [
+            ('meera', 'Hindu', 'Pune', 'B.Tech', 'Software engineer', 'Loves hiking'),
+            ('asha', 'Hindu', 'Mumbai', 'MBA', 'Engineering manager', 'Reads a lot'),
+            ('sara', 'Christian', 'Pune', 'B.Tech', 'Doctor', 'Plays the violin'),
+            ('nila', 'Hindu', 'Pune', 'MBBS', 'Doctor', 'Software hobbyist'),
+        ]
+        for username, religion, location, education, occupation, bio in rows:
+            make_user(username, gender='Female', religion=religion, location=location,
+                      education=education, occupation=occupation, bio=bio)
+        make_user('ravi', gender='Male', occupation='Software engineer')
+        self.client.force_login(self.viewer)
+
+    def search(self, **params):
+        return self.client.get(reverse('search_profiles'), {'format': 'json', **params}).json()
+
+    def usernames(self, page):
+        return [row['username'] for row in page['results']]
+
+    def test_words_match_all_text_fields_as_prefixes(self):
+        self.assertEqual(self.usernames(self.search(q='engin')), ['meera', 'asha'])
+        self.assertEqual(self.usernames(self.search(q='software pune')), ['meera', 'nila'])
+        self.assertEqual(self.usernames(self.search(q='violin')), ['sara'])
+
+    def test_facets_come_from_one_query_and_narrow_results(self):
+        results = matching_profiles(Profile.objects.filter(gender='Female'), 'pune')
+        with CaptureQueriesContext(connection) as queries:
+            facets = facet_counts(results)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(facets['religion'], [('Hindu', 2), ('Christian', 1)])
+        self.assertEqual(facets['education'], [('B.Tech', 2), ('MBBS', 1)])
+
+        page = self.search(q='pune', religion='Hindu')
+        self.assertEqual(self.usernames(page), ['meera', 'nila'])
+        self.assertEqual(page['facets']['location'], [['Pune', 2]])
+
+    def test_index_follows_profile_changes_and_pages(self):
+        self.search(q='doctor')  # Builds the index
+        profile = Profile.objects.get(user__username='meera')
+        profile.occupation = 'Doctor'
+        profile.save()
+        first = self.search(q='doctor', limit=2)
+        self.assertEqual(self.usernames(first), ['meera', 'sara'])
+        second = self.search(q='doctor', limit=2, cursor=first['next'])
+        self.assertEqual(self.usernames(second), ['nila'])
+        self.assertIsNone(second['next'])
+
+
+@override_settings(MATCH_REFRESH_ASYNC=False)
+class ProfileSnapshotTests(TestCase):
+    def setUp(self):
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_dir)
+        profile_snapshot.clear()
+        self.addCleanup(profile_snapshot.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewer = make_user('arjun', gender='Male', birth_date=years_ago(30))
+            self.meera = make_user('meera', gender='Female', religion='Hindu', location='Pune', birth_date=years_ago(27))
+            self.asha = make_user('asha', gender='Female', religion='Hindu', location='Delhi', birth_date=years_ago(35))
+            PartnerPreference.objects.create(user=self.viewer, religion='Hindu', location='Pune', min_age=25, max_age=32)
+            PartnerPreference.objects.create(user=self.meera, religion='Hindu')
+
+    def stored_pairs(self):
+        return list(Match.objects.order_by('user', 'matched_user')
+                    .values_list('user', 'matched_user', 'match_score', 'reverse_score', 'mutual_score'))
+
+    def test_snapshot_with_changes_since_scores_like_the_database(self):
+        with override_settings(PROFILE_SNAPSHOT_DIR=self.snapshot_dir, PROFILE_SNAPSHOT_OVERLAP=0):
+            call_command('build_profile_snapshot', stdout=open(os.devnull, 'w'))
+            with self.captureOnCommitCallbacks(execute=True):
+                profile = self.asha.profile
+                profile.location, profile.birth_date = 'Pune', years_ago(29)
+                profile.save()
+                PartnerPreference.objects.create(user=self.asha, location='Pune')
+                make_user('ravi', gender='Male', religion='Hindu', location='Pune')
+                self.meera.delete()
+
+            preferences, candidates = profile_snapshot.columns()
+            self.assertIsInstance(candidates[0].user_id, np.memmap)
+            self.assertEqual(sorted(candidates[1].user_id.tolist()), [self.asha.id, self.asha.id + 1])
+            self.assertEqual(candidates[0].live.tolist(), [True, False, False])
+            self.assertEqual(preferences[1].user_id.tolist(), [self.asha.id])
+            rebuild_all_matches()
+            from_snapshot = self.stored_pairs()
+        rebuild_all_matches()
+        self.assertEqual(from_snapshot, self.stored_pairs())
+        self.assertEqual(from_snapshot[0][:3], (self.viewer.id, self.asha.id, 6))
+
+
+class SimilarProfileTests(TestCase):
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir)
+        self.settings_override = override_settings(SIMILARITY_INDEX_DIR=self.index_dir)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        similarity_index.clear()
+        self.addCleanup(similarity_index.clear)
+
+        details = {'religion': 'Hindu', 'location': 'Pune', 'occupation': 'Engineer', 'height': Decimal('160.00')}
+        self.viewer = make_user('arjun', gender='Male')
+        self.liked = make_user('meera', gender='Female', birth_date=years_ago(28), **details)
+        self.alike = make_user('asha', gender='Female', birth_date=years_ago(29), **details)
+        self.unlike = make_user('sara', gender='Female', birth_date=years_ago(40), religion='Christian',
+                                location='Delhi', occupation='Doctor', height=Decimal('175.00'))
+        make_user('ravi', gender='Male', birth_date=years_ago(28), **details)
+        Message.objects.create(sender=self.viewer, receiver=self.liked, content='hello')
+        self.client.force_login(self.viewer)
+
+    def usernames(self):
+        response = self.client.get(reverse('similar_profiles'), {'format': 'json'})
+        return [row['username'] for row in response.json()['results']]
+
+    def test_recommends_profiles_like_conversation_partners(self):
+        # Only the opposite gender, never the partner themselves, and only from nearby buckets
+        usernames = self.usernames()
+        self.assertEqual(usernames[0], 'asha')
+        self.assertFalse({'arjun', 'meera', 'ravi'} & set(usernames))
+        exact = similarity_index.similar([self.liked.id], 5, 'Female', {self.viewer.id, self.liked.id}, exact=True)
+        self.assertEqual([user_id for user_id, _ in exact], [self.alike.id, self.unlike.id])
+        self.assertEqual(recommend_for_user(self.viewer.id, 1), exact[:1])
+
+        # A saved profile is re-encoded before the next lookup
+        profile = self.unlike.profile
+        profile.religion, profile.location, profile.occupation = 'Hindu', 'Pune', 'Engineer'
+        profile.height, profile.birth_date = Decimal('160.00'), years_ago(28)
+        profile.save()
+        self.assertEqual(self.usernames()[:2], ['sara', 'asha'])
+
+    def test_distinct_codes_never_share_a_slot(self):
+        # Vocabulary ids are shared by all fields, so one field's codes are far apart
+        rows = [(user_id, 'Female', None, None, None, code, 0, 0, 0, 0)
+                for user_id, code in enumerate((3, 35, 67), start=1)]
+        arrays = build_arrays(rows)
+        self.assertEqual(len(set(arrays['slots'][:, 0].tolist())), 3)
+        seed = arrays['slots'][0], arrays['numbers'][0], arrays['norms'][0]
+        self.assertEqual(similarities(arrays, np.arange(3), seed).tolist(), [1.0, 0.0, 0.0])
+        # A code first used after the build gets the field's spare slot, not a known code's
+        slots, _, _ = recommend._encode(np.array([[99, 0, 0, 0, 0]]), np.full((1, 3), np.nan), arrays['mean'],
+                                        arrays['std'], arrays['vocabulary'], arrays['blocks'])
+        self.assertNotIn(slots[0, 0], arrays['slots'][:, 0])
+        self.assertLess(slots[0, 0], arrays['blocks'][1])
+
+    def test_built_index_is_memory_mapped(self):
+        call_command('build_similarity_index', path=self.index_dir, stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.usernames()[0], 'asha')
+        arrays, _ = similarity_index._current()
+        self.assertIsInstance(arrays['slots'], np.memmap)
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_persistent_connections_by_default(self):
+        databases = database_settings({'DATABASE_NAME': 'matrimony', 'DATABASE_HOST': 'db'})
+        self.assertEqual(list(databases), ['default'])
+        default = databases['default']
+        self.assertEqual((default['NAME'], default['HOST']), ('matrimony', 'db'))
+        self.assertEqual((default['CONN_MAX_AGE'], default['CONN_HEALTH_CHECKS'], default['OPTIONS']), (60, True, {}))
+        self.assertIsNone(database_settings({'DATABASE_CONN_MAX_AGE': 'none'})['default']['CONN_MAX_AGE'])
+
+    def test_pools_are_sized_per_server_type(self):
+        databases = database_settings({'DATABASE_POOL': '1', 'SERVER_TYPE': 'asgi', 'DATABASE_POOL_MAX_SIZE': '24'})
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 0)
+        self.assertEqual(databases['default']['OPTIONS']['pool'],
+                         {'min_size': 4, 'max_size': 24, 'timeout': 10.0, 'name': 'default'})
+        # The chat consumers get a pool of their own on the same database
+        self.assertEqual(databases['chat']['NAME'], databases['default']['NAME'])
+        self.assertEqual(databases['chat']['OPTIONS']['pool'],
+                         {'min_size': 2, 'max_size': 8, 'timeout': 10.0, 'name': 'chat'})
+
+        wsgi = database_settings({'DATABASE_POOL': '1', 'SERVER_TYPE': 'wsgi'})
+        self.assertEqual(list(wsgi), ['default'])
+        self.assertEqual(wsgi['default']['OPTIONS']['pool']['max_size'], 8)
+        with self.assertRaises(ValueError):
+            database_settings({'SERVER_TYPE': 'celery'})
+
+    def test_pool_stats(self):
+        self.assertEqual(pool_stats(), {})
+        pool = mock.Mock(**{'get_stats.return_value': {
+            'pool_min': 2, 'pool_max': 8, 'pool_size': 5, 'pool_available': 1,
+            'requests_num': 40, 'requests_wait_ms': 100, 'requests_queued': 3,
+        }})
+        with mock.patch.object(connection, 'pool', pool, create=True):
+            stats = pool_stats()['default']
+        self.assertEqual((stats['checked_out'], stats['mean_wait_ms'], stats['queued']), (4, 2.5, 3))
+
+    def test_chat_queries_stay_on_default_without_a_chat_alias(self):
+        user = make_user('arjun', gender='Male')
+        other = make_user('meera', gender='Female')
+        room = direct_room_name(user.id, other.id)
+        saved = on_chat_database(save_messages)([Message(sender=user, receiver=other, content='Hi', room_name=room)])
+        self.assertEqual(saved[0]._state.db, 'default')
+        with use_database('default'):
+            self.assertEqual(Message.objects.get(room_name=room).content, 'Hi')
+
+
+class ReplicaSettingsTests(TestCase):
+    def test_replica_aliases_from_the_environment(self):
+        databases = database_settings({'DATABASE_REPLICAS': 'db-replica, db-replica-2:5433', 'DATABASE_POOL': '1'})
+        self.assertEqual(list(databases), ['default', 'replica1', 'replica2'])
+        self.assertEqual((databases['replica1']['HOST'], databases['replica1']['PORT']), ('db-replica', '5432'))
+        self.assertEqual((databases['replica2']['HOST'], databases['replica2']['PORT']), ('db-replica-2', '5433'))
+        self.assertEqual(databases['replica2']['OPTIONS']['pool']['name'], 'replica2')
+        self.assertEqual(databases['replica1']['TEST'], {'MIRROR': 'default'})
+
+        # Two SQLite files stand in for a primary and its replica locally, without pools
+        local = database_settings({'DATABASE_ENGINE': 'sqlite3', 'DATABASE_NAME': 'primary.sqlite3',
+                                   'DATABASE_REPLICAS': 'replica.sqlite3', 'DATABASE_POOL': '1'})
+        self.assertEqual(local['replica1']['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual((local['default']['NAME'], local['replica1']['NAME']), ('primary.sqlite3', 'replica.sqlite3'))
+        self.assertEqual(local['default']['OPTIONS'], {})
+
+    def test_saving_preferences_keeps_the_user_on_the_primary(self):
+        user = make_user('arjun', gender='Male')
+        self.client.force_login(user)
+        session = self.client.session
+        del session[PRIMARY_UNTIL_KEY]  # Set by the login
+        session.save()
+        self.client.post(reverse('partner_preference'), {
+            'min_age': 20, 'max_age': 30, 'min_height': 150, 'max_height': 180,
+            'religion': 'Hindu', 'caste': 'Brahmin', 'location': 'Pune', 'education': 'BTech', 'occupation': 'Engineer',
+        })
+        self.assertGreater(self.client.session[PRIMARY_UNTIL_KEY], time.time())
+
+
+@override_settings(DATABASE_REPLICA_MAX_LAG=10, DATABASE_REPLICA_LAG_CHECK_INTERVAL=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        replica_lags.clear()
+        self.addCleanup(replica_lags.clear)
+        patcher = mock.patch('matriapp.routers.replica_aliases', return_value=['replica1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lag(self, seconds):
+        return mock.patch('matriapp.routers.replica_lag', return_value=seconds)
+
+    def test_reads_go_to_a_replica_that_keeps_up(self):
+        with self.lag(0.5) as lag:
+            self.assertEqual(router.db_for_read(Profile), 'default')
+            with use_replica():
+                self.assertEqual(router.db_for_read(Profile), 'replica1')
+                self.assertEqual(router.db_for_read(Match), 'replica1')
+                self.assertEqual(router.db_for_write(Profile), 'default')
+                # Reads in a transaction see its writes
+                with mock.patch.object(connection, 'in_atomic_block', True):
+                    self.assertEqual(router.db_for_read(Profile), 'default')
+            with use_replica():
+                router.db_for_read(Profile)
+        self.assertEqual(lag.call_count, 1)  # Measured once per check interval
+
+    def test_lagging_replica_is_skipped(self):
+        with self.lag(30), use_replica():
+            self.assertEqual(router.db_for_read(Profile), 'default')
+        replica_lags.clear()
+        with self.lag(float('inf')), use_replica():  # Unreachable
+            self.assertEqual(router.db_for_read(Profile), 'default')
+
+    def routed(self, view, until=None):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        if until is not None:
+            request.session[PRIMARY_UNTIL_KEY] = until
+        with self.lag(0):
+            response = replica_reads(view)(request)
+            if asyncio.iscoroutine(response):
+                response = asyncio.run(response)
+        return response
+
+    def test_replica_reads_views_unless_the_user_just_saved(self):
+        def view(request):
+            return router.db_for_read(Profile)
+
+        async def async_view(request):
+            return router.db_for_read(Profile)
+
+        for routed_view in (view, async_view):
+            self.assertEqual(self.routed(routed_view), 'replica1')
+            self.assertEqual(self.routed(routed_view, until=time.time() + 60), 'default')
+            self.assertEqual(self.routed(routed_view, until=time.time() - 1), 'replica1')
+
+
+class BrokerChannelLayerTests(TestCase):
+    async def test_group_send_reaches_channels_of_every_worker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'broker.sock')
+            ready = asyncio.Event()
+            broker = asyncio.create_task(ChannelBroker(path).serve(ready))
+            await ready.wait()
+            # Two layer instances stand in for two worker processes
+            workers = [BrokerChannelLayer(path), BrokerChannelLayer(path)]
+            try:
+                channels = [await worker.new_channel() for worker in workers]
+                for worker, channel in zip(workers, channels):
+                    await worker.group_add('chat_lobby', channel)
+                await workers[0].group_send('chat_lobby', {'type': 'chat_message', 'message': 'hi'})
+                for worker, channel in zip(workers, channels):
+                    received = await asyncio.wait_for(worker.receive(channel), 5)
+                    self.assertEqual(received['message'], 'hi')
+
+                await workers[1].group_discard('chat_lobby', channels[1])
+                await workers[1].send(channels[0], {'type': 'direct'})
+                self.assertEqual((await asyncio.wait_for(workers[0].receive(channels[0]), 5))['type'], 'direct')
+            finally:
+                for worker in workers:
+                    await worker.close()
+                broker.cancel()
+
+    async def test_group_send_survives_a_broker_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'broker.sock')
+            ready = asyncio.Event()
+            serving = asyncio.create_task(ChannelBroker(path).serve(ready))
+            await ready.wait()
+            workers = [BrokerChannelLayer(path), BrokerChannelLayer(path)]
+            try:
+                channels = [await worker.new_channel() for worker in workers]
+                for worker, channel in zip(workers, channels):
+                    await worker.group_add('chat_lobby', channel)
+                # The second worker's socket is only waiting for messages when the broker goes away
+                waiting = asyncio.create_task(workers[1].receive(channels[1]))
+                with self.assertLogs('matriapp.channel_layers') as logs:
+                    serving.cancel()
+                    ready = asyncio.Event()
+                    new_broker = ChannelBroker(path)
+                    serving = asyncio.create_task(new_broker.serve(ready))
+                    await ready.wait()
+                    # The old broker's connections die with its process
+                    for worker in workers:
+                        worker._connection[2].close()
+
+                    async def rejoined():
+                        while len(new_broker.groups.get('chat_lobby', ())) < 2:
+                            await asyncio.sleep(0.01)
+                    await asyncio.wait_for(rejoined(), 5)
+                self.assertEqual(sum('Reconnected' in line for line in logs.output), 2)
+                await workers[0].group_send('chat_lobby', {'type': 'chat_message', 'message': 'back'})
+                self.assertEqual((await asyncio.wait_for(workers[0].receive(channels[0]), 5))['message'], 'back')
+                self.assertEqual((await asyncio.wait_for(waiting, 5))['message'], 'back')
+            finally:
+                for worker in workers:
+                    await worker.close()
+                serving.cancel()
+
+    async def test_slow_worker_backs_up_a_bounded_outbox(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'broker.sock')
+            ready = asyncio.Event()
+            broker = ChannelBroker(path, capacity=2)
+            serving = asyncio.create_task(broker.serve(ready))
+            await ready.wait()
+            # A worker that joins a group and then stops reading its socket
+            reader, writer = await asyncio.open_unix_connection(path)
+            write_frame(writer, {'op': 'hello', 'client': 'stuck'})
+            write_frame(writer, {'op': 'group_add', 'group': 'chat_lobby', 'channel': 'specific.stuck!a', 'id': 1})
+            sender = BrokerChannelLayer(path)
+            try:
+                with self.assertLogs('matriapp.channel_layers', 'WARNING') as logs:
+                    for _ in range(100):
+                        await sender.group_send('chat_lobby', {'type': 'chat_message', 'message': 'x' * 100000})
+                    await sender.group_add('chat_probe', await sender.new_channel())  # Waits for the broker
+                self.assertLessEqual(broker.clients['stuck'].qsize(), 2)
+                self.assertIn('slow worker stuck', logs.output[0])
+            finally:
+                writer.close()
+                await sender.close()
+                serving.cancel()
+
+    async def test_closed_connections_leave_no_queues_behind(self):
+        user = await database_sync_to_async(make_user)('arjun', gender='Male')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'broker.sock')
+            ready = asyncio.Event()
+            broker = asyncio.create_task(ChannelBroker(path).serve(ready))
+            await ready.wait()
+            layers = {'default': {'BACKEND': 'matriapp.channel_layers.BrokerChannelLayer', 'CONFIG': {'path': path}}}
+            with override_settings(CHANNEL_LAYERS=layers):
+                layer = get_channel_layer()
+                try:
+                    for _ in range(10):
+                        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/chat/lobby/')
+                        communicator.scope['user'] = user
+                        connected, _ = await communicator.connect()
+                        self.assertTrue(connected)
+                        await communicator.receive_json_from()  # History
+                        await communicator.disconnect()
+                    # A message for the room arriving after everyone left is not kept for them
+                    await layer.group_send('chat_lobby', {'type': 'chat_message', 'message': 'late'})
+                    await layer.group_add('chat_probe', await layer.new_channel())  # Waits for the broker
+                    self.assertEqual(layer.channels, {})
+                finally:
+                    await layer.close()
+                    broker.cancel()
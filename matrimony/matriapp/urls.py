@@ -1,42 +1,59 @@
-# urls.py
-
-from django.urls import path
-from .views import (
-    welcome,
-    signup,
-    login_view,
-    create_profile,
-    partner_preference,
-    profile,
-    home,
-    matches,
-    messages_view,
-    chat_room,
-    events_view,
-    mark_as_read,
-    available_profiles,
-    create_event,
-)
-
-urlpatterns = [
-    path('', welcome, name='welcome'),
-    path('signup/', signup, name='signup'),
-    path('login/', login_view, name='login'),
-    path('create_profile/', create_profile, name='create_profile'),
-    path('partner_preference/', partner_preference, name='partner_preference'),
-    path('profile/', profile, name='profile'),
-    path('home/', home, name='home'),
-    path('matches/', matches, name='matches'),
-    
-    # New URLs
-    path('messages/', messages_view, name='messages_view'),
-    path('chat/<str:room_name>/', chat_room, name='chat_room'),
-    path('events/', events_view, name='events_view'),
-    
-    path('mark_as_read/<int:message_id>/', mark_as_read, name='mark_as_read'),
-    path('available_profiles/', available_profiles, name='available_profiles'),
-    # matriapp/urls.py
-
-    path('create_event/', create_event, name='create_event'),  # Ensure this line exists
-    # Add other URL patterns as needed
-]
+# urls.py
+
+from django.conf import settings
+from django.urls import path
+from .views import (
+    welcome,
+    signup,
+    login_view,
+    create_profile,
+    partner_preference,
+    profile,
+    home,
+    matches,
+    messages_view,
+    inbox,
+    chat_room,
+    events_view,
+    mark_as_read,
+    mark_messages_read,
+    available_profiles,
+    search_profiles,
+    similar_profiles,
+    create_event,
+    respond_to_event,
+    database_stats,
+)
+
+# The hot read views have async versions for Daphne (see async_views.py)
+if settings.ASYNC_VIEWS:
+    from .async_views import available_profiles, events_view, home, matches, messages_view
+
+urlpatterns = [
+    path('', welcome, name='welcome'),
+    path('signup/', signup, name='signup'),
+    path('login/', login_view, name='login'),
+    path('create_profile/', create_profile, name='create_profile'),
+    path('partner_preference/', partner_preference, name='partner_preference'),
+    path('profile/', profile, name='profile'),
+    path('home/', home, name='home'),
+    path('matches/', matches, name='matches'),
+    
+    # New URLs
+    path('messages/', messages_view, name='messages_view'),
+    path('inbox/', inbox, name='inbox'),
+    path('chat/<str:room_name>/', chat_room, name='chat_room'),
+    path('events/', events_view, name='events_view'),
+    
+    path('mark_as_read/<int:message_id>/', mark_as_read, name='mark_as_read'),
+    path('messages/mark_read/', mark_messages_read, name='mark_messages_read'),
+    path('available_profiles/', available_profiles, name='available_profiles'),
+    path('search/', search_profiles, name='search_profiles'),
+    path('similar_profiles/', similar_profiles, name='similar_profiles'),
+    # matriapp/urls.py
+
+    path('create_event/', create_event, name='create_event'),  # Ensure this line exists
+    path('events/<int:event_id>/respond/', respond_to_event, name='respond_to_event'),
+    path('database_stats/', database_stats, name='database_stats'),
+    # Add other URL patterns as needed
+]
@@ -1,68 +1,416 @@
-def calculate_match_score(user, potential_match):
-    score = 0
-    preferences = user.partnerpreference  # Assuming partner preference is linked to user
-
-    # Check gender preferences
-    if user.profile.gender == 'Male':
-        # For male users, score based on their preferences for female matches
-        if potential_match.profile.gender == 'Female':
-            # Age preference
-            if preferences.min_age <= potential_match.profile.birth_date.year <= preferences.max_age:
-                score += 1
-
-            # Height preference
-            if preferences.min_height <= potential_match.profile.height <= preferences.max_height:
-                score += 1
-
-            # Religion preference
-            if preferences.religion == potential_match.profile.religion:
-                score += 1
-
-            # Caste preference
-            if preferences.caste == potential_match.profile.caste:
-                score += 1
-
-            # Education preference
-            if preferences.education == potential_match.profile.education:
-                score += 1
-
-            # Occupation preference
-            if preferences.occupation == potential_match.profile.occupation:
-                score += 1
-
-            # Location preference
-            if preferences.location == potential_match.profile.location:
-                score += 1
-
-    elif user.profile.gender == 'Female':
-        # For female users, score based on their preferences for male matches
-        if potential_match.profile.gender == 'Male':
-            # Age preference
-            if preferences.min_age <= potential_match.profile.birth_date.year <= preferences.max_age:
-                score += 1
-
-            # Height preference
-            if preferences.min_height <= potential_match.profile.height <= preferences.max_height:
-                score += 1
-
-            # Religion preference
-            if preferences.religion == potential_match.profile.religion:
-                score += 1
-
-            # Caste preference
-            if preferences.caste == potential_match.profile.caste:
-                score += 1
-
-            # Education preference
-            if preferences.education == potential_match.profile.education:
-                score += 1
-
-            # Occupation preference
-            if preferences.occupation == potential_match.profile.occupation:
-                score += 1
-
-            # Location preference
-            if preferences.location == potential_match.profile.location:
-                score += 1
-
-    return score
\ No newline at end of file
+import datetime
+import math
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PartnerPreference, Profile
+from .scoring import scorer
+from .vocab import VOCABULARY_FIELDS, code_field
+
+# Preference fields compared by equality with the same profile field. Both sides
+# are compared through their vocabulary codes (see vocab.py), so aliases match.
+TEXT_CRITERIA = VOCABULARY_FIELDS
+CODE_COLUMNS = tuple(code_field(field) for field in TEXT_CRITERIA)
+
+# Profile columns the scorer reads, fetched in a single query as flat tuples
+SCORING_COLUMNS = ('user_id', 'gender', 'birth_date', 'height') + CODE_COLUMNS
+
+OPPOSITE_GENDER = {'Male': 'Female', 'Female': 'Male'}
+
+# Profile.age_bucket groups birth years into cohorts of this many years. Unlike an
+# age it never goes stale, and a handful of cohorts covers any age preference.
+AGE_BUCKET_YEARS = 5
+
+
+class ProfileColumns:
+    """Candidate profiles stored column by column so they can be scored in one pass.
+
+    ``live`` is ``None``, or a mask of the rows still current when the columns
+    come from a profile snapshot (see matriapp.snapshot); other rows never score.
+    """
+
+    COLUMNS = ('user_id', 'gender', 'birth_ordinal', 'height', 'codes')
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.size = len(rows)
+        columns = dict(zip(SCORING_COLUMNS, zip(*rows))) if rows else {}
+
+        def column(name):
+            return columns.get(name, ())
+
+        self.user_id = np.array(column('user_id'), dtype=np.int64)
+        self.gender = np.array([value or '' for value in column('gender')], dtype=str)
+        # Missing dates and heights become NaN, which fails every range comparison
+        self.birth_ordinal = np.array(
+            [value.toordinal() if value is not None else np.nan for value in column('birth_date')],
+            dtype=np.float64,
+        )
+        self.height = np.array(
+            [float(value) if value is not None else np.nan for value in column('height')],
+            dtype=np.float64,
+        )
+        self.codes = _code_matrix(column, self.size)
+        self.live = None
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls(queryset.values_list(*SCORING_COLUMNS))
+
+    @classmethod
+    def from_profiles(cls, profiles):
+        return cls(tuple(getattr(profile, name) for name in SCORING_COLUMNS) for profile in profiles)
+
+    @classmethod
+    def from_arrays(cls, arrays, live=None):
+        """Columns over existing arrays (one per ``COLUMNS`` name), without copying them."""
+        columns = cls.__new__(cls)
+        for name in cls.COLUMNS:
+            setattr(columns, name, arrays[name])
+        columns.size = len(columns.user_id)
+        columns.live = live
+        return columns
+
+
+class PreferenceColumns:
+    """Many users' partner preferences stored column by column.
+
+    Used for the reverse direction: scoring one candidate against every
+    viewer's preferences in a single pass, and for scoring every user's
+    preferences in turn (see ``row`` and ``hard_filter``). Age ranges are
+    turned into birth date windows on ``today``; missing bounds are NaN.
+    """
+
+    FIELDS = ('user_id', 'user__profile__gender', 'min_age', 'max_age',
+              'min_height', 'max_height') + CODE_COLUMNS
+    # The columns that do not depend on the day, as stored in a profile snapshot
+    COLUMNS = ('user_id', 'target_gender', 'min_age', 'max_age', 'min_height', 'max_height', 'codes')
+
+    def __init__(self, rows, today=None):
+        rows = list(rows)
+        self.size = len(rows)
+        columns = dict(zip(self.FIELDS, zip(*rows))) if rows else {}
+
+        def column(name):
+            return columns.get(name, ())
+
+        self.user_id = np.array(column('user_id'), dtype=np.int64)
+        self.target_gender = np.array(
+            [OPPOSITE_GENDER.get(value, '') for value in column('user__profile__gender')], dtype=str
+        )
+        for field in ('min_age', 'max_age', 'min_height', 'max_height'):
+            setattr(self, field, np.array([_bound(value) for value in column(field)], dtype=np.float64))
+        self.codes = _code_matrix(column, self.size)
+        self.live = None
+        self._windows(today)
+
+    @classmethod
+    def from_queryset(cls, queryset, today=None):
+        return cls(queryset.values_list(*cls.FIELDS), today)
+
+    @classmethod
+    def from_arrays(cls, arrays, today=None, live=None):
+        """Columns over existing arrays (one per ``COLUMNS`` name), without copying them."""
+        columns = cls.__new__(cls)
+        for name in cls.COLUMNS:
+            setattr(columns, name, arrays[name])
+        columns.size = len(columns.user_id)
+        columns.live = live
+        columns._windows(today)
+        return columns
+
+    def _windows(self, today):
+        # Birth date windows for scoring, and the wider ones of the hard filters
+        # (see candidate_filters), computed once per distinct age
+        today = today or timezone.localdate()
+        age_margin, height_margin = _soft_margins()
+        # As in _birth_ordinals, an age range missing either bound never scores
+        bounded = ~np.isnan(self.min_age) & ~np.isnan(self.max_age)
+        self.born_after = np.where(bounded, _ordinals_years_before(today, self.max_age + 1), np.nan)
+        self.born_until = np.where(bounded, _ordinals_years_before(today, self.min_age), np.nan)
+        self.filter_after = _ordinals_years_before(today, self.max_age + age_margin + 1)
+        self.filter_until = _ordinals_years_before(today, self.min_age - age_margin)
+        # Heights have two decimal places; rounding drops the float error of the margin
+        self.filter_min_height = np.round(self.min_height - float(height_margin), 6)
+        self.filter_max_height = np.round(self.max_height + float(height_margin), 6)
+
+    def take(self, indexes):
+        """A copy holding only the rows at ``indexes``."""
+        columns = self.__class__.__new__(self.__class__)
+        for name, value in vars(self).items():
+            setattr(columns, name, value[indexes] if isinstance(value, np.ndarray) else value)
+        columns.size = len(columns.user_id)
+        columns.live = None
+        return columns
+
+    def row(self, index):
+        """One user's preferences, as scalars the scoring kernel broadcasts against candidate columns."""
+        return _PreferenceRow({name: value[index] for name, value in vars(self).items() if isinstance(value, np.ndarray)})
+
+
+class _PreferenceRow:
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+def hard_filter(preferences, columns):
+    """The candidates in ``columns`` passing the hard filters of one ``PreferenceColumns.row``,
+    the same ones ``candidate_mask`` gives for that PartnerPreference."""
+    if preferences.target_gender == '':
+        return np.zeros(columns.size, dtype=bool)
+    mask = columns.gender == preferences.target_gender
+    if not np.isnan(preferences.filter_after):
+        mask &= columns.birth_ordinal > preferences.filter_after
+    if not np.isnan(preferences.filter_until):
+        mask &= columns.birth_ordinal <= preferences.filter_until
+    if not np.isnan(preferences.filter_min_height):
+        mask &= columns.height >= preferences.filter_min_height
+    if not np.isnan(preferences.filter_max_height):
+        mask &= columns.height <= preferences.filter_max_height
+    if columns.live is not None:
+        mask &= columns.live
+    return mask
+
+
+class _PreferenceValues:
+    # One PartnerPreference with its bounds converted for the scoring kernel
+    def __init__(self, preferences, gender, today=None):
+        self.target_gender = OPPOSITE_GENDER.get(gender, '')
+        self.born_after, self.born_until = _birth_ordinals(
+            preferences.min_age, preferences.max_age, today or timezone.localdate())
+        for field in ('min_height', 'max_height'):
+            setattr(self, field, _bound(getattr(preferences, field)))
+        self.codes = np.array([getattr(preferences, name) for name in CODE_COLUMNS], dtype=np.int64)
+
+
+def _code_matrix(column, size):
+    # One row per profile or preference, one column per TEXT_CRITERIA field, so all
+    # equality criteria are compared in a single operation
+    if not size:
+        return np.zeros((0, len(CODE_COLUMNS)), dtype=np.int64)
+    return np.array([column(name) for name in CODE_COLUMNS], dtype=np.int64).T
+
+
+def _bound(value):
+    # A missing bound becomes NaN so the range never matches, as comparing against None never did
+    return np.nan if value is None else float(value)
+
+
+def _birth_ordinals(min_age, max_age, today):
+    # The age range as a window of birth date ordinals (see birth_window). As with
+    # heights, a range missing either bound never scores.
+    if min_age is None or max_age is None:
+        return np.nan, np.nan
+    born_after, born_until = birth_window(min_age, max_age, today)
+    return float(born_after.toordinal()), float(born_until.toordinal())
+
+
+def _ordinals_years_before(today, years):
+    # Ordinal of _years_before(today, n) for each whole n in ``years``, NaN where n is NaN
+    result = np.full(len(years), np.nan)
+    known = ~np.isnan(years)
+    distinct, inverse = np.unique(years[known], return_inverse=True)
+    ordinals = np.array([_years_before(today, int(value)).toordinal() for value in distinct], dtype=np.float64)
+    result[known] = ordinals[inverse]
+    return result
+
+
+def score_candidates(preferences, gender, columns, today=None):
+    """Score every candidate in ``columns`` against one PartnerPreference.
+
+    ``gender`` is the gender of the user who owns ``preferences``; only
+    candidates of the opposite gender within the hard filters (see
+    ``candidate_filters``) can score above zero. Ages are taken on ``today``.
+    """
+    if not columns.size:
+        return np.zeros(0, dtype=np.int64)
+    scores = scorer().kernel(_PreferenceValues(preferences, gender, today), columns)
+    # Zero outside the hard filters, as stored matches are (see candidate_mask)
+    return scores * candidate_mask(preferences, gender, columns, today)
+
+
+def _admitted(preference_columns, candidate):
+    # hard_filter for every row of preference_columns at once, against a one-row ProfileColumns
+    mask = (candidate.gender == preference_columns.target_gender) & (preference_columns.target_gender != '')
+    mask &= np.isnan(preference_columns.filter_after) | (candidate.birth_ordinal > preference_columns.filter_after)
+    mask &= np.isnan(preference_columns.filter_until) | (candidate.birth_ordinal <= preference_columns.filter_until)
+    mask &= np.isnan(preference_columns.filter_min_height) | (candidate.height >= preference_columns.filter_min_height)
+    mask &= np.isnan(preference_columns.filter_max_height) | (candidate.height <= preference_columns.filter_max_height)
+    return mask
+
+
+def score_preferences(preference_columns, candidate):
+    """Score a single candidate (a one-row ProfileColumns) against many viewers' preferences,
+    zero for viewers whose hard filters leave the candidate out."""
+    if not preference_columns.size or not candidate.size:
+        return np.zeros(preference_columns.size, dtype=np.int64)
+    return scorer().kernel(preference_columns, candidate) * _admitted(preference_columns, candidate)
+
+
+def align(user_ids, values, target_ids):
+    """``values`` (one per ``user_ids``) reordered to follow ``target_ids``, NaN where a target has none."""
+    result = np.full(len(target_ids), np.nan)
+    if len(user_ids):
+        order = np.argsort(user_ids)
+        index = np.minimum(np.searchsorted(user_ids[order], target_ids), len(user_ids) - 1)
+        found = user_ids[order][index] == target_ids
+        result[found] = np.asarray(values)[order][index[found]]
+    return result
+
+
+def reverse_scores(preference_columns, profile, user_ids):
+    """How the owners of ``preference_columns`` score ``profile`` (one-row ProfileColumns),
+    in the order of ``user_ids``; NaN for users without preferences. For mutual scoring."""
+    return align(preference_columns.user_id, score_preferences(preference_columns, profile), user_ids)
+
+
+def rank_candidates(preferences, gender, columns, limit=None, mask=None, today=None, reverse=None):
+    """Return ``(user_id, score)`` pairs with a positive score, best first.
+
+    Ties are broken by user id so the order is stable between requests.
+    Candidates outside ``mask`` (see ``candidate_mask``) are left out. In
+    mutual mode ``reverse`` holds each candidate's score for the viewer
+    (see ``reverse_scores``), which is combined into the result.
+    """
+    scores = scorer().combine(score_candidates(preferences, gender, columns, today), reverse)
+    if mask is not None:
+        scores = scores * mask
+    positive = np.flatnonzero(scores > 0)
+    if not positive.size:
+        return []
+
+    user_ids = columns.user_id[positive]
+    values = scores[positive]
+    if limit is not None and limit < positive.size:
+        # Only candidates tied with or above the limit-th score need sorting
+        threshold = np.partition(values, positive.size - limit)[positive.size - limit]
+        user_ids, values = user_ids[values >= threshold], values[values >= threshold]
+    # Higher score first, then lower user id
+    order = np.lexsort((user_ids, -values))[:limit]
+
+    return [(int(user_ids[i]), values[i].item()) for i in order]
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        if day.year - years < datetime.MINYEAR:
+            return datetime.date.min
+        return day.replace(year=day.year - years, day=28)  # 29 February in a non-leap year
+
+
+def age_on(birth_date, day):
+    return day.year - birth_date.year - ((day.month, day.day) < (birth_date.month, birth_date.day))
+
+
+def birth_window(min_age, max_age, today):
+    """``(born_after, born_until)``: someone is between the two ages on ``today``
+    exactly when ``born_after < birth_date <= born_until``. Either bound may be ``None``."""
+    # Still max_age until the day before turning max_age + 1
+    born_after = _years_before(today, max_age + 1) if max_age is not None else None
+    born_until = _years_before(today, min_age) if min_age is not None else None
+    return born_after, born_until
+
+
+def age_bucket(birth_year):
+    return None if birth_year is None else birth_year // AGE_BUCKET_YEARS
+
+
+def _soft_margins():
+    # Whole years and exact centimetres by which soft age and height ranges extend the hard filters
+    soft = scorer().soft
+    return math.ceil(soft.get('age', 0)), Decimal(str(soft.get('height', 0)))
+
+
+def candidate_filters(preferences, gender, today=None):
+    """Hard filters a candidate must pass to be scored at all, as ``Profile`` lookups.
+
+    Returns ``None`` when nobody can match (``gender`` has no opposite).
+    Age bounds become a birth date window and height bounds a height range,
+    so both run as index range scans on ``Profile``. The birth date window is
+    also given as a range of age buckets, which lets the (gender, age_bucket,
+    height) index serve the age and height bounds together. Soft ranges in
+    the scoring spec widen the bounds, since a little outside still scores.
+    """
+    target_gender = OPPOSITE_GENDER.get(gender)
+    if target_gender is None:
+        return None
+
+    age_margin, height_margin = _soft_margins()
+    born_after, born_until = birth_window(
+        None if preferences.min_age is None else preferences.min_age - age_margin,
+        None if preferences.max_age is None else preferences.max_age + age_margin,
+        today or timezone.localdate(),
+    )
+    filters = {'gender': target_gender}
+    if born_after is not None:
+        filters['birth_date__gt'] = born_after
+        filters['age_bucket__gte'] = age_bucket(born_after.year)
+    if born_until is not None:
+        filters['birth_date__lte'] = born_until
+        filters['age_bucket__lte'] = age_bucket(born_until.year)
+    if preferences.min_height is not None:
+        filters['height__gte'] = preferences.min_height - height_margin
+    if preferences.max_height is not None:
+        filters['height__lte'] = preferences.max_height + height_margin
+    return filters
+
+
+def plausible_candidates(preferences, gender, today=None):
+    # Profiles worth scoring for this preference, filtered in SQL
+    filters = candidate_filters(preferences, gender, today)
+    if filters is None:
+        return Profile.objects.none()
+    return Profile.objects.filter(**filters)
+
+
+def candidate_mask(preferences, gender, columns, today=None):
+    # The same hard filters as plausible_candidates, applied to already loaded columns
+    filters = candidate_filters(preferences, gender, today)
+    if filters is None:
+        return np.zeros(columns.size, dtype=bool)
+
+    mask = columns.gender == filters['gender']
+    if 'birth_date__gt' in filters:
+        mask &= columns.birth_ordinal > filters['birth_date__gt'].toordinal()
+    if 'birth_date__lte' in filters:
+        mask &= columns.birth_ordinal <= filters['birth_date__lte'].toordinal()
+    if 'height__gte' in filters:
+        mask &= columns.height >= float(filters['height__gte'])
+    if 'height__lte' in filters:
+        mask &= columns.height <= float(filters['height__lte'])
+    return mask
+
+
+def plausible_viewers(profile, today=None):
+    """Preferences whose hard filters admit ``profile`` (the reverse of plausible_candidates)."""
+    viewer_gender = OPPOSITE_GENDER.get(profile.gender)
+    if viewer_gender is None:
+        return PartnerPreference.objects.none()
+
+    age_margin, height_margin = _soft_margins()
+    queryset = PartnerPreference.objects.filter(user__profile__gender=viewer_gender)
+    if profile.birth_date is not None:
+        age = age_on(profile.birth_date, today or timezone.localdate())
+        queryset = queryset.filter(Q(min_age__isnull=True) | Q(min_age__lte=age + age_margin),
+                                   Q(max_age__isnull=True) | Q(max_age__gte=age - age_margin))
+    else:
+        queryset = queryset.filter(min_age__isnull=True, max_age__isnull=True)
+    if profile.height is not None:
+        height = Decimal(profile.height)
+        queryset = queryset.filter(Q(min_height__isnull=True) | Q(min_height__lte=height + height_margin),
+                                   Q(max_height__isnull=True) | Q(max_height__gte=height - height_margin))
+    else:
+        queryset = queryset.filter(min_height__isnull=True, max_height__isnull=True)
+    return queryset
+
+
+def calculate_match_score(user, potential_match):
+    # Compatibility wrapper around the batch scorer for a single candidate
+    preferences = user.partnerpreference  # Assuming partner preference is linked to user
+    columns = ProfileColumns.from_profiles([potential_match.profile])
+    return score_candidates(preferences, user.profile.gender, columns)[0].item()
@@ -1,223 +1,418 @@
-# views.py
-
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import authenticate, login as django_login
-from django.contrib.auth.decorators import login_required
-from django.contrib.auth.forms import AuthenticationForm
-from django.contrib import messages
-from .forms import SignupForm, ProfileForm, PartnerPreferenceForm, MessageForm, EventForm
-from .models import Profile, PartnerPreference, User, Message, Event, EventResponse
-from django.utils import timezone
-from .utils import calculate_match_score
-
-# Welcome Page for Signup
-def welcome(request):
-    return signup(request)  # Redirect to signup view for consistency
-
-# User Signup View
-def signup(request):
-    if request.method == 'POST':
-        user_form = SignupForm(request.POST)
-        if user_form.is_valid():
-            username = user_form.cleaned_data.get('username')
-            email = user_form.cleaned_data.get('email')
-
-            # Check if user already exists
-            if User.objects.filter(username=username).exists() or User.objects.filter(email=email).exists():
-                messages.error(request, "Username or email already exists.")
-                return redirect('signup')
-
-            user = user_form.save()  # Save the new user
-            django_login(request, user)  # Log in the user after registration
-            
-            return redirect('create_profile')  # Redirect to profile creation page
-
-    else:
-        user_form = SignupForm()
-
-    return render(request, 'matriapp/signup.html', {'user_form': user_form})
-
-# Login View
-def login_view(request):
-    if request.method == 'POST':
-        form = AuthenticationForm(data=request.POST)  # Use data parameter for AuthenticationForm
-        if form.is_valid():
-            user = form.get_user()
-            django_login(request, user)  # Log in the user
-            return redirect('home')  # Redirect to home after logging in
-        else:
-            messages.error(request, "Invalid username or password.")  # Show error message for invalid login.
-    else:
-        form = AuthenticationForm()  # Create an empty authentication form
-    
-    return render(request, 'matriapp/login.html', {'form': form})
-
-# Profile Creation View - Require Login
-@login_required  # Ensure only logged-in users can access this view
-def create_profile(request):
-    profile_instance, created = Profile.objects.get_or_create(user=request.user)
-
-    if request.method == 'POST':
-        profile_form = ProfileForm(request.POST, request.FILES, instance=profile_instance)
-        if profile_form.is_valid():
-            profile_form.save()  # Save the updated or newly created profile
-            messages.success(request, "Your profile has been created!")  # Success message
-            return redirect('partner_preference')  # Redirect to partner preference page
-    else:
-        profile_form = ProfileForm(instance=profile_instance)
-
-    return render(request, 'matriapp/create_profile.html', {'profile_form': profile_form})
-
-# User Profile View for Editing Existing Profiles - Require Login
-@login_required  # Ensure only logged-in users can access this view
-def profile(request):
-    profile_instance = get_object_or_404(Profile, user=request.user)
-
-    if request.method == 'POST':
-        form = ProfileForm(request.POST, request.FILES, instance=profile_instance)
-        if form.is_valid():
-            form.save()  # Save the updated profile
-            messages.success(request, "Your profile has been updated!")  # Success message
-            return redirect('home')  # Redirect to home after saving
-    else:
-        form = ProfileForm(instance=profile_instance)
-
-    return render(request, 'matriapp/profile.html', {'form': form})
-
-# Partner Preference View - Require Login
-@login_required  # Ensure only logged-in users can access this view
-def partner_preference(request):
-    if request.method == 'POST':
-        partner_preference_form = PartnerPreferenceForm(request.POST)
-        if partner_preference_form.is_valid():
-            partner_preference = partner_preference_form.save(commit=False)
-            partner_preference.user = request.user  # Associate with logged-in user
-            partner_preference.save()
-            messages.success(request, "Your partner preferences have been saved!")  # Success message
-            return redirect('home')  # Redirect to home after completing preferences
-    else:
-        partner_preference_form = PartnerPreferenceForm()
-
-    return render(request, 'matriapp/partner_preference.html', {'partner_preference_form': partner_preference_form})
-
-# Home View - Require Login and include additional context data
-@login_required  # Ensure only logged-in users can access this view
-def home(request):
-    upcoming_events = Event.objects.filter(participants=request.user, event_datetime__gte=timezone.now()).order_by('event_datetime')
-    unread_messages = Message.objects.filter(receiver=request.user, is_read=False)
-
-    try:
-        partner_preference = PartnerPreference.objects.get(user=request.user)
-    except PartnerPreference.DoesNotExist:
-        partner_preference = None
-
-    context = {
-        'upcoming_events': upcoming_events,
-        'unread_messages': unread_messages,
-        'partner_preference': partner_preference,
-    }
-    
-    return render(request, 'matriapp/home.html', context)
-
-# Matches View for Finding Potential Matches - Require Login
-@login_required  
-def matches(request):
-    user_matches_list = []  
-    potential_matches = User.objects.exclude(id=request.user.id)  
-    
-    for potential_match in potential_matches:
-        try:
-            score = calculate_match_score(request.user, potential_match)  
-            if score > 0:  
-                user_matches_list.append({'user': potential_match, 'score': score})  
-        except PartnerPreference.DoesNotExist:
-            continue
-    
-    user_matches_list.sort(key=lambda x: x['score'], reverse=True)  
-    
-    return render(request, 'matriapp/matches.html', {'matches': user_matches_list})
-
-# Messages View for Viewing User Messages - Require Login 
-@login_required
-def messages_view(request):  
-    user_messages_list = Message.objects.filter(receiver=request.user)  
-
-    if request.method == 'POST':
-        message_form = MessageForm(request.POST, user=request.user)  # Pass current user
-        if message_form.is_valid():
-            new_message = message_form.save(commit=False)
-            new_message.sender = request.user  # Set sender as the logged-in user
-            new_message.save()
-            return redirect('messages_view')  # Redirect to the same page after sending
-
-    else:
-        message_form = MessageForm(user=request.user)  # Pass current user
-
-    return render(request, 'matriapp/messages.html', {
-        'messages': user_messages_list,
-        'message_form': message_form,
-    })
-
-# Create Event View - Require Login 
-@login_required  
-def create_event(request):
-    if request.method == 'POST':
-        form = EventForm(request.POST)
-        if form.is_valid():
-            event = form.save(commit=False)
-            event.created_by = request.user
-            event.save()
-            notify_partner(event)  # Notify partner about the event (make sure this function is defined)
-            messages.success(request, "Your event has been created!")  # Success message
-            return redirect('events_view')
-    else:
-        form = EventForm()
-    
-    return render(request, 'matriapp/create_event.html', {'form': form})
-
-# Respond to Event View - Require Login 
-@login_required  
-def respond_to_event(request, event_id):
-    event = get_object_or_404(Event, id=event_id)
-    
-    if request.method == 'POST':
-        response = request.POST.get('response') == 'accept'
-        EventResponse.objects.update_or_create(
-            event=event,
-            user=request.user,
-            defaults={'response': response}
-        )
-        
-        messages.success(request, "Your response has been recorded!")  # Success message
-        return redirect('events_view')
-
-# Events View for Viewing User Events - Require Login 
-@login_required  
-def events_view(request):  
-    user_events_list = Event.objects.filter(participants=request.user)  
-    return render(request,'matriapp/events.html',{'events':user_events_list})  
-
-# Available Profiles View - Require Login 
-@login_required  
-def available_profiles(request):
-    opposite_gender_profiles = Profile.objects.filter(gender='Female' if request.user.profile.gender == 'Male' else 'Male')
-    
-    return render(request, 'matriapp/available_profiles.html', {'profiles': opposite_gender_profiles})
-
-# Mark as Read Functionality - Require Login 
-@login_required  
-def mark_as_read(request, message_id):
-    try:
-        message = Message.objects.get(id=message_id, receiver=request.user)
-        message.is_read = True
-        message.save()
-        messages.success(request, "Message marked as read.")  # Success message
-        return redirect('messages_view')
-    except Message.DoesNotExist:
-        messages.error(request, "Message not found.")
-        return redirect('messages_view')
-
-# Chat Room View for Real-Time Chat Functionality - Require Login 
-@login_required  
-def chat_room(request, room_name):
-    return render(request,'matriapp/chat_room.html',{'room_name': room_name})  
\ No newline at end of file
+# views.py
+
+from decimal import Decimal
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth import authenticate, login as django_login
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.forms import AuthenticationForm
+from django.contrib import messages
+from .forms import SignupForm, ProfileForm, PartnerPreferenceForm, MessageForm, EventForm
+from .models import Profile, PartnerPreference, User, Message, Event, EventResponse
+from django.utils import timezone
+from django.http import HttpResponseBadRequest, JsonResponse
+from .chat import direct_room_name
+from .images import schedule_picture_processing
+from .inbox import conversation_page, mark_read, unread_count
+from .match_cache import cached_first_page, match_page
+from .pagination import decode_cursor, encode_cursor, keyset_page, page_size, parse_timestamp, stream_json_page, stream_json_rows
+from .recommend import recommend_for_user
+from .routers import read_your_writes, replica_reads
+from .search import FACET_FIELDS, facet_counts, matching_profiles
+from matrimony.database import pool_stats
+
+HOME_UNREAD_PREVIEW = 10
+
+# Welcome Page for Signup
+def welcome(request):
+    return signup(request)  # Redirect to signup view for consistency
+
+# User Signup View
+def signup(request):
+    if request.method == 'POST':
+        user_form = SignupForm(request.POST)
+        if user_form.is_valid():
+            username = user_form.cleaned_data.get('username')
+            email = user_form.cleaned_data.get('email')
+
+            # Check if user already exists
+            if User.objects.filter(username=username).exists() or User.objects.filter(email=email).exists():
+                messages.error(request, "Username or email already exists.")
+                return redirect('signup')
+
+            user = user_form.save()  # Save the new user
+            django_login(request, user)  # Log in the user after registration
+            
+            return redirect('create_profile')  # Redirect to profile creation page
+
+    else:
+        user_form = SignupForm()
+
+    return render(request, 'matriapp/signup.html', {'user_form': user_form})
+
+# Login View
+def login_view(request):
+    if request.method == 'POST':
+        form = AuthenticationForm(data=request.POST)  # Use data parameter for AuthenticationForm
+        if form.is_valid():
+            user = form.get_user()
+            django_login(request, user)  # Log in the user
+            return redirect('home')  # Redirect to home after logging in
+        else:
+            messages.error(request, "Invalid username or password.")  # Show error message for invalid login.
+    else:
+        form = AuthenticationForm()  # Create an empty authentication form
+    
+    return render(request, 'matriapp/login.html', {'form': form})
+
+# Profile Creation View - Require Login
+@login_required  # Ensure only logged-in users can access this view
+def create_profile(request):
+    profile_instance, created = Profile.objects.get_or_create(user=request.user)
+
+    if request.method == 'POST':
+        profile_form = ProfileForm(request.POST, request.FILES, instance=profile_instance)
+        if profile_form.is_valid():
+            profile = profile_form.save()  # Save the updated or newly created profile
+            read_your_writes(request)  # Their next pages are read from the primary
+            if 'profile_picture' in profile_form.changed_data:
+                schedule_picture_processing(profile)  # Thumbnails are built off the request thread
+            messages.success(request, "Your profile has been created!")  # Success message
+            return redirect('partner_preference')  # Redirect to partner preference page
+    else:
+        profile_form = ProfileForm(instance=profile_instance)
+
+    return render(request, 'matriapp/create_profile.html', {'profile_form': profile_form})
+
+# User Profile View for Editing Existing Profiles - Require Login
+@login_required  # Ensure only logged-in users can access this view
+def profile(request):
+    profile_instance = get_object_or_404(Profile, user=request.user)
+
+    if request.method == 'POST':
+        form = ProfileForm(request.POST, request.FILES, instance=profile_instance)
+        if form.is_valid():
+            profile = form.save()  # Save the updated profile
+            read_your_writes(request)  # Their next pages are read from the primary
+            if 'profile_picture' in form.changed_data:
+                schedule_picture_processing(profile)  # Thumbnails are built off the request thread
+            messages.success(request, "Your profile has been updated!")  # Success message
+            return redirect('home')  # Redirect to home after saving
+    else:
+        form = ProfileForm(instance=profile_instance)
+
+    return render(request, 'matriapp/profile.html', {'form': form})
+
+# Partner Preference View - Require Login
+@login_required  # Ensure only logged-in users can access this view
+def partner_preference(request):
+    if request.method == 'POST':
+        partner_preference_form = PartnerPreferenceForm(request.POST)
+        if partner_preference_form.is_valid():
+            partner_preference = partner_preference_form.save(commit=False)
+            partner_preference.user = request.user  # Associate with logged-in user
+            partner_preference.save()
+            read_your_writes(request)  # Their next pages are read from the primary
+            messages.success(request, "Your partner preferences have been saved!")  # Success message
+            return redirect('home')  # Redirect to home after completing preferences
+    else:
+        partner_preference_form = PartnerPreferenceForm()
+
+    return render(request, 'matriapp/partner_preference.html', {'partner_preference_form': partner_preference_form})
+
+# Home View - Require Login and include additional context data
+@login_required  # Ensure only logged-in users can access this view
+def home(request):
+    # Evaluated here with only the columns the template shows, so rendering issues no queries
+    upcoming_events = list(
+        Event.objects.filter(participants=request.user, event_datetime__gte=timezone.now())
+        .only('title', 'location', 'event_datetime')
+        .order_by('event_datetime')
+    )
+    # The badge reads the denormalized counter; the preview is skipped when there is nothing unread
+    unread_total = unread_count(request.user.id)
+    unread_messages = []
+    if unread_total:
+        unread_messages = list(
+            Message.objects.filter(receiver=request.user, is_read=False)
+            .select_related('sender')
+            .only('content', 'timestamp', 'sender__username')
+            .order_by('-timestamp')[:HOME_UNREAD_PREVIEW]
+        )
+
+    try:
+        partner_preference = PartnerPreference.objects.get(user=request.user)
+    except PartnerPreference.DoesNotExist:
+        partner_preference = None
+
+    context = {
+        'upcoming_events': upcoming_events,
+        'unread_messages': unread_messages,
+        'unread_count': unread_total,
+        'partner_preference': partner_preference,
+    }
+    
+    return render(request, 'matriapp/home.html', context)
+
+# Matches View helpers for cursors and JSON rows
+def _match_cursor(match):
+    return [match.match_score, match.matched_user_id]
+
+def _match_json(match):
+    return {'user_id': match.matched_user_id, 'username': match.matched_user.username,
+            'score': float(match.match_score)}
+
+# Matches View for Finding Potential Matches - Require Login
+# Keyset paginated with ?cursor=, streamed as JSON with ?format=json; ?mutual=1 lists only
+# users who score each other, ranked by the lower of the two scores
+@login_required  
+@replica_reads
+def matches(request):
+    try:
+        after = decode_cursor(request.GET.get('cursor'), (Decimal, int))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    limit = page_size(request)
+    mutual = request.GET.get('mutual') == '1'
+    # The first page is served from the per-user cache when it holds enough rows
+    cached = cached_first_page(request.user.id, limit) if after is None and not mutual else None
+    if cached is not None:
+        page, has_more = cached
+        next_cursor = encode_cursor(_match_cursor(page[-1])) if has_more else None
+    else:
+        # Scores are materialized in the Match table by matching.py as profiles change
+        page, next_cursor = match_page(request.user.id, limit, after, mutual)
+    if request.GET.get('format') == 'json':
+        return stream_json_rows(page, next_cursor, _match_json)
+    return render(request, 'matriapp/matches.html', {'matches': page, 'next_cursor': next_cursor, 'mutual': mutual})
+
+# Messages View for Viewing User Messages - Require Login 
+@login_required
+def messages_view(request):  
+    user_messages_list = (Message.objects.filter(receiver=request.user)
+                          .select_related('sender')
+                          .only('content', 'timestamp', 'is_read', 'sender__username')
+                          .order_by('-timestamp'))
+
+    if request.method == 'POST':
+        message_form = MessageForm(request.POST, user=request.user)  # Pass current user
+        if message_form.is_valid():
+            new_message = message_form.save(commit=False)
+            new_message.sender = request.user  # Set sender as the logged-in user
+            new_message.room_name = direct_room_name(request.user.id, new_message.receiver_id)  # Same thread as the private chat room
+            new_message.save()
+            return redirect('messages_view')  # Redirect to the same page after sending
+
+    else:
+        message_form = MessageForm(user=request.user)  # Pass current user
+
+    return render(request, 'matriapp/messages.html', {
+        'messages': user_messages_list,
+        'message_form': message_form,
+    })
+
+# Create Event View - Require Login 
+@login_required  
+def create_event(request):
+    if request.method == 'POST':
+        form = EventForm(request.POST)
+        if form.is_valid():
+            event = form.save(commit=False)
+            event.created_by = request.user
+            event.save()
+            notify_partner(event)  # Notify partner about the event (make sure this function is defined)
+            messages.success(request, "Your event has been created!")  # Success message
+            return redirect('events_view')
+    else:
+        form = EventForm()
+    
+    return render(request, 'matriapp/create_event.html', {'form': form})
+
+# Respond to Event View - Require Login 
+@login_required  
+def respond_to_event(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    
+    if request.method == 'POST':
+        response = request.POST.get('response') == 'accept'
+        EventResponse.objects.update_or_create(
+            event=event,
+            user=request.user,
+            defaults={'response': response}
+        )
+        
+        messages.success(request, "Your response has been recorded!")  # Success message
+        return redirect('events_view')
+
+# Events View for Viewing User Events - Require Login 
+@login_required  
+def events_view(request):  
+    # created_by and participants are read per row by the template
+    user_events_list = (Event.objects.filter(participants=request.user)
+                        .select_related('created_by')
+                        .prefetch_related('participants'))
+    return render(request,'matriapp/events.html',{'events':user_events_list})  
+
+def _profile_json(profile):
+    return {'id': profile.id, 'username': profile.user.username, 'location': profile.location,
+            'birth_year': profile.birth_date.year if profile.birth_date else None, 'age': profile.age,
+            'thumbnail': profile.picture_thumbnail.url if profile.picture_thumbnail else None}
+
+# Available Profiles View - Require Login 
+# Keyset paginated by profile id with ?cursor=, streamed as JSON with ?format=json
+@login_required  
+@replica_reads
+def available_profiles(request):
+    try:
+        after = decode_cursor(request.GET.get('cursor'), (int,))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    opposite_gender_profiles = Profile.objects.filter(gender='Female' if request.user.profile.gender == 'Male' else 'Male')
+    if after is not None:
+        opposite_gender_profiles = opposite_gender_profiles.filter(id__gt=after[0])
+    opposite_gender_profiles = (opposite_gender_profiles.select_related('user')
+                                .only('location', 'birth_date', 'picture_thumbnail', 'user__username')
+                                .order_by('id'))
+
+    limit = page_size(request)
+    if request.GET.get('format') == 'json':
+        return stream_json_page(opposite_gender_profiles, limit, lambda profile: [profile.id], _profile_json)
+
+    page, next_cursor = keyset_page(opposite_gender_profiles, limit, lambda profile: [profile.id])
+    return render(request, 'matriapp/available_profiles.html', {'profiles': page, 'next_cursor': next_cursor})
+
+# Similar Profiles View - profiles most like the ones the user has been talking to,
+# found through the similarity index (see recommend.py); JSON with ?format=json
+@login_required
+@replica_reads
+def similar_profiles(request):
+    ranked = recommend_for_user(request.user.id, page_size(request))
+    profiles = (Profile.objects.filter(user_id__in=[user_id for user_id, _ in ranked]).select_related('user')
+                .only('user_id', 'location', 'birth_date', 'picture_thumbnail', 'user__username')
+                .in_bulk(field_name='user_id'))
+    rows = [(profiles[user_id], similarity) for user_id, similarity in ranked if user_id in profiles]
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'results': [{**_profile_json(profile), 'similarity': round(similarity, 4)}
+                                         for profile, similarity in rows]})
+    return render(request, 'matriapp/similar_profiles.html', {'profiles': rows})
+
+# Inbox helpers: each conversation is shown from the viewer's side
+def _conversation_row(conversation, user_id):
+    other = conversation.user_high if conversation.user_low_id == user_id else conversation.user_low
+    return {
+        'id': conversation.id,
+        'other_user': other,
+        'room_name': direct_room_name(user_id, other.id),
+        'last_message': conversation.last_message.content if conversation.last_message else '',
+        'last_activity': conversation.last_activity,
+        'unread': conversation.unread_for(user_id),
+    }
+
+def _conversation_json(row):
+    return {**row, 'other_user': row['other_user'].username}
+
+# Inbox View - one row per conversation, most recent first
+# Keyset paginated on (last_activity, id) with ?cursor=, JSON with ?format=json
+@login_required
+@replica_reads
+def inbox(request):
+    try:
+        after = decode_cursor(request.GET.get('cursor'), (parse_timestamp, int))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    conversations, next_cursor = conversation_page(request.user.id, page_size(request), after)
+    rows = [_conversation_row(conversation, request.user.id) for conversation in conversations]
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'results': [_conversation_json(row) for row in rows], 'next': next_cursor})
+    return render(request, 'matriapp/inbox.html', {'conversations': rows, 'next_cursor': next_cursor})
+
+# Search View - full-text over the profile text with facet counts
+# ?q= words, ?religion=/caste=/location=/education= narrow by facet;
+# keyset paginated by profile id with ?cursor=, JSON with ?format=json
+@login_required
+@replica_reads
+def search_profiles(request):
+    try:
+        after = decode_cursor(request.GET.get('cursor'), (int,))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    query = request.GET.get('q', '').strip()
+    results = Profile.objects.filter(gender='Female' if request.user.profile.gender == 'Male' else 'Male')
+    results = matching_profiles(results, query)
+    selected = {field: request.GET[field] for field in FACET_FIELDS if request.GET.get(field)}
+    results = results.filter(**selected)
+    facets = facet_counts(results)
+
+    if after is not None:
+        results = results.filter(id__gt=after[0])
+    results = (results.select_related('user')
+               .only('location', 'birth_date', 'picture_thumbnail', 'user__username')
+               .order_by('id'))
+    page, next_cursor = keyset_page(results, page_size(request), lambda profile: [profile.id])
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'results': [_profile_json(profile) for profile in page], 'facets': facets,
+                             'next': next_cursor})
+
+    facet_links = []
+    for field, values in facets.items():
+        links = []
+        for value, count in values:
+            params = request.GET.copy()
+            params.pop('cursor', None)
+            params[field] = value
+            links.append({'value': value, 'count': count, 'query': params.urlencode(),
+                          'selected': selected.get(field) == value})
+        facet_links.append((field, links))
+    next_params = request.GET.copy()
+    next_params['cursor'] = next_cursor or ''
+    return render(request, 'matriapp/search.html', {
+        'query': query,
+        'profiles': page,
+        'facets': facet_links,
+        'next_query': next_params.urlencode() if next_cursor else None,
+    })
+
+# Mark as Read Functionality - Require Login 
+@login_required  
+def mark_as_read(request, message_id):
+    if mark_read(request.user.id, ids=[message_id]) or Message.objects.filter(id=message_id, receiver=request.user).exists():
+        messages.success(request, "Message marked as read.")  # Success message
+    else:
+        messages.error(request, "Message not found.")
+    return redirect('messages_view')
+
+# Bulk mark-as-read: POST all=1, ids=<id> (repeatable) or up_to=<message id>.
+# Each request is a single UPDATE; ?format=json returns the new unread count.
+@login_required
+def mark_messages_read(request):
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST required')
+    try:
+        ids = [int(value) for value in request.POST.getlist('ids')] or None
+        up_to = int(request.POST['up_to']) if request.POST.get('up_to') else None
+    except ValueError:
+        return HttpResponseBadRequest('Invalid message id')
+    if ids is None and up_to is None and not request.POST.get('all'):
+        return HttpResponseBadRequest('Nothing to mark')
+
+    marked = mark_read(request.user.id, ids=ids, up_to=up_to)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'marked': marked, 'unread': unread_count(request.user.id)})
+    messages.success(request, f"{marked} message{'s' if marked != 1 else ''} marked as read.")
+    return redirect('messages_view')
+
+# Chat Room View for Real-Time Chat Functionality - Require Login 
+@login_required  
+def chat_room(request, room_name):
+    return render(request,'matriapp/chat_room.html',{'room_name': room_name})  
+
+# Connection pool stats of the process serving the request, for sizing the pools
+# (see matrimony/database.py); ?reset=1 starts the counters over. Staff only.
+@staff_member_required
+def database_stats(request):
+    return JsonResponse(pool_stats(reset=request.GET.get('reset') == '1'))
@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VocabularyAlias, VocabularyTerm, VocabularyVersion, normalize_vocabulary
+
+# Text fields on Profile and PartnerPreference that are matched by equality.
+# Each has an integer ``<field>_code`` next to it holding its vocabulary code.
+VOCABULARY_FIELDS = ('religion', 'caste', 'education', 'occupation', 'location')
+BLANK_CODE = 0  # A blank field; blank on both sides still counts as equal when scoring
+
+VERSION_ROW = 1  # Primary key of the VocabularyVersion row
+BATCH_SIZE = 1000
+
+normalize = normalize_vocabulary
+
+
+def code_field(field):
+    return f'{field}_code'
+
+
+def _shared_version():
+    return VocabularyVersion.objects.filter(pk=VERSION_ROW).values_list('version', flat=True).first() or 0
+
+
+def bump_version():
+    """Make every process reload its vocabulary (aliases changed). Call it in the
+    transaction making the change, so the two commit together."""
+    if not VocabularyVersion.objects.filter(pk=VERSION_ROW).update(version=F('version') + 1):
+        VocabularyVersion.objects.get_or_create(pk=VERSION_ROW, defaults={'version': 1})  # Row flushed away
+    vocabulary.expire()  # This process reloads at its next lookup, the others within the check interval
+
+
+class Vocabulary:
+    """Per-process map of ``(kind, normalized spelling) -> code``, loaded from the aliases in one query.
+
+    Lookups read the version stamp from the database at most every
+    ``VOCABULARY_CHECK_INTERVAL`` seconds and reload when it has moved,
+    which happens when aliases are edited or terms deleted. New spellings
+    are added as terms on first use without invalidating anyone: other
+    processes find the same row through the unique constraint.
+    """
+
+    def __init__(self):
+        self._codes = None
+        self._version = None
+        self._check_at = 0.0  # time.monotonic() of the next version check
+        self._lock = threading.Lock()
+
+    def _current(self):
+        now = time.monotonic()
+        if self._codes is not None and now < self._check_at:
+            return self._codes
+        version = _shared_version()
+        self._check_at = now + getattr(settings, 'VOCABULARY_CHECK_INTERVAL', 1.0)
+        if self._codes is None or version != self._version:
+            self._codes = {
+                (kind, sys.intern(name)): term_id
+                for kind, name, term_id in VocabularyAlias.objects.values_list('kind', 'name', 'term_id').iterator()
+            }
+            self._version = version
+        return self._codes
+
+    def clear(self):
+        with self._lock:
+            self._codes = None
+
+    def expire(self):
+        # Check the version at the next lookup
+        self._check_at = 0.0
+
+    def _create(self, kind, text, name):
+        # Another process may have added the spelling since this one loaded
+        alias = VocabularyAlias.objects.filter(kind=kind, name=name).values_list('term_id', flat=True).first()
+        if alias is not None:
+            return alias
+        term, _ = VocabularyTerm.objects.get_or_create(kind=kind, label=' '.join(text.split()))
+        # bulk_create skips the alias signals: a new spelling changes no existing code
+        VocabularyAlias.objects.bulk_create([VocabularyAlias(term=term, kind=kind, name=name)], ignore_conflicts=True)
+        return VocabularyAlias.objects.filter(kind=kind, name=name).values_list('term_id', flat=True).first()
+
+    def encode(self, values):
+        """Codes for ``{kind: text}``, adding unseen spellings as new terms."""
+        with self._lock:
+            codes = self._current()
+            result, missing = {}, {}
+            for kind, text in values.items():
+                name = normalize(text)
+                code = codes.get((kind, name)) if name else BLANK_CODE
+                if code is None:
+                    missing[kind] = (text, name)
+                else:
+                    result[kind] = code
+            for kind, (text, name) in missing.items():
+                result[kind] = self._create(kind, text, name)
+        # Remembered only once committed: a rolled back term must not keep its code here.
+        # Registered outside the lock, as outside a transaction the callback runs at once.
+        for kind, (text, name) in missing.items():
+            transaction.on_commit(lambda key=(kind, sys.intern(name)), code=result[kind]: self._remember(key, code))
+        return result
+
+    def _remember(self, key, code):
+        with self._lock:
+            if self._codes is not None:
+                self._codes[key] = code
+
+    def code(self, kind, text):
+        return self.encode({kind: text})[kind]
+
+
+vocabulary = Vocabulary()
+
+
+def encode_instance(instance):
+    """Set the ``*_code`` fields of a Profile or PartnerPreference from its text fields."""
+    codes = vocabulary.encode({field: getattr(instance, field) for field in VOCABULARY_FIELDS})
+    for field, code in codes.items():
+        setattr(instance, code_field(field), code)
+
+
+def recode(model, batch_size=BATCH_SIZE):
+    """Re-encode every row of ``model`` a batch at a time, after aliases were merged or split.
+
+    Returns the number of rows whose codes changed. Writes go through
+    ``bulk_update``, so no signals fire; rebuild the match table afterwards.
+    """
+    columns = VOCABULARY_FIELDS + tuple(code_field(field) for field in VOCABULARY_FIELDS)
+    changed, last_id = 0, 0
+    while True:
+        batch = list(model.objects.filter(id__gt=last_id).order_by('id').only(*columns)[:batch_size])
+        if not batch:
+            return changed
+        stale = []
+        for instance in batch:
+            before = [getattr(instance, code_field(field)) for field in VOCABULARY_FIELDS]
+            encode_instance(instance)
+            if before != [getattr(instance, code_field(field)) for field in VOCABULARY_FIELDS]:
+                stale.append(instance)
+        for instance in stale:
+            instance.scoring_changed_at = timezone.now()  # bulk_update skips auto_now and pre_save
+        model.objects.bulk_update(stale, [code_field(field) for field in VOCABULARY_FIELDS] + ['scoring_changed_at'])
+        changed += len(stale)
+        last_id = batch[-1].id
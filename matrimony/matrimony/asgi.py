@@ -1,16 +1,22 @@
-import os
-from channels.auth import AuthMiddlewareStack
-from channels.routing import ProtocolTypeRouter, URLRouter
-from django.core.asgi import get_asgi_application
-import matriapp.routing
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrimony.settings')
-
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            matriapp.routing.websocket_urlpatterns
-        )
-    ),
-})
\ No newline at end of file
+import os
+from channels.auth import AuthMiddlewareStack
+from channels.routing import ProtocolTypeRouter, URLRouter
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrimony.settings')
+os.environ.setdefault('SERVER_TYPE', 'asgi')  # Sizes the connection pools and adds the chat alias (see database.py)
+
+# Set up Django before importing anything that loads models, so that the
+# application also starts under a plain `daphne matrimony.asgi:application`
+django_asgi_application = get_asgi_application()
+
+import matriapp.routing  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_application,
+    "websocket": AuthMiddlewareStack(
+        URLRouter(
+            matriapp.routing.websocket_urlpatterns
+        )
+    ),
+})
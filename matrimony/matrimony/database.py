@@ -0,0 +1,151 @@
+"""
+Database settings for matrimony, read from the environment.
+
+Connection:
+    DATABASE_ENGINE            "postgresql" (default) or "sqlite3", whose DATABASE_NAME is a file
+    DATABASE_NAME, DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT
+
+Connection reuse, one of:
+    DATABASE_CONN_MAX_AGE      Seconds a connection is kept for later requests (default 60;
+                               0 closes it after each request, "none" keeps it forever)
+    DATABASE_POOL=1            A psycopg 3 pool in every process instead (needs psycopg[pool]);
+                               sized by the process type unless DATABASE_POOL_MIN_SIZE,
+                               DATABASE_POOL_MAX_SIZE or DATABASE_POOL_TIMEOUT are set
+                               (PostgreSQL only)
+    DATABASE_HEALTH_CHECKS=0   Skip checking a reused connection before handing it out
+
+Process type:
+    SERVER_TYPE                "wsgi", "asgi" or "command"; set by wsgi.py and asgi.py
+
+ASGI processes also get a "chat" alias on the same database, with its own pool
+(DATABASE_CHAT_POOL_MIN_SIZE, DATABASE_CHAT_POOL_MAX_SIZE), which the chat
+consumers use (see matriapp.routers) so a burst of chat writes never waits
+behind page requests for a connection, nor they behind it.
+
+Read replicas:
+    DATABASE_REPLICAS          Comma-separated HOST[:PORT] of replicas of the database (with
+                               sqlite3, copies of its file), as the aliases replica1, replica2, ...
+                               that matriapp.routers reads from while they keep up (see
+                               DATABASE_REPLICA_MAX_LAG in settings.py)
+"""
+import os
+
+SERVER_TYPES = ('wsgi', 'asgi', 'command')
+
+# (min_size, max_size) of each process's pool. A WSGI process serves one request per
+# thread; an ASGI process runs the sync parts of every in-flight request on threads
+# of its own (up to asgiref's default of 32); commands mostly use one connection.
+POOL_SIZES = {'wsgi': (2, 8), 'asgi': (4, 16), 'command': (1, 4)}
+CHAT_POOL_SIZE = (2, 8)
+POOL_TIMEOUT = 10.0  # Seconds to wait for a free connection before failing the request
+
+CHAT_DATABASE = 'chat'
+REPLICA_PREFIX = 'replica'
+
+ENGINES = {'postgresql': 'django.db.backends.postgresql', 'sqlite3': 'django.db.backends.sqlite3'}
+
+
+def _flag(environ, name, default):
+    return environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _conn_max_age(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def _pool(environ, prefix, sizes, name):
+    min_size, max_size = sizes
+    return {
+        'min_size': int(environ.get(f'{prefix}_MIN_SIZE', min_size)),
+        'max_size': int(environ.get(f'{prefix}_MAX_SIZE', max_size)),
+        'timeout': float(environ.get(f'{prefix}_TIMEOUT', POOL_TIMEOUT)),
+        'name': name,  # Shown in the pool's logs and stats
+    }
+
+
+def _replica(default, entry):
+    if default['ENGINE'] == ENGINES['sqlite3']:
+        return {**default, 'NAME': entry}
+    host, _, port = entry.partition(':')
+    return {**default, 'HOST': host, 'PORT': port or default['PORT']}
+
+
+def replica_aliases(databases):
+    """The replica aliases among ``databases`` (a DATABASES dict), in order."""
+    return sorted(alias for alias in databases if alias.startswith(REPLICA_PREFIX))
+
+
+def server_type(environ=os.environ):
+    kind = environ.get('SERVER_TYPE', 'command')
+    if kind not in SERVER_TYPES:
+        raise ValueError(f'SERVER_TYPE must be one of {", ".join(SERVER_TYPES)}, not {kind!r}')
+    return kind
+
+
+def database_settings(environ=os.environ):
+    """``DATABASES`` for this process, from ``environ``."""
+    kind = server_type(environ)
+    engine = environ.get('DATABASE_ENGINE', 'postgresql')
+    if engine not in ENGINES:
+        raise ValueError(f'DATABASE_ENGINE must be one of {", ".join(ENGINES)}, not {engine!r}')
+    pooled = engine == 'postgresql' and _flag(environ, 'DATABASE_POOL', False)
+    default = {
+        'ENGINE': ENGINES[engine],
+        'NAME': environ.get('DATABASE_NAME', 'matrimony_db'),
+        'USER': environ.get('DATABASE_USER', 'postgres'),
+        'PASSWORD': environ.get('DATABASE_PASSWORD', 'kushi@123'),
+        'HOST': environ.get('DATABASE_HOST', 'localhost'),
+        'PORT': environ.get('DATABASE_PORT', '5432'),
+        # A pool hands its connections out per request, so they must not also persist
+        'CONN_MAX_AGE': 0 if pooled else _conn_max_age(environ.get('DATABASE_CONN_MAX_AGE', '60')),
+        # Reused connections are checked first; with a pool, when they are checked out
+        'CONN_HEALTH_CHECKS': _flag(environ, 'DATABASE_HEALTH_CHECKS', True),
+        'OPTIONS': {},
+    }
+    if pooled:
+        default['OPTIONS']['pool'] = _pool(environ, 'DATABASE_POOL', POOL_SIZES[kind], 'default')
+    databases = {'default': default}
+
+    if kind == 'asgi':
+        chat = {**default, 'OPTIONS': {}, 'TEST': {'MIRROR': 'default'}}
+        if pooled:
+            chat['OPTIONS']['pool'] = _pool(environ, 'DATABASE_CHAT_POOL', CHAT_POOL_SIZE, CHAT_DATABASE)
+        databases[CHAT_DATABASE] = chat
+
+    entries = [entry.strip() for entry in environ.get('DATABASE_REPLICAS', '').split(',') if entry.strip()]
+    for number, entry in enumerate(entries, 1):
+        alias = f'{REPLICA_PREFIX}{number}'
+        replica = {**_replica(default, entry), 'OPTIONS': {}, 'TEST': {'MIRROR': 'default'}}
+        if pooled:
+            replica['OPTIONS']['pool'] = _pool(environ, 'DATABASE_POOL', POOL_SIZES[kind], alias)
+        databases[alias] = replica
+    return databases
+
+
+def pool_stats(reset=False):
+    """``{alias: stats}`` for the connection pools of this process, for tuning their sizes.
+
+    ``checked_out`` connections are in use right now and ``waiting``
+    requests are queued for one; ``wait_ms`` is the total time requests
+    spent queued over ``requests``, since the last reset. Aliases without
+    a pool are left out.
+    """
+    from django.db import connections
+
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        raw = pool.pop_stats() if reset else pool.get_stats()
+        size, available = raw.get('pool_size', 0), raw.get('pool_available', 0)
+        requests, wait_ms = raw.get('requests_num', 0), raw.get('requests_wait_ms', 0)
+        stats[alias] = {
+            'min_size': raw.get('pool_min'), 'max_size': raw.get('pool_max'),
+            'size': size, 'checked_out': size - available, 'available': available,
+            'waiting': raw.get('requests_waiting', 0), 'requests': requests,
+            'queued': raw.get('requests_queued', 0), 'wait_ms': wait_ms,
+            'mean_wait_ms': wait_ms / requests if requests else 0.0,
+            'errors': raw.get('requests_errors', 0),  # Mostly waits that timed out
+        }
+    return stats
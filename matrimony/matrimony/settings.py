@@ -1,153 +1,256 @@
-"""
-Django settings for matrimony project.
-
-Generated by 'django-admin startproject' using Django 5.1.1.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.1/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/5.1/ref/settings/
-"""
-
-from pathlib import Path
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-6xx-_or!-d%-=+mq_q+(^@wg=76zrhu69(n3^^ifcwgtgd!1*x'
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
-
-
-# Application definition
-
-INSTALLED_APPS = [
-    'daphne',
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'matriapp',
-    'channels',
-    'djongo',
-]
-
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'matrimony.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'matrimony.wsgi.application'
-ASGI_APPLICATION = 'matrimony.asgi.application'
-
-
-
-# Database
-# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": "matrimony_db",
-        "USER": "postgres",
-        "PASSWORD": "kushi@123",
-        "HOST": "localhost",
-        "PORT": "5432",
-    }
-}
-
-# Password validation
-# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/5.1/topics/i18n/
-
-LANGUAGE_CODE = 'en-us'
-
-TIME_ZONE = 'UTC'
-
-USE_I18N = True
-
-USE_TZ = True
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/5.1/howto/static-files/
-
-STATIC_URL = 'static/'
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
-
-# settings.py
-
-LOGIN_URL = '/login/'  # Set this to your custom login URL
-LOGIN_REDIRECT_URL = '/'  # Redirect to home after successful login
-AUTH_USER_MODEL = 'matriapp.User'  # Replace 'yourapp' with the name of your app
-PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
-    'django.contrib.auth.hashers.Argon2PasswordHasher',
-    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
-    'django.contrib.auth.hashers.BCryptPasswordHasher',
-    'django.contrib.auth.hashers.ScryptPasswordHasher',
-]
-
+"""
+Django settings for matrimony project.
+
+Generated by 'django-admin startproject' using Django 5.1.1.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.1/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+from .database import database_settings
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-6xx-_or!-d%-=+mq_q+(^@wg=76zrhu69(n3^^ifcwgtgd!1*x'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'daphne',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'matriapp',
+    'channels',
+    'djongo',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'matrimony.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'matrimony.wsgi.application'
+ASGI_APPLICATION = 'matrimony.asgi.application'
+
+# Route home, matches, messages, events and available profiles to the async views in
+# matriapp/async_views.py, which Daphne runs on its event loop without a thread each.
+# Compare both with `python manage.py benchmark_views`.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+# Built from DATABASE_* environment variables: persistent connections or a
+# connection pool per process, and a "chat" alias in ASGI processes (see database.py)
+DATABASES = database_settings()
+DATABASE_ROUTERS = ['matriapp.routers.AliasRouter']
+
+# Replicas (DATABASE_REPLICAS) serve the reads of the listing views and of the index
+# build commands while they lag behind by no more than this many seconds, checked
+# this often per process; a user's reads stay on the primary for as long after
+# they save their profile or preferences (see matriapp/routers.py). Keep the lag
+# limit well under PROFILE_SNAPSHOT_OVERLAP, which has to cover it.
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', '10'))
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = 5
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# Uploaded files, in a directory of their own; only MEDIA_SERVED_PREFIXES are
+# served from it. Uploads used to be stored under BASE_DIR itself: move an
+# existing BASE_DIR/profile_pictures into MEDIA_ROOT (stored names are unchanged).
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', str(BASE_DIR / 'media'))
+MEDIA_SERVED_PREFIXES = ('profile_pictures/',)
+MEDIA_MAX_AGE = 3600  # Seconds for names that are not content-hashed
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Rescore stored matches on a background thread after Profile/PartnerPreference saves
+MATCH_REFRESH_ASYNC = True
+
+# Profile pictures: upload limits, and WebP renditions built on a worker pool after upload
+PROFILE_PICTURE_MAX_BYTES = 5 * 1024 * 1024
+PROFILE_PICTURE_MAX_PIXELS = 40_000_000
+PROFILE_IMAGE_ASYNC = True
+PROFILE_IMAGE_WORKERS = 2
+PROFILE_IMAGE_QUALITY = 80
+
+# Any configured cache backend works; local memory is per process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Match scoring spec, compiled at startup (see matriapp.scoring). Each criterion
+# has a weight; 'age' and 'height' may also be soft, still scoring partially up to
+# 'soft' years or centimetres outside the preferred range. 'mutual' ('mean' or
+# 'min') also scores each pair from the other user's preferences.
+MATCH_SCORING = {
+    'criteria': {
+        'age': {'weight': 1, 'soft': 0},
+        'height': {'weight': 1, 'soft': 0},
+        'religion': {'weight': 1},
+        'caste': {'weight': 1},
+        'education': {'weight': 1},
+        'occupation': {'weight': 1},
+        'location': {'weight': 1},
+    },
+    'mutual': None,
+}
+
+# Per-user ranked match lists, invalidated by profile/preference signals
+MATCH_CACHE_ALIAS = 'default'
+MATCH_CACHE_TOP_N = 200
+MATCH_CACHE_TIMEOUT = 60 * 60  # Safety net only
+
+# Seconds a process may keep using its religion/caste/... vocabulary before checking
+# the version stamp in the database, which moves when aliases change (see matriapp.vocab)
+VOCABULARY_CHECK_INTERVAL = 1.0
+
+# "Similar profiles" index (see matriapp.recommend), built with
+# `python manage.py build_similarity_index` and memory-mapped by every worker
+SIMILARITY_INDEX_DIR = os.environ.get('SIMILARITY_INDEX_DIR', str(BASE_DIR / 'similarity-index'))
+
+# Columnar snapshot of the scored profile and preference columns (see matriapp.snapshot),
+# written by `python manage.py build_profile_snapshot` and memory-mapped by match rebuilds.
+# Rows stamped up to PROFILE_SNAPSHOT_OVERLAP seconds before it was taken are re-read too.
+PROFILE_SNAPSHOT_DIR = os.environ.get('PROFILE_SNAPSHOT_DIR', str(BASE_DIR / 'profile-snapshot'))
+PROFILE_SNAPSHOT_OVERLAP = 300
+
+# Chat messages are written to the database in batches of up to this size,
+# or after this many seconds, whichever comes first
+CHAT_WRITE_BATCH_SIZE = 50
+CHAT_WRITE_INTERVAL = 0.25
+
+# Chat history sent on connect and on {"type": "history"} requests
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_CACHE_SIZE = 1024  # Serialized pages kept per process
+CHAT_HISTORY_LATEST_TTL = 2.0  # Seconds the newest page of a room may be reused
+
+# Socket events that never touch the database are forwarded at most once per
+# interval per socket; read receipts are written at most once per interval
+CHAT_TYPING_INTERVAL = 2.0
+CHAT_PRESENCE_INTERVAL = 10.0
+CHAT_RECEIPT_INTERVAL = 1.0
+
+# "memory" keeps chat inside a single Daphne process. "broker" routes group
+# fan-out through a local Unix-socket broker shared by every worker process;
+# start it with `python manage.py run_channel_broker`.
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'memory')
+CHANNEL_BROKER_SOCKET = os.environ.get('CHANNEL_BROKER_SOCKET', str(BASE_DIR / 'channel-broker.sock'))
+
+if CHANNEL_LAYER_BACKEND == 'broker':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'matriapp.channel_layers.BrokerChannelLayer',
+            'CONFIG': {
+                'path': CHANNEL_BROKER_SOCKET,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# settings.py
+
+LOGIN_URL = '/login/'  # Set this to your custom login URL
+LOGIN_REDIRECT_URL = '/'  # Redirect to home after successful login
+AUTH_USER_MODEL = 'matriapp.User'  # Replace 'yourapp' with the name of your app
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 STATIC_URL= 'static/'
\ No newline at end of file
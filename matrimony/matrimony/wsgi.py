@@ -1,16 +1,17 @@
-"""
-WSGI config for matrimony project.
-
-It exposes the WSGI callable as a module-level variable named ``application``.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
-"""
-
-import os
-
-from django.core.wsgi import get_wsgi_application
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrimony.settings')
-
-application = get_wsgi_application()
+"""
+WSGI config for matrimony project.
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'matrimony.settings')
+os.environ.setdefault('SERVER_TYPE', 'wsgi')  # Sizes the connection pool (see database.py)
+
+application = get_wsgi_application()